@@ -0,0 +1,223 @@
+from . import models, schemas
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session, Query, selectinload
+from typing import Any, Dict, List, Tuple
+
+TYPE_PERIODS = {
+    412: timedelta(weeks=1), # Food, Beverages & Tobacco
+    537: timedelta(weeks=2), # Baby & Toddler
+    469: timedelta(weeks=2), # Health & Beauty
+    1: timedelta(weeks=2),   # Animals & Pet Supplies
+    922: timedelta(weeks=8), # Office Supplies
+}
+DEFAULT_TYPE_PERIOD = timedelta(weeks=4)
+
+WEIGHT_PERIODS = [
+    (1, 1, timedelta(days=34)),
+    (2, 2, timedelta(days=21)),
+    (3, 3, timedelta(days=13)),
+    (4, 5, timedelta(days=8)),
+    (6, 8, timedelta(days=5)),
+    (9, 13, timedelta(days=3)),
+    (14, 21, timedelta(days=2)),
+    (22, 34, timedelta(days=1)),
+]
+
+def get_first_rows_by_key(db: Session, query: Query, key_column, order_by) -> Dict[Any, Any]:
+    ranked = query.add_columns(
+        func.row_number().over(partition_by=key_column, order_by=order_by).label('row_rank')
+    ).subquery()
+    rows = db.query(ranked).filter(ranked.c.row_rank == 1).all()
+    return {row.key: row for row in rows}
+
+def get_latest_texts(db: Session, product_keys: List[str]) -> Dict[str, str]:
+    if not product_keys:
+        return {}
+    query = (
+        db.query(models.PurchaseItem.read_product_key.label('key'), models.PurchaseItem.read_product_text)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.read_product_text.isnot(None))
+        .filter(models.PurchaseItem.read_product_key.in_(product_keys))
+    )
+    rows = get_first_rows_by_key(db, query, models.PurchaseItem.read_product_key, models.Purchase.date.desc())
+    return {key: row.read_product_text for key, row in rows.items()}
+
+def get_latest_unit_values(db: Session, key_column, keys: List[Any]) -> Dict[Any, float | None]:
+    if not keys:
+        return {}
+    query = (
+        db.query(key_column.label('key'), models.PurchaseItem.value)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.value.isnot(None))
+        .filter(key_column.in_(keys))
+    )
+    rows = get_first_rows_by_key(db, query, key_column, models.Purchase.date.desc())
+    unit_values = {key: row.value for key, row in rows.items()}
+
+    missing_keys = [key for key in keys if key not in unit_values]
+    if not missing_keys:
+        return unit_values
+
+    query = (
+        db.query(key_column.label('key'), models.PurchaseItem.quantity, models.PurchaseItem.total)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.quantity.isnot(None))
+        .filter(models.PurchaseItem.total.isnot(None))
+        .filter(key_column.in_(missing_keys))
+    )
+    rows = get_first_rows_by_key(db, query, key_column, models.Purchase.date.desc())
+    for key, row in rows.items():
+        unit_values[key] = row.total / row.quantity if row.quantity != 0 else None
+    return unit_values
+
+def get_products_by_ids(db: Session, product_ids: List[int]) -> Dict[int, models.Product]:
+    if not product_ids:
+        return {}
+    products = (
+        db.query(models.Product)
+        .options(
+            selectinload(models.Product.entity),
+            selectinload(models.Product.category)
+        )
+        .filter(models.Product.id.in_(product_ids))
+        .all()
+    )
+    return {product.id: product for product in products}
+
+def get_product_ids_by_key(db: Session, product_keys: List[str]) -> Dict[str, int]:
+    if not product_keys:
+        return {}
+    query = (
+        db.query(models.PurchaseItem.read_product_key.label('key'), models.PurchaseItem.product_id)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.product_id.isnot(None))
+        .filter(models.PurchaseItem.read_product_key.in_(product_keys))
+    )
+    rows = get_first_rows_by_key(db, query, models.PurchaseItem.read_product_key, models.Purchase.date.desc())
+    return {key: row.product_id for key, row in rows.items()}
+
+def get_latest_product_ids_by_category(db: Session, category_codes: List[int]) -> Dict[int, int]:
+    if not category_codes:
+        return {}
+    query = (
+        db.query(models.Category.code.label('key'), models.Product.id.label('product_id'))
+        .join(models.Category, models.Product.category_id == models.Category.id)
+        .join(models.PurchaseItem, models.PurchaseItem.product_id == models.Product.id)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.Category.code.in_(category_codes))
+    )
+    rows = get_first_rows_by_key(db, query, models.Category.code, models.Purchase.date.desc())
+    return {key: row.product_id for key, row in rows.items()}
+
+class CartDetails:
+    def __init__(self, db: Session, product_keys: List[str], category_codes: List[int]):
+        product_keys = list(set(product_keys))
+        category_codes = list(set(category_codes))
+
+        self.texts_by_key = get_latest_texts(db, product_keys)
+        self.values_by_key = get_latest_unit_values(db, models.PurchaseItem.read_product_key, product_keys)
+        self.product_ids_by_key = get_product_ids_by_key(db, product_keys)
+        self.product_ids_by_category = get_latest_product_ids_by_category(db, category_codes)
+        self.values_by_product_id = get_latest_unit_values(db, models.PurchaseItem.product_id, list(set(self.product_ids_by_category.values())))
+        self.products_by_id = get_products_by_ids(db, list(set(self.product_ids_by_key.values()) | set(self.product_ids_by_category.values())))
+
+    def get_product_key_details(self, product_key: str):
+        product = self.products_by_id.get(self.product_ids_by_key.get(product_key))
+        return self.texts_by_key.get(product_key), self.values_by_key.get(product_key), product
+
+    def get_category_details(self, category_code: int):
+        product_id = self.product_ids_by_category.get(category_code)
+        return self.products_by_id.get(product_id), self.values_by_product_id.get(product_id)
+
+def get_type_period(top_parent_code: int) -> timedelta:
+    return TYPE_PERIODS.get(top_parent_code, DEFAULT_TYPE_PERIOD)
+
+def get_sorted_prediction_items(predictions: List[schemas.Prediction]) -> List[Tuple[schemas.Prediction, schemas.PredictionItem]]:
+    prediction_items = [(prediction, item) for prediction in predictions for item in prediction.items]
+    return sorted(prediction_items, key=lambda p: p[1].date)
+
+def group_by_type(predictions: List[schemas.Prediction], type_periods: Dict[str, timedelta]):
+    prediction_items = get_sorted_prediction_items(predictions)
+    # an item joins the group starting at starting_time once starting_time reaches its date minus its type period
+    thresholds = [item.date - type_periods[prediction.category_code] for prediction, item in prediction_items]
+    by_threshold = sorted(range(len(prediction_items)), key=lambda idx: thresholds[idx])
+
+    groups: Dict[datetime,List[Tuple[schemas.Prediction, schemas.PredictionItem]]] = {}
+    grouped = [False] * len(prediction_items)
+    starting_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    threshold_idx = 0
+    next_idx = 0
+    while threshold_idx < len(by_threshold):
+        current_group = []
+        while threshold_idx < len(by_threshold) and thresholds[by_threshold[threshold_idx]] <= starting_time:
+            current_group.append(by_threshold[threshold_idx])
+            grouped[by_threshold[threshold_idx]] = True
+            threshold_idx += 1
+        if current_group:
+            groups[starting_time] = [prediction_items[idx] for idx in sorted(current_group)]
+
+        while next_idx < len(prediction_items) and grouped[next_idx]:
+            next_idx += 1
+        starting_time = (
+            prediction_items[next_idx][1].date.replace(hour=0, minute=0, second=0, microsecond=0)
+            if next_idx < len(prediction_items) else starting_time + timedelta(weeks=1)
+        )
+
+    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
+    return groups
+
+def consolidate_items(items: List[Tuple[schemas.Prediction, schemas.PredictionItem]]):
+    consolidated: Dict[str, Tuple[schemas.Prediction, schemas.PredictionItem]] = {}
+    for prediction, item in items:
+        identifier = prediction.category_code or prediction.product_key
+        if identifier not in consolidated:
+            consolidated[identifier] = (prediction, item)
+        else:
+            existing_prediction, existing_item = consolidated[identifier]
+            existing_item.quantity += item.quantity
+            consolidated[identifier] = (existing_prediction, existing_item)
+    return consolidated.values()
+
+def get_timedelta_for_weight(weight):
+    for start, end, period in WEIGHT_PERIODS:
+        if start <= weight <= end:
+            return period
+    return timedelta()
+
+def group_by_density(predictions: List[schemas.Prediction]):
+    prediction_items = get_sorted_prediction_items(predictions)
+
+    groups: Dict[datetime,List[Tuple[schemas.Prediction, schemas.PredictionItem]]] = {}
+    idx = 0
+    while idx + 1 < len(prediction_items):
+        middle_date = None
+        weight = 0
+        current_group: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
+        while True:
+            prediction, item = prediction_items[idx]
+            if item.date > (middle_date or item.date) + get_timedelta_for_weight(weight):
+                break
+            current_group.append((prediction,item))
+            middle_date = calculate_middle_date(middle_date or item.date, weight, item.date, item.quantity)
+            weight += item.quantity
+            if idx + 1 >= len(prediction_items):
+                break
+            idx += 1
+
+        if middle_date not in groups:
+            groups[middle_date] = current_group
+        else:
+            groups[middle_date].extend(current_group)
+
+    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
+    return groups
+
+def calculate_middle_date(current_date: datetime, current_weight: float, incoming_date: datetime, incoming_weight: float):
+    if current_weight + incoming_weight <= 0:
+        percentage = 1
+    else:
+        percentage = current_weight / (current_weight + incoming_weight)
+    
+    offset = (incoming_date - current_date) * percentage
+    return incoming_date - offset
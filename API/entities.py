@@ -0,0 +1,15 @@
+from . import models
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+def backfill_purchase_entities(db: Session, entity_id: int, identification: int) -> int:
+    result = db.execute(
+        update(models.Purchase)
+        .where(
+            models.Purchase.entity_id.is_(None),
+            models.Purchase.entity_identification == identification
+        )
+        .values(entity_id=entity_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,80 @@
+from . import models
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+
+def get_item_total_column():
+    # same fallback as purchases_tools.calculate_purchase_total for a purchase without totals
+    return func.coalesce(
+        models.PurchaseItem.total,
+        models.PurchaseItem.value * func.coalesce(func.nullif(models.PurchaseItem.quantity, 0), 1)
+    )
+
+def get_day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+def get_daily_spend_select(category_ids: List[int], first_day: Optional[date], end_day: Optional[date]):
+    query = (
+        select(models.CategoryClosure.ancestor_id.label("category_id"), models.DailyCategoryTotal.spend.label("spend"))
+        .join(models.DailyCategoryTotal, models.DailyCategoryTotal.category_id == models.CategoryClosure.descendant_id)
+        .where(models.CategoryClosure.ancestor_id.in_(category_ids))
+    )
+    if first_day:
+        query = query.where(models.DailyCategoryTotal.day >= first_day)
+    if end_day:
+        query = query.where(models.DailyCategoryTotal.day < end_day)
+    return query
+
+def get_item_spend_select(category_ids: List[int], start_date: datetime, end_date: datetime, end_inclusive: bool = True):
+    return (
+        select(models.CategoryClosure.ancestor_id.label("category_id"), get_item_total_column().label("spend"))
+        .select_from(models.PurchaseItem)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
+        .join(models.CategoryClosure, models.CategoryClosure.descendant_id == models.Product.category_id)
+        .where(
+            models.CategoryClosure.ancestor_id.in_(category_ids),
+            models.Purchase.date >= start_date,
+            models.Purchase.date <= end_date if end_inclusive else models.Purchase.date < end_date
+        )
+    )
+
+def get_category_totals(
+        db: Session,
+        category_ids: List[int],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None) -> Dict[int, float]:
+    if not category_ids:
+        return {}
+    # whole days inside the bounds come from the daily rollups, the partial days at either end from their items
+    first_day = None
+    if start_date:
+        first_day = start_date.date() if start_date.time() == datetime.min.time() else start_date.date() + timedelta(days=1)
+    # the end bound is inclusive, so its own day is read from items to honor the exact time
+    end_day = end_date.date() if end_date else None
+    if first_day and end_day and first_day > end_day:
+        parts = [get_item_spend_select(category_ids, start_date, end_date)]
+    else:
+        parts = [get_daily_spend_select(category_ids, first_day, end_day)]
+        if first_day and first_day != start_date.date():
+            parts.append(get_item_spend_select(category_ids, start_date, get_day_start(first_day), end_inclusive=False))
+        if end_day:
+            parts.append(get_item_spend_select(category_ids, get_day_start(end_day), end_date))
+    spends = union_all(*parts).subquery()
+    rows = db.query(spends.c.category_id, func.sum(spends.c.spend)).group_by(spends.c.category_id).all()
+    return {category_id: total or 0 for category_id, total in rows}
+
+def get_purchase_category_totals(db: Session, purchase_id: int) -> List[Tuple[models.Category, float]]:
+    # every item counts towards its own category and all of its ancestors
+    rows = (
+        db.query(models.Category, func.coalesce(func.sum(get_item_total_column()), 0))
+        .select_from(models.PurchaseItem)
+        .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
+        .join(models.CategoryClosure, models.CategoryClosure.descendant_id == models.Product.category_id)
+        .join(models.Category, models.Category.id == models.CategoryClosure.ancestor_id)
+        .filter(models.PurchaseItem.purchase_id == purchase_id)
+        .group_by(models.Category.id)
+        .all()
+    )
+    return [(category, total) for category, total in rows]
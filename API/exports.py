@@ -0,0 +1,61 @@
+from . import models, schemas
+from datetime import datetime
+from sqlalchemy.orm import Session
+from typing import Iterator, Optional
+import csv
+import io
+
+EXPORT_BATCH_SIZE = 500
+
+PURCHASE_CSV_FIELDS = [name for name in schemas.PurchaseExport.model_fields if name != "items"]
+ITEM_CSV_FIELDS = list(schemas.PurchaseExportItem.model_fields)
+CSV_HEADER = PURCHASE_CSV_FIELDS + [f"item_{name}" for name in ITEM_CSV_FIELDS]
+
+def iterate_purchases(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> Iterator[models.Purchase]:
+    # stream_results keeps a server-side cursor open, items are selectin-loaded once per batch
+    query = db.query(models.Purchase)
+    if start_date:
+        query = query.filter(models.Purchase.date >= start_date)
+    if end_date:
+        query = query.filter(models.Purchase.date <= end_date)
+    query = (
+        query.order_by(models.Purchase.date, models.Purchase.id)
+        .execution_options(stream_results=True)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    for purchase in query:
+        yield purchase
+
+def export_purchases_ndjson(purchases: Iterator[models.Purchase]) -> Iterator[str]:
+    lines = []
+    for purchase in purchases:
+        lines.append(schemas.PurchaseExport.model_validate(purchase).model_dump_json() + "\n")
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+def export_purchases_csv(purchases: Iterator[models.Purchase]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    rows = 0
+    for purchase in purchases:
+        purchase_export = schemas.PurchaseExport.model_validate(purchase).model_dump(mode="json")
+        purchase_row = [purchase_export[name] for name in PURCHASE_CSV_FIELDS]
+        if not purchase_export["items"]:
+            writer.writerow(purchase_row + [None] * len(ITEM_CSV_FIELDS))
+        for item in purchase_export["items"]:
+            writer.writerow(purchase_row + [item[name] for name in ITEM_CSV_FIELDS])
+        rows += 1
+        if rows >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
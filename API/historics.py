@@ -0,0 +1,56 @@
+from . import models, schemas
+from datetime import datetime
+from sqlalchemy import DateTime, cast, func
+from sqlalchemy.orm import Query, Session
+from typing import Optional
+
+HISTORIC_BUCKETS = ("day", "week", "month")
+
+def get_bucket_column(db: Session, day_column, bucket: str):
+    if bucket not in HISTORIC_BUCKETS:
+        raise ValueError(f"Unknown historic bucket '{bucket}'")
+    if db.get_bind().dialect.name != "sqlite":
+        return func.date_trunc(bucket, cast(day_column, DateTime))
+    # sqlite has no date_trunc, weeks start on monday like in postgres
+    if bucket == "day":
+        return func.date(day_column)
+    if bucket == "week":
+        return func.date(day_column, "-6 days", "weekday 1")
+    return func.date(day_column, "start of month")
+
+def get_historic_series(
+        db: Session,
+        query: Query,
+        rollup,
+        bucket: str = "day",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None) -> schemas.HistoricSeries:
+    bucket_column = get_bucket_column(db, rollup.day, bucket).label("bucket")
+    query = query.filter(rollup.quantity != 0)
+    if start_date:
+        query = query.filter(rollup.day >= start_date.date())
+    if end_date:
+        query = query.filter(rollup.day <= end_date.date())
+    rows = (
+        query.with_entities(bucket_column, func.sum(rollup.quantity))
+        .group_by(bucket_column)
+        .order_by(bucket_column)
+        .all()
+    )
+    return schemas.HistoricSeries(
+        bucket=bucket,
+        dates=[datetime.fromisoformat(date) if isinstance(date, str) else date for date, _ in rows],
+        quantities=[quantity for _, quantity in rows]
+    )
+
+def get_product_code_historic(db: Session, product_code: str, bucket: str = "day", start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> schemas.HistoricSeries:
+    query = db.query(models.DailyProductTotal).filter(models.DailyProductTotal.product_key == product_code)
+    return get_historic_series(db, query, models.DailyProductTotal, bucket, start_date, end_date)
+
+def get_category_code_historic(db: Session, category_code: int, bucket: str = "day", start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> schemas.HistoricSeries:
+    query = (
+        db.query(models.DailyCategoryTotal)
+        .join(models.Category, models.DailyCategoryTotal.category_id == models.Category.id)
+        .filter(models.Category.code == category_code)
+    )
+    return get_historic_series(db, query, models.DailyCategoryTotal, bucket, start_date, end_date)
@@ -1,101 +1,108 @@
 from . import schemas
 from . import models
+from . import database
 from collections import defaultdict
 from pathlib import Path as pt
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Path, status, Query
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Path, status, Query, Response, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import func, or_, and_, distinct
+from sqlalchemy import and_, distinct, text
 from sqlalchemy.orm import Session, noload, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from .dependencies import get_db, get_node_token, get_client_ip
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timezone, date, timedelta
-from PyLib import typed_messaging, purchases_tools, receipt_tools
+from PyLib import typed_messaging, purchases_tools, receipt_tools, image_tools
 from dotenv import load_dotenv
-from PIL import Image
-from pdf2image import convert_from_bytes
+from pydantic import BaseModel
 from .state_machine import ReceiptStateMachine
+from .notifications import ConnectionManager, PostgresListener
+from .carts import CartDetails, group_by_type, group_by_density, get_type_period
+from .taxonomy import TaxonomyCache, rebuild_category_closures
+from .expenses import get_category_totals, get_purchase_category_totals
+from .pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, paginate
+from .exports import iterate_purchases, export_purchases_csv, export_purchases_ndjson
+from .search import SEARCH_DEFAULT_LIMIT, SEARCH_MIN_LENGTH, get_lookahead_filter, search_product_codes
+from .product_codes import bulk_create_product_codes, get_product_codes_by_ids, backfill_purchase_items
+from .entities import backfill_purchase_entities
+from .historics import get_product_code_historic, get_category_code_historic
+from .rollups import get_product_days, refresh_daily_totals
+from .restockables import get_restockables_query
+from .predictions import get_current_prediction, get_current_predictions, set_current_prediction
 from transitions import MachineError
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import logging
 import os
 import hashlib
 import asyncio
-import io
-import select as st
-import psycopg2
+import shutil
 
 load_dotenv()
 logging.basicConfig(level=os.getenv("API_LOGGING_LEVEL",'ERROR'))
 
 POPPLER_PATH = os.getenv("POPPLER_PATH","")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", os.cpu_count() or 1))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", image_tools.PDF_DEFAULT_DPI))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", image_tools.PDF_DEFAULT_MAX_PAGES))
 
 db_params = os.getenv("NOTIFICATIONS_DATABASE_URL")
 
-class ReceiptEventConnection:
-    def __init__(self, queue: asyncio.Queue, subscribed_id: int):
-        self.queue = queue
-        self.subscribed_id = subscribed_id
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_PENDING_EVENTS = int(os.getenv("SSE_MAX_PENDING_EVENTS", "8"))
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[ReceiptEventConnection] = []
+AMQP_PUBLISHERS = int(os.getenv("AMQP_PUBLISHERS", "8"))
+AMQP_PUBLISHER_TIMEOUT = float(os.getenv("AMQP_PUBLISHER_TIMEOUT", "10"))
 
-    async def connect(self, subscribed_id: int) -> ReceiptEventConnection:
-        q = asyncio.Queue()
-        sub_obj = ReceiptEventConnection(q, subscribed_id)
-        self.active_connections.append(sub_obj)
-        return sub_obj
+RESTOCKABLE_MIN_DAYS = int(os.getenv("RESTOCKABLE_MIN_DAYS", "3"))
+RESTOCKABLE_WINDOW_DAYS = int(os.getenv("RESTOCKABLE_WINDOW_DAYS", str(2 * 365)))
 
-    async def disconnect(self, sub_obj: ReceiptEventConnection):
-        self.active_connections.remove(sub_obj)
-        await sub_obj.queue.put(None)
+manager = ConnectionManager(SSE_MAX_PENDING_EVENTS)
+taxonomy = TaxonomyCache()
 
-    async def notify_all(self, id: int):
-        for connection in self.active_connections:
-            if connection.subscribed_id == id:
-                await connection.queue.put(id)
+image_pool: ProcessPoolExecutor | None = None
+publisher_pool: typed_messaging.PydanticPublisherPool | None = None
 
-    async def close(self):
-        while self.active_connections:
-            await self.disconnect(self.active_connections[0])
-
-manager = ConnectionManager()
-
-db_listen_conn = psycopg2.connect(db_params)
-db_listen_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+def publish_messages(messages: List[Tuple[str, str, BaseModel]]):
+    # publishes after the db work is committed, a broker failure must not fail a saved write
+    if not messages:
+        return
+    try:
+        with publisher_pool.get_publisher() as publisher:
+            for exchange_name, routing_key, payload in messages:
+                publisher.publish(exchange_name, routing_key, payload)
+    except Exception as e:
+        logging.error(f"Failed to publish {len(messages)} messages: {str(e)}")
 
-curs = db_listen_conn.cursor()
-curs.execute("LISTEN receipt_status_changed;")
+def get_status_change_json(status_change: schemas.ReceiptStatusChange) -> str:
+    # still plain json for EventSource clients, and safe for htmx to swap into a page as html
+    return status_change.model_dump_json().replace("&", "\\u0026").replace("<", "\\u003c").replace(">", "\\u003e")
 
-def get_notification():
-    if st.select([db_listen_conn], [], [], 5) == ([], [], []):
-        return []
-    db_listen_conn.poll()
-    if db_listen_conn.notifies:
-        return db_listen_conn.notifies
-    return []
+def on_receipt_status_changed(payload: str):
+    status_change = schemas.ReceiptStatusChange.model_validate_json(payload)
+    manager.notify_all(status_change.id, get_status_change_json(status_change))
 
-async def db_listener():
-    try:
-        while True:
-            notifications = await asyncio.get_running_loop().run_in_executor(None, get_notification)
-            for notify in notifications:
-                await manager.notify_all(int(notify.payload))
-            notifications.clear()
-    except Exception as ex:
-        print(f"Notification service failed: {ex} - {ex.__class__.__name__}")
+def on_taxonomy_changed(payload: str):
+    taxonomy.invalidate()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    listener_task = asyncio.create_task(db_listener())
+    global image_pool, publisher_pool
+    image_pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    publisher_pool = conn.get_publisher_pool(AMQP_PUBLISHERS, AMQP_PUBLISHER_TIMEOUT)
+    receipt_listener = PostgresListener(db_params, "receipt_status_changed", on_receipt_status_changed)
+    receipt_listener.start()
+    taxonomy_listener = PostgresListener(db_params, "taxonomy_changed", on_taxonomy_changed)
+    taxonomy_listener.start()
     yield
-    await manager.close()
-    listener_task.cancel()
-    curs.close()
-    db_listen_conn.close()
+    manager.close()
+    await receipt_listener.stop()
+    await taxonomy_listener.stop()
+    image_pool.shutdown(cancel_futures=True)
+    publisher_pool.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -109,6 +116,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 IMAGE_UPLOADS_BASE_PATH = os.getenv("IMAGE_UPLOADS_BASE_PATH",'')
@@ -149,7 +157,15 @@ async def connect_sse(receipt_id: int, db: Session = Depends(get_db)):
     receipt = db.query(models.Receipt).filter(models.Receipt.id == receipt_id).first()
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
+    status_change = schemas.ReceiptStatusChange(
+        id=receipt.id,
+        status=receipt.status,
+        purchase_id=receipt.purchase_id,
+        error_message=receipt.error_message,
+        updated_at=receipt.updated_at
+    )
 
+    # every event carries the whole status, it is swapped in as is without fetching the receipt again
     return HTMLResponse(f'''
 <!DOCTYPE html>
 <html lang="en">
@@ -163,35 +179,34 @@ async def connect_sse(receipt_id: int, db: Session = Depends(get_db)):
 </head>
 <body>
     <div hx-ext="sse" sse-connect="/api/receipts/{receipt_id}/status_changes">
-        <div
-            id="receipt-data"
-            hx-get="/api/receipts/{receipt_id}"
-            hx-trigger="sse:message, load"
-            hx-target="#receipt-data"
-            hx-swap="innerHTML">
-        ...
-        </div>
+        <div id="receipt-data" sse-swap="message" hx-swap="innerHTML">{get_status_change_json(status_change)}</div>
     </div>
 </body>
 </html>
 ''')
 
 @app.get("/receipts/{receipt_id}/status_changes")
-async def sse_endpoint(receipt_id: int, db: Session = Depends(get_db)):
+async def sse_endpoint(receipt_id: int, request: Request, db: Session = Depends(get_db)):
     receipt = db.query(models.Receipt).filter(models.Receipt.id == receipt_id).first()
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
 
     async def event_generator():
-        sub_obj = await manager.connect(receipt_id)
+        sub_obj = manager.connect(receipt_id)
         try:
             while True:
-                data = await sub_obj.queue.get()
+                try:
+                    data = await sub_obj.get(SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
                 if data is None:
                     break
                 yield f"data: {data}\n\n"
         finally:
-            await manager.disconnect(sub_obj)
+            manager.disconnect(sub_obj)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -278,12 +293,71 @@ async def favicon():
 
 def get_next_sequence(directory: Path, timestamp: str) -> int:
     sequence = 1
-    while (directory / f"{timestamp}-{sequence}.").exists():
+    while (directory / f"{timestamp}-{sequence}.jpg").exists():
         sequence += 1
     return sequence
 
+def spool_upload(file: UploadFile, destination: pt):
+    try:
+        with open(destination, 'wb') as spool_file:
+            shutil.copyfileobj(file.file, spool_file, UPLOAD_CHUNK_SIZE)
+    finally:
+        file.file.close()
+
+def fail_receipt_upload(db_receipt: models.Receipt, error_message: str):
+    db_receipt.error_message = error_message
+    db_receipt.status = schemas.ReceiptStatus.FAILED
+
+def get_receipts_by_ids(db: Session, receipt_ids: List[int]) -> List[models.Receipt]:
+    receipts = db.query(models.Receipt).filter(models.Receipt.id.in_(receipt_ids)).all()
+    receipts_by_id = {receipt.id: receipt for receipt in receipts}
+    return [receipts_by_id[receipt_id] for receipt_id in receipt_ids]
+
+def get_receipts_by_content_hash(db: Session, content_hashes: List[str]) -> Dict[str, models.Receipt]:
+    if not content_hashes:
+        return {}
+    receipts = (
+        db.query(models.Receipt)
+        .filter(models.Receipt.content_hash.in_(content_hashes))
+        .filter(models.Receipt.status.notin_([schemas.ReceiptStatus.FAILED, schemas.ReceiptStatus.CANCELED]))
+        .order_by(models.Receipt.id.desc())
+        .all()
+    )
+    return {receipt.content_hash: receipt for receipt in receipts}
+
+def publish_receipts(db_receipts: List[models.Receipt]) -> bool:
+    queued_receipts = [db_receipt for db_receipt in db_receipts if db_receipt.status == schemas.ReceiptStatus.WAITING]
+    if not queued_receipts:
+        return False
+
+    failed = False
+    try:
+        with publisher_pool.get_publisher() as publisher:
+            for db_receipt in queued_receipts:
+                try:
+                    receipt = schemas.Receipt.model_validate(db_receipt)
+                    publisher.publish(IMAGE_TO_COMPRA_EXCHANGE, IMAGE_TO_COMPRA_INPUT_KEY, receipt)
+                except Exception as e:
+                    fail_receipt_upload(db_receipt, f"Failed to publish '{db_receipt.reference_name}': {str(e)}")
+                    failed = True
+    except Exception as e:
+        for db_receipt in queued_receipts:
+            if db_receipt.status == schemas.ReceiptStatus.WAITING:
+                fail_receipt_upload(db_receipt, f"Failed to publish '{db_receipt.reference_name}': {str(e)}")
+        failed = True
+    return failed
+
+def get_server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
 @app.post("/upload/", response_model=List[schemas.Receipt])
-async def receive_receipt_files(files: List[UploadFile] = File(...), db: Session = Depends(get_db), client_ip: str = Depends(get_client_ip)):
+def receive_receipt_files(
+    response: Response,
+    files: List[UploadFile] = File(...),
+    stitch_pages: bool = Query(False, description="Stitch every page of a pdf into one tall receipt image"),
+    db: Session = Depends(get_db),
+    client_ip: str = Depends(get_client_ip)
+):
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
 
@@ -297,8 +371,9 @@ async def receive_receipt_files(files: List[UploadFile] = File(...), db: Session
     folder_path.mkdir(parents=True, exist_ok=True)
 
     starting_sequence = get_next_sequence(folder_path, timestamp)
-    db_receipts = []
-    allowed_extensions = {"jpg", "jpeg", "png", "pdf"}
+    db_receipts: List[models.Receipt] = []
+    conversions = []
+    allowed_extensions = image_tools.IMAGE_EXTENSIONS | image_tools.PDF_EXTENSIONS
 
     for idx, file in enumerate(files):
         sequence = starting_sequence + idx
@@ -309,90 +384,101 @@ async def receive_receipt_files(files: List[UploadFile] = File(...), db: Session
 
         db_receipt = models.Receipt(
             reference_name = file.filename,
-            image_url = image_url
+            image_url = image_url,
+            status = schemas.ReceiptStatus.WAITING
         )
-        try:
-            db.add(db_receipt)
-            db.commit()
-            db.refresh(db_receipt)
-        except (IntegrityError, SQLAlchemyError):
-            db.rollback()
-            logging.error(f"Couldn't store file '{file.filename}'. Could not create receipt due to model constraints.")
-            continue
-
-        if '.' in file.filename:
-            file_extension = file.filename.split(".")[-1]
-        else:
-            file_extension = "bin"
+        db_receipts.append(db_receipt)
 
-        if file_extension.lower() not in allowed_extensions:
-            db_receipt.error_message = f"Unsupported file type: {file_extension}"
-            db_receipt.status = schemas.ReceiptStatus.FAILED
-            db.commit()
-            db.refresh(db_receipt)
-            db_receipts.append(db_receipt)
+        file_extension = image_tools.get_file_extension(file.filename)
+        if file_extension not in allowed_extensions:
+            fail_receipt_upload(db_receipt, f"Unsupported file type: {file_extension}")
             continue
 
+        spool_path = folder_path / f"{timestamp}-{sequence}.{file_extension}.part"
         try:
-            file_content = await file.read()
+            spool_upload(file, spool_path)
         except Exception as e:
-            db_receipt.error_message = f"Failed to read {file.filename}: {str(e)}"
-            db_receipt.status = schemas.ReceiptStatus.FAILED
-            db.commit()
-            db.refresh(db_receipt)
-            db_receipts.append(db_receipt)
+            spool_path.unlink(missing_ok=True)
+            fail_receipt_upload(db_receipt, f"Failed to read {file.filename}: {str(e)}")
             continue
-        finally:
-            await file.close()
 
-        try:
-            if file_extension.lower() in {'jpg', 'jpeg', 'png'}:
-                image = await asyncio.to_thread(Image.open, io.BytesIO(file_content))
-                image = image.convert('RGB')
-                image.save(file_path, format='JPEG')
-            elif file_extension.lower() == 'pdf':
-                if POPPLER_PATH.strip():
-                    images = convert_from_bytes(file_content, poppler_path=POPPLER_PATH)
-                else:
-                    images = convert_from_bytes(file_content)
-                image = images[0]
-                image.save(file_path, format='JPEG')
-            else:
-                db_receipt.error_message = f"Unsupported file type: {file_extension}"
-                db_receipt.status = schemas.ReceiptStatus.FAILED
-                db.commit()
-                db.refresh(db_receipt)
-                db_receipts.append(db_receipt)
-                continue
+        future = image_pool.submit(
+            image_tools.convert_to_jpeg,
+            str(spool_path),
+            str(file_path),
+            file_extension,
+            POPPLER_PATH,
+            PDF_RENDER_DPI,
+            stitch_pages,
+            PDF_MAX_PAGES
+        )
+        conversions.append((idx, db_receipt, spool_path, file_path, future))
 
+    render_timings = defaultdict(float)
+    for _, db_receipt, spool_path, _, future in conversions:
+        try:
+            db_receipt.content_hash, file_timings = future.result()
+            logging.info(f"Converted '{db_receipt.reference_name}': {get_server_timing(file_timings)}")
+            for stage, seconds in file_timings.items():
+                render_timings[stage] += seconds
         except Exception as e:
-            db_receipt.error_message = f"Failed to upload {file.filename}: {str(e)}"
-            db_receipt.status = schemas.ReceiptStatus.FAILED
-            db.commit()
-            db.refresh(db_receipt)
-            db_receipts.append(db_receipt)
+            fail_receipt_upload(db_receipt, f"Failed to upload {db_receipt.reference_name}: {str(e)}")
+        finally:
+            spool_path.unlink(missing_ok=True)
+
+    new_receipts = list(db_receipts)
+    known_receipts = get_receipts_by_content_hash(db, list({db_receipt.content_hash for db_receipt in db_receipts if db_receipt.content_hash}))
+    for idx, db_receipt, _, file_path, _ in conversions:
+        if not db_receipt.content_hash:
             continue
+        original_receipt = known_receipts.get(db_receipt.content_hash)
+        if not original_receipt:
+            known_receipts[db_receipt.content_hash] = db_receipt
+            continue
+        logging.info(f"'{db_receipt.reference_name}' is a duplicate of receipt '{original_receipt.reference_name}'. Skipping.")
+        file_path.unlink(missing_ok=True)
+        new_receipts.remove(db_receipt)
+        db_receipts[idx] = original_receipt
 
-        db_receipts.append(db_receipt)
+    try:
+        db.add_all(new_receipts)
+        db.flush()
+        receipt_ids = [db_receipt.id for db_receipt in db_receipts]
+        new_receipt_ids = [db_receipt.id for db_receipt in new_receipts]
+        db.commit()
+    except (IntegrityError, SQLAlchemyError):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Could not create receipts due to model constraints.")
 
-    with conn.get_publisher() as publisher:
-        for db_receipt in db_receipts:
-            if db_receipt.status == schemas.ReceiptStatus.FAILED:
-                continue
-            db_receipt.status = schemas.ReceiptStatus.WAITING
-            db.commit()
-            db.refresh(db_receipt)
-            try:
-                receipt = schemas.Receipt.model_validate(db_receipt)
-                publisher.publish(IMAGE_TO_COMPRA_EXCHANGE, IMAGE_TO_COMPRA_INPUT_KEY, receipt)
-            except Exception as e:
-                db_receipt.error_message = f"Failed to publish '{db_receipt.reference_name}': {str(e)}"
-                db_receipt.status = schemas.ReceiptStatus.FAILED
-                db.commit()
-                db.refresh(db_receipt)
-                continue
+    if render_timings:
+        response.headers["Server-Timing"] = get_server_timing(render_timings)
+
+    if publish_receipts(get_receipts_by_ids(db, new_receipt_ids)):
+        db.commit()
 
-    return db_receipts
+    return get_receipts_by_ids(db, receipt_ids)
+
+@app.get("/purchases/export")
+def export_purchases(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None)
+):
+    # the session outlives the endpoint, get_db would close it before the body is streamed
+    def stream_purchases():
+        db = database.SessionLocal()
+        try:
+            purchases = iterate_purchases(db, start_date, end_date)
+            if format == "csv":
+                yield from export_purchases_csv(purchases)
+            else:
+                yield from export_purchases_ndjson(purchases)
+        finally:
+            db.close()
+
+    if format == "csv":
+        return StreamingResponse(stream_purchases(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=purchases.csv"})
+    return StreamingResponse(stream_purchases(), media_type="application/x-ndjson")
 
 @app.get("/purchases/{purchase_id}", response_model=schemas.PurchaseWithReceipt)
 def get_purchase_by_id(purchase_id: int, db: Session = Depends(get_db)):
@@ -442,68 +528,71 @@ def create_purchase(purchase: schemas.PurchaseCreate, receipt_id: Optional[int]
             detail="The purchase's total could not be calculated."
         )
 
-    with conn.get_publisher() as publisher:
-        entity_id = None
+    messages = []
+    entity_id = None
+    cuit = models.get_entity_identification(purchase.read_entity_identification)
+    if cuit is not None:
         try:
-            cuit = receipt_tools.normalize_entity_id(purchase.read_entity_identification)
             db_entity = db.query(models.Entity).filter(models.Entity.identification == cuit).first()
             if not db_entity:
-                publisher.publish(ENTITY_EXCHANGE, ENTITY_NEW_KEY, schemas.EntityBase(name=purchase.read_entity_name or "", identification=cuit))
+                messages.append((ENTITY_EXCHANGE, ENTITY_NEW_KEY, schemas.EntityBase(name=purchase.read_entity_name or "", identification=cuit)))
             else:
                 entity_id = db_entity.id
         except:
             pass
 
-        db_entity = models.Purchase(
-            read_entity_name=purchase.read_entity_name,
-            read_entity_branch=purchase.read_entity_branch,
-            read_entity_location=purchase.read_entity_location,
-            read_entity_address=purchase.read_entity_address,
-            read_entity_identification=purchase.read_entity_identification,
-            read_entity_phone=purchase.read_entity_phone,
-            date = calculated_date,
-            subtotal = purchase.subtotal,
-            discount = purchase.discount,
-            tips = purchase.tips,
-            total = calculated_total,
-            entity_id = entity_id
-        )
-        db.add(db_entity)
-        db.commit()
-        db.refresh(db_entity)
+    db_entity = models.Purchase(
+        read_entity_name=purchase.read_entity_name,
+        read_entity_branch=purchase.read_entity_branch,
+        read_entity_location=purchase.read_entity_location,
+        read_entity_address=purchase.read_entity_address,
+        read_entity_identification=purchase.read_entity_identification,
+        read_entity_phone=purchase.read_entity_phone,
+        date = calculated_date,
+        subtotal = purchase.subtotal,
+        discount = purchase.discount,
+        tips = purchase.tips,
+        total = calculated_total,
+        entity_id = entity_id
+    )
+    db.add(db_entity)
+    db.commit()
+    db.refresh(db_entity)
 
-        for item in purchase.items:
-            product_id = None
-
-            if item.read_product_key:
-                product_code = receipt_tools.detect_product_code(item.read_product_key)
-                if product_code:
-                    db_product_code = db.query(models.ProductCode).filter(models.ProductCode.code == product_code.code, models.ProductCode.format == product_code.format).first()
-                    if not db_product_code:
-                        publisher.publish(PRODUCT_CODE_EXCHANGE, PRODUCT_CODE_NEW_KEY, product_code)
-                    else:
-                        product_id = db_product_code.product_id
-
-            db_item = models.PurchaseItem(
-                purchase_id=db_entity.id,
-                read_product_key=item.read_product_key,
-                read_product_text=item.read_product_text,
-                quantity=item.quantity,
-                value=item.value,
-                total=item.total,
-                product_id = product_id
-            )
-            db.add(db_item)
+    for item in purchase.items:
+        product_id = None
+
+        if item.read_product_key:
+            product_code = receipt_tools.detect_product_code(item.read_product_key)
+            if product_code:
+                db_product_code = db.query(models.ProductCode).filter(models.ProductCode.code == product_code.code, models.ProductCode.format == product_code.format).first()
+                if not db_product_code:
+                    messages.append((PRODUCT_CODE_EXCHANGE, PRODUCT_CODE_NEW_KEY, product_code))
+                else:
+                    product_id = db_product_code.product_id
+
+        db_item = models.PurchaseItem(
+            purchase_id=db_entity.id,
+            read_product_key=item.read_product_key,
+            read_product_text=item.read_product_text,
+            quantity=item.quantity,
+            value=item.value,
+            total=item.total,
+            product_id = product_id
+        )
+        db.add(db_item)
 
-        db.commit()
-        db_purchase = db.query(models.Purchase).filter(models.Purchase.id == db_entity.id).first()
-        schema_purchase = schemas.Purchase.model_validate(db_purchase)
-        publisher.publish(PURCHASE_EXCHANGE, PURCHASE_PREDICT_KEY, schema_purchase)
+    refresh_daily_totals(db, [db_entity.date])
+    db.commit()
+    db_purchase = db.query(models.Purchase).filter(models.Purchase.id == db_entity.id).first()
+    messages.append((PURCHASE_EXCHANGE, PURCHASE_PREDICT_KEY, schemas.Purchase.model_validate(db_purchase)))
 
     if receipt:
         receipt.status = machine.state
         receipt.purchase_id = db_entity.id
         db.commit()
+
+    publish_messages(messages)
     return db_purchase
 
 @app.put("/purchases/{purchase_id}", response_model=schemas.Purchase)
@@ -522,16 +611,18 @@ def update_purchase(
         if purchase_data["total"] is None:
             raise HTTPException(status_code=400, detail="The purchase's total could not be calculated.")
 
+    messages = []
+    previous_date = db_purchase.date
+    previous_product_ids = [db_item.product_id for db_item in db_purchase.items]
     for key, value in purchase_data.items():
         setattr(db_purchase, key, value)
 
-    if db_purchase.read_entity_identification and not db_purchase.entity_id:
+    if db_purchase.entity_identification is not None and not db_purchase.entity_id:
         try:
-            cuit = receipt_tools.normalize_entity_id(db_purchase.read_entity_identification)
+            cuit = db_purchase.entity_identification
             db_entity = db.query(models.Entity).filter(models.Entity.identification == cuit).first()
             if not db_entity:
-                with conn.get_publisher() as publisher:
-                    publisher.publish(ENTITY_EXCHANGE, ENTITY_NEW_KEY, schemas.EntityBase(name=db_purchase.read_entity_name or "", identification=cuit))
+                messages.append((ENTITY_EXCHANGE, ENTITY_NEW_KEY, schemas.EntityBase(name=db_purchase.read_entity_name or "", identification=cuit)))
             else:
                 db_purchase.entity_id = db_entity.id
         except:
@@ -556,97 +647,103 @@ def update_purchase(
                 continue
             db_product_code = db.query(models.ProductCode).filter(models.ProductCode.code == product_code.code, models.ProductCode.format == product_code.format).first()
             if not db_product_code:
-                with conn.get_publisher() as publisher:
-                    publisher.publish(PRODUCT_CODE_EXCHANGE, PRODUCT_CODE_NEW_KEY, product_code)
+                messages.append((PRODUCT_CODE_EXCHANGE, PRODUCT_CODE_NEW_KEY, product_code))
             else:
                 db_item.product_id = db_product_code.product_id
 
     try:
+        refresh_daily_totals(db, [previous_date, db_purchase.date], previous_product_ids)
         db.commit()
     except (IntegrityError, SQLAlchemyError):
         db.rollback()
         raise HTTPException(status_code=400, detail="Could not update purchase due to model constraints.")
 
+    publish_messages(messages)
     db_return = db.query(models.Purchase).filter(models.Purchase.id == db_purchase.id).first()
     return db_return
 
 @app.get("/purchases/", response_model=List[schemas.Purchase])
 def get_purchases(
+    response: Response,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     category_code: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     query = db.query(models.Purchase)
+    items_relationship = models.Purchase.items
+
+    if category_code:
+        category = db.query(models.Category).filter(models.Category.code == category_code).first()
+        
+        if not category:
+            raise HTTPException(status_code=404, detail="Category not found")
+
+        family_items = (
+            db.query(models.PurchaseItem)
+            .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
+            .join(models.CategoryClosure, models.CategoryClosure.descendant_id == models.Product.category_id)
+            .filter(models.CategoryClosure.ancestor_id == category.id)
+        )
+        items_relationship = models.Purchase.items.and_(
+            models.PurchaseItem.id.in_(family_items.with_entities(models.PurchaseItem.id))
+        )
+        query = query.filter(models.Purchase.id.in_(family_items.with_entities(models.PurchaseItem.purchase_id)))
     
     if start_date and end_date:
         query = query.options(
             noload(models.Purchase.entity),
-            selectinload(models.Purchase.items)
+            selectinload(items_relationship)
         ).filter(and_(
             models.Purchase.date >= start_date,
             models.Purchase.date <= end_date
         ))
+    elif category_code:
+        query = query.options(selectinload(items_relationship))
     else:
-        if not category_code:
-            query = query.options(
-                noload(models.Purchase.entity),
-                selectinload(models.Purchase.items).options(
-                    noload(models.PurchaseItem.product)
-                )
+        query = query.options(
+            noload(models.Purchase.entity),
+            selectinload(models.Purchase.items).options(
+                noload(models.PurchaseItem.product)
             )
-    
-    family_ids = []
-    if category_code:
-        category = db.query(models.Category).filter(models.Category.code == category_code).first()
-        
-        if not category:
-            raise HTTPException(status_code=404, detail="Category not found")
-
-        family_ids = get_category_descendants_ids(db, category)
-
-        related_ids = (
-            db.query(models.PurchaseItem.purchase_id)
-            .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
-            .join(models.Category, models.Product.category_id == models.Category.id)
-            .filter(models.Category.id.in_(family_ids))
-            .distinct()
-            .all()
         )
-        related_ids = [item[0] for item in related_ids]
-
-        query = query.filter(models.Purchase.id.in_(related_ids))
     
-    purchases = query.all()
-
-    if category_code:
-        for purchase in purchases:
-            to_remove = []
-            for item in purchase.items:
-                if item.product is None:
-                    to_remove.append(item)
-                    continue
-                if item.product.category_id not in family_ids:
-                    to_remove.append(item)
-                    continue
-            purchase.items = [item for item in purchase.items if item not in to_remove]
+    purchases = paginate(query, response, [models.Purchase.date, models.Purchase.id], limit, after, descending=True)
 
     return purchases
 
-@app.post("/product_codes/", response_model=schemas.ProductCode)
-def create_product_code(product_code: schemas.ProductCodeCreate, db: Session = Depends(get_db)):
-    with conn.get_publisher() as publisher:
-        db_product = models.Product(
-            title=product_code.product.title,
-            description=product_code.product.description,
-            read_category=product_code.product.read_category,
-        )
-        if product_code.product.img_urls:
-            db_product.img_url = product_code.product.img_urls[0]
-        db.add(db_product)
+def run_backfill(backfill: Callable, *args):
+    db = database.SessionLocal()
+    try:
+        updated = backfill(db, *args)
         db.commit()
-        db.refresh(db_product)
-        publisher.publish(PRODUCT_EXCHANGE, PRODUCT_CLASSIFY_KEY, schemas.Product.model_validate(db_product))
+        logging.info(f"{backfill.__name__} updated {updated} rows")
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"{backfill.__name__} failed: {str(e)}")
+    finally:
+        db.close()
+
+@app.post("/product_codes/", response_model=schemas.ProductCode)
+def create_product_code(
+    product_code: schemas.ProductCodeCreate,
+    background_tasks: BackgroundTasks,
+    defer_backfill: bool = Query(False, description="Link the existing purchase items after the response is sent"),
+    db: Session = Depends(get_db)
+):
+    db_product = models.Product(
+        title=product_code.product.title,
+        description=product_code.product.description,
+        read_category=product_code.product.read_category,
+    )
+    if product_code.product.img_urls:
+        db_product.img_url = product_code.product.img_urls[0]
+    db.add(db_product)
+    db.commit()
+    db.refresh(db_product)
+    publish_messages([(PRODUCT_EXCHANGE, PRODUCT_CLASSIFY_KEY, schemas.Product.model_validate(db_product))])
 
     db_entity = models.ProductCode(
         product_id=db_product.id,
@@ -661,77 +758,52 @@ def create_product_code(product_code: schemas.ProductCodeCreate, db: Session = D
         db.rollback()
         raise HTTPException(status_code=400, detail="Could not create establishment due to model constraints.")
 
-    purchase_items_to_update = db.query(models.PurchaseItem).filter(
-            models.PurchaseItem.product_id.is_(None),
-            models.PurchaseItem.read_product_key == db_entity.code
-        ).all()
-
-    for item in purchase_items_to_update:
-        item.product_id = db_entity.product_id
-        db.add(item)
-
-    db.commit()
+    if defer_backfill:
+        background_tasks.add_task(run_backfill, backfill_purchase_items, [db_entity.id])
+    else:
+        backfill_purchase_items(db, [db_entity.id])
+        db.commit()
 
     return db_entity
 
 @app.post("/product_codes/bulk", response_model=List[schemas.ProductCode])
 def create_product_codes(product_codes: List[schemas.ProductCodeCreate], db: Session = Depends(get_db)):
-    created_product_codes = []
-    
-    for product_code in product_codes:
-        try:
-            existing_code = db.query(models.ProductCode).filter_by(
-                format=product_code.format,
-                code=product_code.code
-            ).first()
-            
-            if existing_code:
-                logging.info(f"Product code {product_code.code} with format {product_code.format} already exists. Skipping.")
-                continue
-            
-            db_product = models.Product(
-                title=product_code.product.title,
-                description=product_code.product.description,
-                read_category=product_code.product.read_category,
-            )
-            db.add(db_product)
-            db.commit()
-            db.refresh(db_product)
-            
-            with conn.get_publisher() as publisher:
-                publisher.publish(PRODUCT_EXCHANGE, PRODUCT_CLASSIFY_KEY, schemas.Product.model_validate(db_product))
-
-            db_entity = models.ProductCode(
-                product_id=db_product.id,
-                format=product_code.format,
-                code=product_code.code,
-            )
-            db.add(db_entity)
-            db.commit()
-            db.refresh(db_entity)
-            
-            created_product_codes.append(db_entity)
-
-            purchase_items_to_update = db.query(models.PurchaseItem).filter(
-                models.PurchaseItem.product_id.is_(None),
-                models.PurchaseItem.read_product_key == db_entity.code
-            ).all()
-
-            for item in purchase_items_to_update:
-                item.product_id = db_entity.product_id
-                db.add(item)
+    try:
+        product_code_ids = bulk_create_product_codes(db, product_codes)
+        db.commit()
+    except (IntegrityError, SQLAlchemyError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Database error occurred: {str(e)}")
 
-        except (IntegrityError, SQLAlchemyError) as e:
-            db.rollback()
-            raise HTTPException(status_code=400, detail=f"Database error occurred: {str(e)}")
+    created_product_codes = get_product_codes_by_ids(db, product_code_ids)
+    logging.info(f"{len(created_product_codes)} of {len(product_codes)} product codes created.")
 
-    db.commit()
+    publish_messages([
+        (PRODUCT_EXCHANGE, PRODUCT_CLASSIFY_KEY, schemas.Product.model_validate(db_product_code.product))
+        for db_product_code in created_product_codes
+    ])
 
     return created_product_codes
 
+@app.get("/product_codes/search", response_model=List[schemas.ProductCode], response_model_exclude_none=True)
+def search_product_codes_endpoint(
+    q: str = Query(..., min_length=SEARCH_MIN_LENGTH),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    return search_product_codes(db, q, limit).all()
+
 @app.get("/product_codes/", response_model=List[schemas.ProductCode], response_model_exclude_none=True)
-def get_product_codes(lookahead: Optional[str] = None, format: Optional[str] = None, code: Optional[str] = None, db: Session = Depends(get_db)):
-    if lookahead is not None and len(lookahead) < 3:
+def get_product_codes(
+    response: Response,
+    lookahead: Optional[str] = None,
+    format: Optional[str] = None,
+    code: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if lookahead is not None and len(lookahead) < SEARCH_MIN_LENGTH:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Lookahead must be at least 3 characters long"
@@ -744,20 +816,7 @@ def get_product_codes(lookahead: Optional[str] = None, format: Optional[str] = N
     )
 
     if lookahead is not None:
-        product_ids = db.query(models.Product).with_entities(models.Product.id).filter(
-            or_(
-                models.Product.title.ilike(f"%{lookahead}%"),
-                models.Product.description.ilike(f"%{lookahead}%")
-            )
-        ).all()
-        product_ids = [id[0] for id in product_ids]
-        
-        query = query.filter(
-            or_(
-                models.ProductCode.code.ilike(f"%{lookahead}%"),
-                models.ProductCode.product_id.in_(product_ids)
-            )
-        )
+        query = query.filter(get_lookahead_filter(lookahead))
 
     if format is not None:
         query = query.filter(models.ProductCode.format == format)
@@ -765,7 +824,7 @@ def get_product_codes(lookahead: Optional[str] = None, format: Optional[str] = N
     if code is not None:
         query = query.filter(models.ProductCode.code == code)
 
-    entities = query.all()
+    entities = paginate(query, response, [models.ProductCode.id], limit, after)
     return entities
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
@@ -788,11 +847,14 @@ def update_product(
         raise HTTPException(status_code=404, detail="Product not found")
 
     product_data = product.model_dump(exclude_unset=True)
+    category_changed = "category_id" in product_data and product_data["category_id"] != db_product.category_id
 
     for key, value in product_data.items():
         setattr(db_product, key, value)
 
     try:
+        if category_changed:
+            refresh_daily_totals(db, get_product_days(db, db_product.id))
         db.commit()
         db.refresh(db_product)
     except (IntegrityError, SQLAlchemyError):
@@ -814,38 +876,8 @@ def category_from_string(category_str: str) -> models.Category | None:
         return models.Category(code=code, name=name, original_text=category_str)
     return None
 
-def get_category_descendants_ids(db: Session, category: models.Category):
-    all_ids = [category.id]
-    current_children_ids = [category.id]
-    for child in category.loaded_children:
-        all_ids.append(child.id)
-        current_children_ids.append(child.id)
-        
-    if len(current_children_ids) <= 0:
-        return all_ids
-    
-    while True:
-        descendants = db.query(models.Category).filter(models.Category.parent_id.in_(current_children_ids)).all()
-        if len(descendants) <= 0:
-            break
-        current_children_ids = []
-        for descendant in descendants:
-            all_ids.append(descendant.id)
-            current_children_ids.append(descendant.id)
-
-    return all_ids
-
-def get_category_ancestors_ids(db: Session, category_id: int):
-    category = (
-        db.query(models.Category)
-        .options(selectinload(models.Category.loaded_parent))
-        .filter(models.Category.id == category_id)
-        .first()
-    )
-    ids = [category_id]
-    if category.loaded_parent:
-        ids.extend(get_category_ancestors_ids(db, category.loaded_parent.id))
-    return ids
+def notify_taxonomy_changed(db: Session):
+    db.execute(text("SELECT pg_notify('taxonomy_changed', '')"))
 
 @app.put("/categories/es_es")
 def add_categories_es_es(categories_with_es_es: List[Tuple[str, str]], db: Session = Depends(get_db)):
@@ -857,7 +889,9 @@ def add_categories_es_es(categories_with_es_es: List[Tuple[str, str]], db: Sessi
         
         category.name_es_es = name_es_es
         
+    notify_taxonomy_changed(db)
     db.commit()
+    taxonomy.invalidate()
     return {"status": "success", "message": "Categories updated successfully"}
 
 @app.post("/categories/")
@@ -895,39 +929,36 @@ def set_categories(categories: List[str], db: Session = Depends(get_db)):
                     if parent_category:
                         category.parent = parent_category
 
+            rebuild_category_closures(db)
+            notify_taxonomy_changed(db)
             db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Error processing categories: {str(e)}")
+    taxonomy.invalidate()
 
 @app.get("/categories/", response_model=List[schemas.Category], response_model_exclude_none=True)
 def get_categories(
+    response: Response,
     code: Optional[str] = None, 
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     db: Session = Depends(get_db)
     ):
     if start_date and end_date:
-        purchases = db.query(models.Purchase).filter(
-            models.Purchase.date.between(start_date, end_date)
-        ).options(
-            selectinload(models.Purchase.items)
-            .selectinload(models.PurchaseItem.product)
-            .selectinload(models.Product.category)
-        ).all()
-        
-        root_categories = set()
-        for purchase in purchases:
-            for item in purchase.items:
-                product = item.product
-                if not product:
-                    continue
-                category = product.category
-                if not category:
-                    continue
-                while category.loaded_parent is not None:
-                    category = category.loaded_parent
-                root_categories.add(category)
+        category_ids = (
+            db.query(distinct(models.Product.category_id))
+            .join(models.PurchaseItem, models.PurchaseItem.product_id == models.Product.id)
+            .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+            .filter(models.Purchase.date.between(start_date, end_date))
+            .filter(models.Product.category_id.isnot(None))
+            .all()
+        )
+        snapshot = taxonomy.get(db)
+        root_ids = {snapshot.get_root_id(category_id) for category_id, in category_ids}
+        root_categories = db.query(models.Category).filter(models.Category.id.in_(root_ids)).all() if root_ids else []
         
         categories_list = list(root_categories)
         return categories_list
@@ -940,7 +971,7 @@ def get_categories(
                 noload(models.Category.children),
                 noload(models.Category.parent)
             )
-        entities = query.all()
+        entities = paginate(query, response, [models.Category.id], limit, after)
         return entities
 
 @app.post("/expenses/all-purchases/", response_model=List[Tuple[schemas.Category, float]])
@@ -963,24 +994,8 @@ def get_all_expenses_by_category(
             detail=f"Category codes not found: {missing_codes}"
         )
 
-    categories_with_expenses = []
-    for category in categories:
-        family_ids = get_category_descendants_ids(db, category)
-
-        purchase_items = (
-            db.query(models.PurchaseItem)
-            .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
-            .join(models.Category, models.Product.category_id == models.Category.id)
-            .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)  # Join with Purchase
-            .filter(models.Category.id.in_(family_ids))
-        )
-        if start_date:
-            purchase_items = purchase_items.filter(models.Purchase.date >= start_date)
-        if end_date:
-            purchase_items = purchase_items.filter(models.Purchase.date <= end_date)
-
-        purchase_items = purchase_items.all()
-        categories_with_expenses.append((category,purchases_tools.calculate_purchase_total(schemas.PurchaseCreate(),purchase_items) or 0))
+    totals = get_category_totals(db, [category.id for category in categories], start_date, end_date)
+    categories_with_expenses = [(category, totals.get(category.id, 0)) for category in categories]
 
     return categories_with_expenses
 
@@ -989,43 +1004,16 @@ def get_expenses_by_category(
     purchase_id: int,
     db: Session = Depends(get_db)
 ):
-    purchase_categories = (
-        db.query(models.Category)
-        .join(models.Product, models.Category.id == models.Product.category_id)
-        .join(models.PurchaseItem, models.Product.id == models.PurchaseItem.product_id)
-        .filter(models.PurchaseItem.purchase_id == purchase_id)
-        .all()
-    )
-
-    family_of = {}
-    present_ids = set()
-    for category in purchase_categories:
-        family_ids = get_category_ancestors_ids(db, category.id)
-        family_of[category.id] = family_ids
-        present_ids.update(family_ids)
-
-    present_categories = db.query(models.Category).filter(models.Category.id.in_(present_ids)).all()
-    categories_expenses_map = {}
-    for category in present_categories:
-        categories_expenses_map[category.id] = (category, 0)
-
-    for category in purchase_categories:
-        purchase_items = (
-            db.query(models.PurchaseItem)
-            .filter(models.PurchaseItem.purchase_id == purchase_id)
-            .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
-            .join(models.Category, models.Product.category_id == models.Category.id)
-            .filter(models.Category.id == category.id)
-            .all()
-        )
-        for affected_id in family_of[category.id]:
-            categories_expenses_map[affected_id] = (categories_expenses_map[affected_id][0], categories_expenses_map[affected_id][1] + (purchases_tools.calculate_purchase_total(schemas.PurchaseCreate(),purchase_items) or 0))
-
-    return categories_expenses_map.values()
+    return get_purchase_category_totals(db, purchase_id)
 
 @app.get("/establishments/", response_model=List[schemas.Establishment])
-def get_establishments(db: Session = Depends(get_db)):
-    db_entity = db.query(models.Establishment).all()
+def get_establishments(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    db_entity = paginate(db.query(models.Establishment), response, [models.Establishment.id], limit, after)
     return db_entity
 
 @app.post("/establishments/", response_model=schemas.Establishment)
@@ -1046,7 +1034,12 @@ def create_establishment(establishment: schemas.EstablishmentCreate, db: Session
     return db_entity
 
 @app.post("/entities/", response_model=schemas.Entity)
-def create_entity(entity: schemas.EntityCreate, db: Session = Depends(get_db)):
+def create_entity(
+    entity: schemas.EntityCreate,
+    background_tasks: BackgroundTasks,
+    defer_backfill: bool = Query(False, description="Link the existing purchases after the response is sent"),
+    db: Session = Depends(get_db)
+):
     db_entity = models.Entity(
         name = entity.name,
         identification = entity.identification,
@@ -1062,16 +1055,11 @@ def create_entity(entity: schemas.EntityCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail="Could not create establishment due to model constraints.")
 
-    purchases_to_update = db.query(models.Purchase).filter(
-            models.Purchase.entity_id.is_(None),
-            func.regexp_replace(models.Purchase.read_entity_identification, '[^0-9]', '', 'g') == str(db_entity.identification)
-        ).all()
-
-    for item in purchases_to_update:
-        item.entity_id = db_entity.id
-        db.add(item)
-
-    db.commit()
+    if defer_backfill:
+        background_tasks.add_task(run_backfill, backfill_purchase_entities, db_entity.id, db_entity.identification)
+    else:
+        backfill_purchase_entities(db, db_entity.id, db_entity.identification)
+        db.commit()
 
     return db_entity
 
@@ -1085,62 +1073,39 @@ def get_product_by_id(entities_id: int, db: Session = Depends(get_db)):
     return entity
 
 @app.get("/entities/", response_model=List[schemas.Entity], response_model_exclude_none=True)
-def get_categories(identification: Optional[int] = None, db: Session = Depends(get_db)):
+def get_categories(
+    response: Response,
+    identification: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     query = db.query(models.Entity)
     if identification is not None:
         query = query.filter(models.Entity.identification == identification)
-    entities = query.all()
+    entities = paginate(query, response, [models.Entity.id], limit, after)
     return entities
 
-@app.get("/restockables/product-codes", response_model=List[str], response_model_exclude_none=True)
-def get_restockables_product_codes(db: Session = Depends(get_db)):
-    two_years_ago = datetime.now() - timedelta(days=2 * 365)
+def get_restockables_since() -> date:
+    return (datetime.now() - timedelta(days=RESTOCKABLE_WINDOW_DAYS)).date()
 
-    query = (
-        db.query(models.PurchaseItem.read_product_key)
-        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-        .filter(models.Purchase.date >= two_years_ago)
-        .group_by(models.PurchaseItem.read_product_key)
-        .having(func.count(distinct(func.date(models.Purchase.date))) >= 3)
-    )
-
-    product_codes = [key[0] for key in query.all()]
-
-    return product_codes
+@app.get("/restockables/product-codes", response_model=List[str], response_model_exclude_none=True)
+def get_restockables_product_codes(min_days: int = Query(RESTOCKABLE_MIN_DAYS, ge=1), db: Session = Depends(get_db)):
+    query = get_restockables_query(db, models.RestockableProductKey, min_days, get_restockables_since())
+    return [key for key, in query.with_entities(models.RestockableProductKey.product_key).all()]
 
 @app.get("/restockables/product-ids", response_model=List[int], response_model_exclude_none=True)
-def get_restockables_product_ids(db: Session = Depends(get_db)):
-    two_years_ago = datetime.now() - timedelta(days=2 * 365)
-
-    query = (
-        db.query(models.PurchaseItem.product_id)
-        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-        .filter(models.Purchase.date >= two_years_ago)
-        .group_by(models.PurchaseItem.product_id)
-        .having(func.count(models.PurchaseItem.product_id) >= 3)
-    )
-
-    product_ids = [key[0] for key in query.all()]
-
-    return product_ids
+def get_restockables_product_ids(min_days: int = Query(RESTOCKABLE_MIN_DAYS, ge=1), db: Session = Depends(get_db)):
+    query = get_restockables_query(db, models.RestockableProduct, min_days, get_restockables_since())
+    return [key for key, in query.with_entities(models.RestockableProduct.product_id).all()]
 
 @app.get("/restockables/categories", response_model=List[int], response_model_exclude_none=True)
-def get_restockables_product_codes(db: Session = Depends(get_db)):
-    two_years_ago = datetime.now() - timedelta(days=2 * 365)
-
+def get_restockables_categories(min_days: int = Query(RESTOCKABLE_MIN_DAYS, ge=1), db: Session = Depends(get_db)):
     query = (
-        db.query(models.Category.code)
-        .join(models.Product, models.Product.category_id == models.Category.id)
-        .join(models.PurchaseItem, models.PurchaseItem.product_id == models.Product.id)
-        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-        .filter(models.Purchase.date >= two_years_ago)
-        .group_by(models.Category.code)
-        .having(func.count(distinct(func.date(models.Purchase.date))) >= 3)
+        get_restockables_query(db, models.RestockableCategory, min_days, get_restockables_since())
+        .join(models.Category, models.RestockableCategory.category_id == models.Category.id)
     )
-
-    category_codes = [key[0] for key in query.all()]
-
-    return category_codes
+    return [key for key, in query.with_entities(models.Category.code).all()]
 
 @app.post("/node_tokens/authorize_crawl")
 def get_crawl_authorization(node_token: schemas.NodeToken = Depends(get_node_token), db: Session = Depends(get_db)):
@@ -1172,46 +1137,25 @@ def get_crawl_authorization(node_token: schemas.NodeToken = Depends(get_node_tok
 
     return {"status": "Authorized", "uses_today": crawl_counter.uses}
 
-@app.get("/historics/by-product-code/{product_code}", response_model=List[schemas.Historic])
-def get_historic_by_product_code(product_code: str, db: Session = Depends(get_db)):
-    purchase_items = db.query(models.PurchaseItem).options(selectinload(models.PurchaseItem.purchase)).filter(models.PurchaseItem.read_product_key == product_code).all()
-
-    historic_dates = {}
-    for item in purchase_items:
-        if not item.purchase.date or not item.quantity:
-            continue
-        if historic_dates.get(item.purchase.date):
-            historic_dates[item.purchase.date] += item.quantity
-        else:
-            historic_dates[item.purchase.date] = item.quantity
-            
-    historic = [schemas.Historic(date=date, quantity=quantity) for date, quantity in historic_dates.items()]
-
-    return historic
-
-@app.get("/historics/by-category-code/{category_code}", response_model=List[schemas.Historic])
-def get_historic_by_category_code(category_code: str, db: Session = Depends(get_db)):
-    purchase_items = (
-        db.query(models.PurchaseItem)
-        .options(selectinload(models.PurchaseItem.purchase))
-        .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
-        .join(models.Category, models.Product.category_id == models.Category.id)
-        .filter(models.Category.code == category_code)
-        .all()
-    )
-
-    historic_dates = {}
-    for item in purchase_items:
-        if not item.purchase.date or not item.quantity:
-            continue
-        if historic_dates.get(item.purchase.date):
-            historic_dates[item.purchase.date] += item.quantity
-        else:
-            historic_dates[item.purchase.date] = item.quantity
-            
-    historic = [schemas.Historic(date=date, quantity=quantity) for date, quantity in historic_dates.items()]
+@app.get("/historics/by-product-code/{product_code}", response_model=schemas.HistoricSeries)
+def get_historic_by_product_code(
+    product_code: str,
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db)
+):
+    return get_product_code_historic(db, product_code, bucket, start_date, end_date)
 
-    return historic
+@app.get("/historics/by-category-code/{category_code}", response_model=schemas.HistoricSeries)
+def get_historic_by_category_code(
+    category_code: int,
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db)
+):
+    return get_category_code_historic(db, category_code, bucket, start_date, end_date)
 
 @app.post("/predictions/", response_model=schemas.Prediction)
 def create_prediction(prediction: schemas.PredictionCreate, db: Session = Depends(get_db)):
@@ -1233,6 +1177,7 @@ def create_prediction(prediction: schemas.PredictionCreate, db: Session = Depend
 
     try:
         db.add(db_entity)
+        set_current_prediction(db, db_entity)
         db.commit()
         db.refresh(db_entity)
     except (IntegrityError, SQLAlchemyError):
@@ -1243,7 +1188,7 @@ def create_prediction(prediction: schemas.PredictionCreate, db: Session = Depend
 
 @app.get("/predictions/by-category-code/{category_code}", response_model=schemas.Prediction, response_model_exclude_none=True)
 def get_latest_category_prediction(category_code: str, db: Session = Depends(get_db)): 
-    entity = db.query(models.Prediction).filter(models.Prediction.category_code == category_code).order_by(models.Prediction.created_at.desc()).first()
+    entity = get_current_prediction(db, "category_code", category_code)
 
     if not entity:
         raise HTTPException(status_code=404, detail="No prediction found")
@@ -1252,7 +1197,7 @@ def get_latest_category_prediction(category_code: str, db: Session = Depends(get
 
 @app.get("/predictions/by-product-code/{product_code}", response_model=schemas.Prediction, response_model_exclude_none=True)
 def get_latest_product_prediction(product_code: str, db: Session = Depends(get_db)): 
-    entity = db.query(models.Prediction).filter(models.Prediction.product_key == product_code).order_by(models.Prediction.created_at.desc()).first()
+    entity = get_current_prediction(db, "product_key", product_code)
 
     if not entity:
         raise HTTPException(status_code=404, detail="No prediction found")
@@ -1260,85 +1205,36 @@ def get_latest_product_prediction(product_code: str, db: Session = Depends(get_d
     return entity
 
 @app.get("/purchase_items/product_codes/", response_model=List[Dict[str, str]])
-async def get_product_codes(db: Session = Depends(get_db)):
-    result = db.query(
-        models.PurchaseItem.read_product_text,
-        models.PurchaseItem.read_product_key
-    ).join(
-        models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id
-    ).group_by(
-        models.PurchaseItem.read_product_key,
-        models.PurchaseItem.read_product_text
-    ).having(
-        func.count(distinct(func.date(models.Purchase.date))) >= 3
-    ).all()
+def get_product_codes(min_days: int = Query(RESTOCKABLE_MIN_DAYS, ge=1), db: Session = Depends(get_db)):
+    query = get_restockables_query(db, models.RestockableProductKey, min_days)
+    result = query.with_entities(models.RestockableProductKey.read_product_text, models.RestockableProductKey.product_key).all()
 
     return [{"read_product_text": text or key, "read_product_key": key} for text, key in result]
 
 @app.get("/predictions/suggested_carts", response_model=List[schemas.Cart])
-async def get_suggested_carts(db: Session = Depends(get_db)):
-    all_predictions = [schemas.Prediction.model_validate(prediction) for prediction in get_latest_predictions(db)]
+def get_suggested_carts(db: Session = Depends(get_db)):
+    all_predictions = [schemas.Prediction.model_validate(prediction) for prediction in get_current_predictions(db)]
     clean_predictions = remove_past_dates(all_predictions)
     present_category_codes = [int(item.category_code) for item in clean_predictions if item.category_code]
-    redundant_product_codes = get_redundant_product_codes(db,present_category_codes)
+    redundant_product_codes = set(get_redundant_product_codes(db,present_category_codes))
     clean_predictions = [prediction for prediction in clean_predictions if not prediction.product_key in redundant_product_codes]
 
-    grouped_by_type = group_by_type([prediction for prediction in clean_predictions if prediction.category_code], db)
+    category_predictions = [prediction for prediction in clean_predictions if prediction.category_code]
+    grouped_by_type = group_by_type(category_predictions, get_type_periods(db, category_predictions))
     grouped_by_density = group_by_density([prediction for prediction in clean_predictions if prediction.product_key])
 
+    cart_details = CartDetails(
+        db,
+        [prediction.product_key for prediction in clean_predictions if prediction.product_key],
+        [int(prediction.category_code) for prediction in clean_predictions if prediction.category_code]
+    )
+
     carts = []
     for date in grouped_by_density.keys():
         new_cart = schemas.Cart(date=date)
 
         for (prediction, item) in grouped_by_density[date]:
-            latest_text = (
-                db.query(models.PurchaseItem.read_product_text)
-                .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                .filter(models.PurchaseItem.read_product_text.isnot(None))
-                .filter(models.PurchaseItem.read_product_key == prediction.product_key)
-                .order_by(models.Purchase.date.desc())
-                .limit(1)
-                .first()
-            )
-            
-            if latest_text:
-                latest_text = latest_text[0]
-
-            latest_value = (
-                db.query(models.PurchaseItem.value)
-                .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                .filter(models.PurchaseItem.value.isnot(None))
-                .filter(models.PurchaseItem.read_product_key == prediction.product_key)
-                .order_by(models.Purchase.date.desc())
-                .limit(1)
-                .first()
-            )
-            if latest_value:
-                latest_value = latest_value[0]
-            else:
-                latest_value = (
-                    db.query(models.PurchaseItem.quantity, models.PurchaseItem.total)
-                        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                        .filter(models.PurchaseItem.quantity.isnot(None))
-                        .filter(models.PurchaseItem.total.isnot(None))
-                        .filter(models.PurchaseItem.read_product_key == prediction.product_key)
-                        .order_by(models.Purchase.date.desc())
-                        .limit(1)
-                        .first()
-                )
-                if latest_value:
-                    if latest_value[0] != 0:
-                        latest_value = latest_value[1]/latest_value[0]
-                    else:
-                        latest_value = None
-
-            found_product = (
-                db.query(models.Product)
-                    .join(models.PurchaseItem, models.PurchaseItem.product_id == models.Product.id)
-                    .filter(models.PurchaseItem.read_product_key == prediction.product_key)
-                    .limit(1)
-                    .first()
-            )
+            latest_text, latest_value, found_product = cart_details.get_product_key_details(prediction.product_key)
 
             new_cart.items.append(
                 schemas.PurchaseItemCart(
@@ -1356,45 +1252,7 @@ async def get_suggested_carts(db: Session = Depends(get_db)):
         new_cart = schemas.Cart(date=date)
 
         for (prediction, item) in grouped_by_type[date]:
-            latest_product = (
-                db.query(models.Product)
-                    .join(models.Category, models.Product.category_id == models.Category.id)
-                    .join(models.PurchaseItem, models.PurchaseItem.product_id == models.Product.id)
-                    .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                    .filter(models.Category.code == prediction.category_code)
-                    .order_by(models.Purchase.date.desc())
-                    .limit(1)
-                    .first()
-            )
-
-            if latest_product:
-                latest_value = (
-                    db.query(models.PurchaseItem.value)
-                    .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                    .filter(models.PurchaseItem.value.isnot(None))
-                    .filter(models.PurchaseItem.product_id == latest_product.id)
-                    .order_by(models.Purchase.date.desc())
-                    .limit(1)
-                    .first()
-                )
-                if latest_value:
-                    latest_value = latest_value[0]
-                else:
-                    latest_value = (
-                        db.query(models.PurchaseItem.quantity, models.PurchaseItem.total)
-                            .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
-                            .filter(models.PurchaseItem.quantity.isnot(None))
-                            .filter(models.PurchaseItem.total.isnot(None))
-                            .filter(models.PurchaseItem.product_id == latest_product.id)
-                            .order_by(models.Purchase.date.desc())
-                            .limit(1)
-                            .first()
-                    )
-                    if latest_value:
-                        if latest_value[0] != 0:
-                            latest_value = latest_value[1]/latest_value[0]
-                        else:
-                            latest_value = None
+            latest_product, latest_value = cart_details.get_category_details(int(prediction.category_code))
 
             new_cart.items.append(
                 schemas.PurchaseItemCart(
@@ -1432,115 +1290,13 @@ def merge_carts(carts: List[schemas.Cart]) -> List[schemas.Cart]:
     
     return merged_carts
 
-def group_by_type(predictions: List[schemas.Prediction], db: Session):
-    type_periods = {
-        412: timedelta(weeks=1), # Food, Beverages & Tobacco
-        537: timedelta(weeks=2), # Baby & Toddler
-        469: timedelta(weeks=2), # Health & Beauty
-        1: timedelta(weeks=2),   # Animals & Pet Supplies
-        922: timedelta(weeks=8), # Office Supplies
-    }
-    item_periods = {}
-    for prediction in predictions:
-        category_id = db.query(models.Category.id).filter(models.Category.code == prediction.category_code).first()
-        top_parent_id = get_category_ancestors_ids(db, category_id[0])[-1]
-        top_parent_code = db.query(models.Category.code).filter(models.Category.id == top_parent_id).first()
-        for item in prediction.items:
-            item_periods[item.id] = type_periods.get(top_parent_code[0], timedelta(weeks=4))
-
-    prediction_items: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
-    for prediction in predictions:
-        prediction_items.extend([(prediction, item) for item in prediction.items])
-    prediction_items = sorted(prediction_items, key=lambda p: p[1].date)
-    
-    groups: Dict[datetime,List[Tuple[schemas.Prediction, schemas.PredictionItem]]] = {}
-    starting_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    groups[starting_time] = []
-    grouped_items = []
-    while len(grouped_items) < len(prediction_items):
-        for prediction, item in prediction_items:
-            if item in grouped_items:
-                continue
-            if item.date <= starting_time + item_periods[item.id]:
-                grouped_items.append(item)
-                groups[starting_time].append((prediction, item))
-        next_item = next(
-            (item for _, item in prediction_items if item not in grouped_items), None
-        )
-        starting_time = (
-            next_item.date.replace(hour=0, minute=0, second=0, microsecond=0)
-            if next_item else starting_time + timedelta(weeks=1)
-        )
-        if starting_time not in groups:
-            groups[starting_time] = []
-
-    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
-    return groups
-
-def consolidate_items(items: List[Tuple[schemas.Prediction, schemas.PredictionItem]]):
-    consolidated: Dict[str, List[Tuple[schemas.Prediction, schemas.PredictionItem]]] = {}
-    for prediction, item in items:
-        identifier = prediction.category_code or prediction.product_key
-        if identifier not in consolidated:
-            consolidated[identifier] = (prediction, item)
-        else:
-            existing_prediction, existing_item = consolidated[identifier]
-            existing_item.quantity += item.quantity
-            consolidated[identifier] = (existing_prediction, existing_item)
-    return consolidated.values()
-
-def get_timedelta_for_weight(weight):
-    weight_periods = [
-        (1, 1, timedelta(days=34)),
-        (2, 2, timedelta(days=21)),
-        (3, 3, timedelta(days=13)),
-        (4, 5, timedelta(days=8)),
-        (6, 8, timedelta(days=5)),
-        (9, 13, timedelta(days=3)),
-        (14, 21, timedelta(days=2)),
-        (22, 34, timedelta(days=1)),
-    ]
-    for start, end, period in weight_periods:
-        if start <= weight <= end:
-            return period
-    return timedelta()
-
-def group_by_density(predictions: List[schemas.Prediction]):
-    prediction_items: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
+def get_type_periods(db: Session, predictions: List[schemas.Prediction]) -> Dict[str, timedelta]:
+    snapshot = taxonomy.get(db)
+    type_periods = {}
     for prediction in predictions:
-        prediction_items.extend([(prediction, item) for item in prediction.items])
-    prediction_items = sorted(prediction_items, key=lambda p: p[1].date)
-
-    groups: Dict[datetime,List[Tuple[schemas.Prediction, schemas.PredictionItem]]] = {}
-    last_idx = 0
-    while last_idx + 1 < len(prediction_items):
-        middle_date = None
-        weight = 0
-        current_group: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
-        for idx, (prediction, item) in enumerate(prediction_items[last_idx:], start=last_idx):
-            last_idx = idx
-            if item.date > (middle_date or item.date) + get_timedelta_for_weight(weight):
-                break
-            current_group.append((prediction,item))
-            middle_date = calculate_middle_date(middle_date or item.date, weight, item.date, item.quantity)
-            weight += item.quantity
-
-        if middle_date not in groups:
-            groups[middle_date] = current_group
-        else:
-            groups[middle_date].extend(current_group)
-
-    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
-    return groups
-
-def calculate_middle_date(current_date: datetime, current_weight: float, incoming_date: datetime, incoming_weight: float):
-    if current_weight + incoming_weight <= 0:
-        percentage = 1
-    else:
-        percentage = current_weight / (current_weight + incoming_weight)
-    
-    offset = (incoming_date - current_date) * percentage
-    return incoming_date - offset
+        if prediction.category_code not in type_periods:
+            type_periods[prediction.category_code] = get_type_period(snapshot.get_root_code(int(prediction.category_code)))
+    return type_periods
 
 def get_redundant_product_codes(db: Session, category_codes: List[int]):
     product_codes = (
@@ -1565,42 +1321,3 @@ def remove_past_dates(predictions: List[schemas.Prediction]) -> List[schemas.Pre
         if prediction.items:
             clean_predictions.append(prediction)
     return clean_predictions
-
-def get_latest_predictions(db: Session):
-    query_product = db.query(
-        models.Prediction.product_key.label('key'),
-        func.max(models.Prediction.created_at).label('max_created_at')
-    ).filter(
-        models.Prediction.product_key.isnot(None)
-    ).group_by(
-        models.Prediction.product_key
-    )
-
-    query_category = db.query(
-        models.Prediction.category_code.label('key'),
-        func.max(models.Prediction.created_at).label('max_created_at')
-    ).filter(
-        models.Prediction.category_code.isnot(None)
-    ).group_by(
-        models.Prediction.category_code
-    )
-
-    subq = query_product.union_all(query_category).subquery()
-
-    latest_predictions = db.query(models.Prediction).join(
-        subq,
-        or_(
-            and_(
-                models.Prediction.product_key == subq.c.key,
-                models.Prediction.created_at == subq.c.max_created_at
-            ),
-            and_(
-                models.Prediction.category_code == subq.c.key,
-                models.Prediction.created_at == subq.c.max_created_at
-            )
-        )
-    ).options(
-        selectinload(models.Prediction.items)
-    ).all()
-
-    return latest_predictions
\ No newline at end of file
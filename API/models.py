@@ -1,11 +1,21 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Float, ForeignKey, Text, func, event, UniqueConstraint, BigInteger, Boolean, Date, Enum
+    Column, Integer, String, DateTime, Float, ForeignKey, Text, func, event, UniqueConstraint, BigInteger, Boolean, Date, Enum, Index
 )
 from sqlalchemy.orm import relationship, declarative_base, validates
+from datetime import datetime
 from .schemas import ReceiptStatus
+from PyLib import receipt_tools
 
 Base = declarative_base()
 
+def get_entity_identification(identification: str | None) -> int | None:
+    if not identification:
+        return None
+    try:
+        return receipt_tools.normalize_entity_id(identification)
+    except ValueError:
+        return None
+
 class Purchase(Base):
     __tablename__ = 'purchases'
     id = Column(Integer, primary_key=True, index=True)
@@ -15,6 +25,7 @@ class Purchase(Base):
     read_entity_location=Column(String(255), nullable=True)
     read_entity_address=Column(String(255), nullable=True)
     read_entity_identification=Column(String(255), nullable=True)
+    entity_identification = Column(BigInteger, nullable=True, index=True)
     read_entity_phone=Column(String(255), nullable=True)
     date = Column(DateTime, default=func.now())
     subtotal = Column(Float, nullable=True)
@@ -28,12 +39,20 @@ class Purchase(Base):
     items = relationship('PurchaseItem', back_populates='purchase', lazy='selectin')
     entity = relationship('Entity')
 
+    # matches the pagination sort key, where missing dates sort as datetime.min
+    __table_args__ = (Index('ix_purchases_date_id', func.coalesce(date, datetime.min), id),)
+
+    @validates('read_entity_identification')
+    def validate_read_entity_identification(self, key, value):
+        self.entity_identification = get_entity_identification(value)
+        return value
+
 class PurchaseItem(Base):
     __tablename__ = 'purchase_items'
     id = Column(Integer, primary_key=True, index=True)
     purchase_id = Column(Integer, ForeignKey('purchases.id'), nullable=False)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
-    read_product_key = Column(String(255), nullable=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True, index=True)
+    read_product_key = Column(String(255), nullable=True, index=True)
     read_product_text = Column(String(255), nullable=True)
     quantity = Column(Float, nullable=True)
     value = Column(Float, nullable=True)
@@ -72,17 +91,68 @@ class Category(Base):
     loaded_children = relationship(
         'Category',
         back_populates='parent',
-        lazy='selectin',
+        lazy='select',
         viewonly=True
     )
     loaded_parent = relationship(
         'Category',
         remote_side=[id],
         back_populates='children',
-        lazy='selectin',
+        lazy='select',
         viewonly=True
     )
 
+class CategoryClosure(Base):
+    __tablename__ = 'category_closures'
+    ancestor_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey('categories.id'), primary_key=True, index=True)
+    depth = Column(Integer, nullable=False)
+
+class DailyProductTotal(Base):
+    __tablename__ = 'daily_product_totals'
+    day = Column(Date, primary_key=True)
+    product_key = Column(String(255), primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    spend = Column(Float, nullable=False, default=0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index('ix_daily_product_totals_product_key_day', 'product_key', 'day'),)
+
+class DailyCategoryTotal(Base):
+    __tablename__ = 'daily_category_totals'
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    spend = Column(Float, nullable=False, default=0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index('ix_daily_category_totals_category_id_day', 'category_id', 'day'),)
+
+class RestockableProductKey(Base):
+    __tablename__ = 'restockable_product_keys'
+    product_key = Column(String(255), primary_key=True)
+    read_product_text = Column(String(255), nullable=True)
+    day_count = Column(Integer, nullable=False)
+    last_day = Column(Date, nullable=False)
+
+    __table_args__ = (Index('ix_restockable_product_keys_day_count_last_day', 'day_count', 'last_day'),)
+
+class RestockableProduct(Base):
+    __tablename__ = 'restockable_products'
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    day_count = Column(Integer, nullable=False)
+    last_day = Column(Date, nullable=False)
+
+    __table_args__ = (Index('ix_restockable_products_day_count_last_day', 'day_count', 'last_day'),)
+
+class RestockableCategory(Base):
+    __tablename__ = 'restockable_categories'
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    day_count = Column(Integer, nullable=False)
+    last_day = Column(Date, nullable=False)
+
+    __table_args__ = (Index('ix_restockable_categories_day_count_last_day', 'day_count', 'last_day'),)
+
 class Entity(Base):
     __tablename__ = 'entities'
     id = Column(Integer, primary_key=True, index=True)
@@ -126,10 +196,15 @@ class Product(Base):
     entity = relationship('Entity') 
     category = relationship('Category') 
 
+    __table_args__ = (
+        Index('ix_products_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('ix_products_description_trgm', 'description', postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}),
+    )
+
 class ProductCode(Base):
     __tablename__ = 'product_codes'
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
     format = Column(String(255), nullable=False)
     code = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=func.now())
@@ -138,7 +213,10 @@ class ProductCode(Base):
     
     product = relationship('Product') 
 
-    __table_args__ = (UniqueConstraint('format', 'code', name='uix_format_code'),)
+    __table_args__ = (
+        UniqueConstraint('format', 'code', name='uix_format_code'),
+        Index('ix_product_codes_code_trgm', 'code', postgresql_using='gin', postgresql_ops={'code': 'gin_trgm_ops'}),
+    )
 
 class NodeToken(Base):
     __tablename__ = "node_tokens"
@@ -168,6 +246,7 @@ class Receipt(Base):
     status = Column(Enum(ReceiptStatus), default=ReceiptStatus.CREATED, nullable=False)
     purchase_id = Column(Integer, ForeignKey('purchases.id'), nullable=True)
     image_url = Column(String, unique=True, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)
     reference_name = Column(String, default='image', nullable=True)
     error_message = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
@@ -183,9 +262,15 @@ class Prediction(Base):
 
     items = relationship('PredictionItem', lazy='selectin')
 
+class CurrentPrediction(Base):
+    __tablename__ = 'current_predictions'
+    key_type = Column(String(32), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    prediction_id = Column(Integer, ForeignKey('predictions.id'), nullable=False, index=True)
+
 class PredictionItem(Base):
     __tablename__ = 'prediction_items'
     id = Column(Integer, primary_key=True, index=True)
-    prediction_id = Column(Integer, ForeignKey('predictions.id'), nullable=False)
+    prediction_id = Column(Integer, ForeignKey('predictions.id'), nullable=False, index=True)
     quantity = Column(Float, nullable=False)
     date = Column(DateTime, nullable=False)
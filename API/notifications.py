@@ -0,0 +1,132 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Set
+import asyncio
+import logging
+import psycopg2
+
+class ReceiptEventConnection:
+    def __init__(self, subscribed_id: int, max_pending_events: int):
+        self.subscribed_id = subscribed_id
+        self.pending_events: Deque[Any] = deque(maxlen=max_pending_events)
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, event: Any):
+        if self.closed:
+            return
+        if self.pending_events and self.pending_events[-1] == event:
+            return
+        self.pending_events.append(event)
+        self.ready.set()
+
+    async def get(self, timeout: float | None = None) -> Any:
+        await asyncio.wait_for(self.ready.wait(), timeout)
+        if not self.pending_events:
+            return None
+        event = self.pending_events.popleft()
+        if not self.pending_events and not self.closed:
+            self.ready.clear()
+        return event
+
+    def close(self):
+        self.closed = True
+        self.pending_events.clear()
+        self.ready.set()
+
+class ConnectionManager:
+    def __init__(self, max_pending_events: int = 8):
+        self.max_pending_events = max_pending_events
+        self.subscriptions: Dict[int, Set[ReceiptEventConnection]] = {}
+
+    def connect(self, subscribed_id: int) -> ReceiptEventConnection:
+        sub_obj = ReceiptEventConnection(subscribed_id, self.max_pending_events)
+        self.subscriptions.setdefault(subscribed_id, set()).add(sub_obj)
+        return sub_obj
+
+    def disconnect(self, sub_obj: ReceiptEventConnection):
+        subscribers = self.subscriptions.get(sub_obj.subscribed_id)
+        if subscribers is not None:
+            subscribers.discard(sub_obj)
+            if not subscribers:
+                del self.subscriptions[sub_obj.subscribed_id]
+        sub_obj.close()
+
+    def notify_all(self, id: int, event: Any = None):
+        for sub_obj in self.subscriptions.get(id, ()):
+            sub_obj.push(id if event is None else event)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self.subscriptions.values())
+
+    def close(self):
+        for subscribers in self.subscriptions.values():
+            for sub_obj in subscribers:
+                sub_obj.close()
+        self.subscriptions.clear()
+
+class PostgresListener:
+    def __init__(self, dsn: str, channel: str, callback: Callable[[str], Any], reconnect_delay: float = 5):
+        self.dsn = dsn
+        self.channel = channel
+        self.callback = callback
+        self.reconnect_delay = reconnect_delay
+        self.conn = None
+        self.conn_fd = None
+        self.connect_task: asyncio.Task | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.connect_task = self.loop.create_task(self._connect())
+
+    async def stop(self):
+        if self.connect_task:
+            self.connect_task.cancel()
+            try:
+                await self.connect_task
+            except asyncio.CancelledError:
+                pass
+        self._drop_connection()
+
+    def _open_connection(self):
+        conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as curs:
+            curs.execute(f"LISTEN {self.channel};")
+        return conn
+
+    async def _connect(self):
+        while True:
+            try:
+                self.conn = await asyncio.to_thread(self._open_connection)
+                break
+            except psycopg2.Error as ex:
+                logging.error(f"Could not listen to '{self.channel}': {ex}. Retrying in {self.reconnect_delay} seconds...")
+                await asyncio.sleep(self.reconnect_delay)
+        self.conn_fd = self.conn.fileno()
+        self.loop.add_reader(self.conn_fd, self._on_readable)
+        logging.info(f"Listening to '{self.channel}'")
+
+    def _on_readable(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error as ex:
+            logging.warning(f"Lost connection while listening to '{self.channel}': {ex}. Reconnecting...")
+            self._drop_connection()
+            self.connect_task = self.loop.create_task(self._connect())
+            return
+
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            try:
+                self.callback(notify.payload)
+            except Exception as ex:
+                logging.error(f"Failed to handle '{self.channel}' notification: {ex} - {ex.__class__.__name__}")
+
+    def _drop_connection(self):
+        if self.conn_fd is not None:
+            self.loop.remove_reader(self.conn_fd)
+            self.conn_fd = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
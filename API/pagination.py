@@ -0,0 +1,48 @@
+from datetime import datetime
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, func, tuple_
+from sqlalchemy.orm import Query
+from typing import Any, List
+import base64
+import json
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# missing dates sort as the oldest ones on every backend, a NULL key would never compare
+NULL_DATETIME = datetime.min
+
+def encode_cursor(values: List[Any]) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns: List[Any]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("Cursor does not match the sort keys")
+        return [
+            (NULL_DATETIME if value is None else datetime.fromisoformat(value)) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError) as ex:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {ex}")
+
+def get_sort_key(column: Any) -> Any:
+    return func.coalesce(column, NULL_DATETIME) if isinstance(column.type, DateTime) else column
+
+def paginate(query: Query, response: Response, columns: List[Any], limit: int | None, after: str | None, descending: bool = False) -> List[Any]:
+    # the columns must identify a row uniquely (end them with the primary key) so pages never overlap
+    sort_keys = [get_sort_key(column) for column in columns]
+    if after is not None:
+        key = tuple_(*sort_keys)
+        values = tuple_(*decode_cursor(after, columns))
+        query = query.filter(key < values if descending else key > values)
+    query = query.order_by(*[sort_key.desc() if descending else sort_key.asc() for sort_key in sort_keys])
+    if limit is None:
+        return query.all()
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows
@@ -0,0 +1,137 @@
+from . import models
+from .product_codes import get_dialect_insert
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from typing import Iterator, List, Optional, Set, Tuple
+import argparse
+
+PREDICTION_KEY_TYPES = ("product_key", "category_code")
+COMPACTION_BATCH_SIZE = 1000
+
+def get_prediction_keys(prediction: models.Prediction) -> List[dict]:
+    keys = []
+    for key_type in PREDICTION_KEY_TYPES:
+        key = getattr(prediction, key_type)
+        if key:
+            keys.append({"key_type": key_type, "key": key, "prediction_id": prediction.id})
+    return keys
+
+def set_current_prediction(db: Session, prediction: models.Prediction):
+    db.flush()
+    keys = get_prediction_keys(prediction)
+    if not keys:
+        return
+    # ids only grow, an older prediction committing late never replaces a newer one
+    statement = get_dialect_insert(db)(models.CurrentPrediction)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.CurrentPrediction.key_type, models.CurrentPrediction.key],
+            set_={"prediction_id": statement.excluded.prediction_id},
+            where=models.CurrentPrediction.prediction_id < statement.excluded.prediction_id
+        ),
+        keys
+    )
+
+def get_current_prediction(db: Session, key_type: str, key: str) -> Optional[models.Prediction]:
+    return (
+        db.query(models.Prediction)
+        .join(models.CurrentPrediction, models.CurrentPrediction.prediction_id == models.Prediction.id)
+        .filter(models.CurrentPrediction.key_type == key_type, models.CurrentPrediction.key == key)
+        .first()
+    )
+
+def get_current_predictions(db: Session) -> List[models.Prediction]:
+    return (
+        db.query(models.Prediction)
+        .filter(models.Prediction.id.in_(select(models.CurrentPrediction.prediction_id)))
+        .all()
+    )
+
+def get_sampled_prediction_ids(db: Session, since: datetime, sample_days: int) -> Set[int]:
+    # keeps the latest prediction of each key in every sample_days bucket, for backtesting
+    rows = (
+        db.query(models.Prediction.id, models.Prediction.product_key, models.Prediction.category_code, models.Prediction.created_at)
+        .filter(models.Prediction.created_at >= since)
+        .order_by(models.Prediction.created_at.desc(), models.Prediction.id.desc())
+        .all()
+    )
+    sampled = {}
+    for prediction_id, product_key, category_code, created_at in rows:
+        sampled.setdefault((product_key, category_code, created_at.toordinal() // sample_days), prediction_id)
+    return set(sampled.values())
+
+def get_database_now(db: Session) -> datetime:
+    # created_at defaults to the database clock, cutoffs have to be taken from the same one
+    return db.scalar(select(func.now()))
+
+def get_expired_prediction_batches(db: Session, history_days: int, sample_days: int, batch_size: int) -> Iterator[List[int]]:
+    current_ids = select(models.CurrentPrediction.prediction_id)
+    since = get_database_now(db) - timedelta(days=history_days)
+
+    # history ids are read once, predictions created during the run are newer than since and never expire
+    history_ids = (
+        db.query(models.Prediction.id)
+        .filter(models.Prediction.created_at >= since, models.Prediction.id.notin_(current_ids))
+        .all()
+    )
+    sampled_ids = get_sampled_prediction_ids(db, since, sample_days) if history_days > 0 else set()
+    expired_history_ids = sorted(prediction_id for prediction_id, in history_ids if prediction_id not in sampled_ids)
+    for start in range(0, len(expired_history_ids), batch_size):
+        yield expired_history_ids[start:start + batch_size]
+
+    last_id = 0
+    while True:
+        batch = db.scalars(
+            select(models.Prediction.id)
+            .where(
+                models.Prediction.id > last_id,
+                models.Prediction.created_at < since,
+                models.Prediction.id.notin_(current_ids)
+            )
+            .order_by(models.Prediction.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        last_id = batch[-1]
+        yield batch
+
+def compact_predictions(
+        db: Session,
+        history_days: int = 0,
+        sample_days: int = 7,
+        batch_size: int = COMPACTION_BATCH_SIZE) -> Tuple[int, int]:
+    # every batch commits on its own so no lock is held for the whole run
+    if sample_days < 1:
+        raise ValueError("sample_days must be at least 1")
+    deleted_predictions = 0
+    deleted_items = 0
+    current_ids = select(models.CurrentPrediction.prediction_id)
+    for batch in get_expired_prediction_batches(db, history_days, sample_days, batch_size):
+        deleted_items += db.execute(
+            delete(models.PredictionItem)
+            .where(models.PredictionItem.prediction_id.in_(batch), models.PredictionItem.prediction_id.notin_(current_ids))
+        ).rowcount
+        deleted_predictions += db.execute(
+            delete(models.Prediction)
+            .where(models.Prediction.id.in_(batch), models.Prediction.id.notin_(current_ids))
+        ).rowcount
+        db.commit()
+    return deleted_predictions, deleted_items
+
+if __name__ == '__main__':
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Deletes predictions that are no longer current for their key.")
+    parser.add_argument('--history_days', type=int, default=0, help="Keep a sample of the predictions created in the last days for backtesting.")
+    parser.add_argument('--sample_days', type=int, default=7, help="Keep one prediction per key for each period of this many days within the history.")
+    parser.add_argument('--batch_size', type=int, default=COMPACTION_BATCH_SIZE, help="Predictions deleted per transaction.")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        deleted_predictions, deleted_items = compact_predictions(db, args.history_days, args.sample_days, args.batch_size)
+        print(f"Predictions compacted: {deleted_predictions} predictions and {deleted_items} prediction items deleted")
+    finally:
+        db.close()
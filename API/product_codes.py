@@ -0,0 +1,102 @@
+from . import models, schemas
+from .rollups import get_purchase_days, refresh_daily_totals
+from sqlalchemy import delete, func, insert, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, noload
+from typing import List
+
+def get_dialect_insert(db: Session):
+    # ON CONFLICT needs the dialect's own insert construct
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+def get_product_values(product: schemas.ProductCreate) -> dict:
+    return {
+        "title": product.title,
+        "description": product.description,
+        "read_category": product.read_category,
+        "img_url": product.img_urls[0] if product.img_urls else None,
+    }
+
+def backfill_purchase_items(db: Session, product_code_ids: List[int]) -> int:
+    if not product_code_ids:
+        return 0
+    purchase_ids = db.execute(
+        update(models.PurchaseItem)
+        .where(
+            models.PurchaseItem.product_id.is_(None),
+            models.PurchaseItem.read_product_key == models.ProductCode.code,
+            models.ProductCode.id.in_(product_code_ids)
+        )
+        .values(product_id=models.ProductCode.product_id)
+        .returning(models.PurchaseItem.purchase_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    # the bulk update skips the purchase_items ORM events that keep purchases.updated_at current
+    if purchase_ids:
+        db.execute(
+            update(models.Purchase)
+            .where(models.Purchase.id.in_(set(purchase_ids)))
+            .values(updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        refresh_daily_totals(db, get_purchase_days(db, purchase_ids))
+    return len(purchase_ids)
+
+def bulk_create_product_codes(db: Session, product_codes: List[schemas.ProductCodeCreate]) -> List[int]:
+    new_product_codes = {}
+    for product_code in product_codes:
+        new_product_codes.setdefault((product_code.format, product_code.code), product_code)
+    if not new_product_codes:
+        return []
+
+    existing_keys = db.query(models.ProductCode.format, models.ProductCode.code).filter(
+        tuple_(models.ProductCode.format, models.ProductCode.code).in_(list(new_product_codes))
+    ).all()
+    for key in existing_keys:
+        new_product_codes.pop(tuple(key))
+    if not new_product_codes:
+        return []
+
+    product_ids = db.execute(
+        insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True),
+        [get_product_values(product_code.product) for product_code in new_product_codes.values()]
+    ).scalars().all()
+
+    dialect_insert = get_dialect_insert(db)
+    created = db.execute(
+        dialect_insert(models.ProductCode)
+        .on_conflict_do_nothing(index_elements=[models.ProductCode.format, models.ProductCode.code])
+        .returning(models.ProductCode.id, models.ProductCode.product_id),
+        [
+            {"product_id": product_id, "format": format, "code": code}
+            for product_id, (format, code) in zip(product_ids, new_product_codes)
+        ]
+    ).all()
+
+    # codes inserted concurrently by another request leave their freshly created product unused
+    linked_product_ids = {product_id for _, product_id in created}
+    orphan_product_ids = [product_id for product_id in product_ids if product_id not in linked_product_ids]
+    if orphan_product_ids:
+        db.execute(delete(models.Product).where(models.Product.id.in_(orphan_product_ids)))
+
+    product_code_ids = [product_code_id for product_code_id, _ in created]
+    backfill_purchase_items(db, product_code_ids)
+    return product_code_ids
+
+def get_product_codes_by_ids(db: Session, product_code_ids: List[int]) -> List[models.ProductCode]:
+    if not product_code_ids:
+        return []
+    return (
+        db.query(models.ProductCode)
+        .options(
+            joinedload(models.ProductCode.product).joinedload(models.Product.category).options(
+                noload(models.Category.children),
+                noload(models.Category.parent)
+            )
+        )
+        .filter(models.ProductCode.id.in_(product_code_ids))
+        .order_by(models.ProductCode.id)
+        .all()
+    )
@@ -0,0 +1,135 @@
+from . import models
+from .carts import get_latest_texts
+from datetime import date, datetime
+from sqlalchemy import Date, delete, distinct, func, insert, select, text
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional
+import zlib
+
+# pg advisory lock namespaces, a refresh recounts keys from rows other transactions may be writing
+RESTOCKABLE_PRODUCT_KEYS_LOCK = 2301
+RESTOCKABLE_PRODUCTS_LOCK = 2302
+RESTOCKABLE_CATEGORIES_LOCK = 2303
+REBUILD_BATCH_SIZE = 1000
+
+def get_product_key_lock(product_key: str) -> int:
+    # advisory lock keys are int4, colliding keys only share a lock
+    return zlib.crc32(product_key.encode()) - 2 ** 31
+
+def lock_restockables(db: Session, namespace: int, lock_keys: List[int]):
+    # one lock per key taken in order, so writers only wait on the keys they share
+    if db.get_bind().dialect.name != "postgresql" or not lock_keys:
+        return
+    db.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(:namespace, lock_key) "
+            "FROM (SELECT DISTINCT unnest(CAST(:lock_keys AS integer[])) AS lock_key ORDER BY lock_key) AS lock_keys"
+        ),
+        {"namespace": namespace, "lock_keys": sorted(set(lock_keys))}
+    )
+
+def replace_restockables(db: Session, model, key_column, keys: List, rows: List[dict]):
+    db.execute(delete(model).where(key_column.in_(keys)))
+    if rows:
+        db.execute(insert(model), rows)
+
+def refresh_restockable_product_keys(db: Session, product_keys: List[str]):
+    lock_restockables(db, RESTOCKABLE_PRODUCT_KEYS_LOCK, [get_product_key_lock(product_key) for product_key in product_keys])
+    rows = (
+        db.query(models.DailyProductTotal.product_key, func.count(), func.max(models.DailyProductTotal.day))
+        .filter(models.DailyProductTotal.product_key.in_(product_keys))
+        .group_by(models.DailyProductTotal.product_key)
+        .all()
+    )
+    texts = get_latest_texts(db, [product_key for product_key, _, _ in rows])
+    replace_restockables(db, models.RestockableProductKey, models.RestockableProductKey.product_key, product_keys, [
+        {"product_key": product_key, "read_product_text": texts.get(product_key), "day_count": day_count, "last_day": last_day}
+        for product_key, day_count, last_day in rows
+    ])
+
+def refresh_restockable_categories(db: Session, category_ids: List[int]):
+    lock_restockables(db, RESTOCKABLE_CATEGORIES_LOCK, category_ids)
+    rows = (
+        db.query(models.DailyCategoryTotal.category_id, func.count(), func.max(models.DailyCategoryTotal.day))
+        .filter(models.DailyCategoryTotal.category_id.in_(category_ids))
+        .group_by(models.DailyCategoryTotal.category_id)
+        .all()
+    )
+    replace_restockables(db, models.RestockableCategory, models.RestockableCategory.category_id, category_ids, [
+        {"category_id": category_id, "day_count": day_count, "last_day": last_day}
+        for category_id, day_count, last_day in rows
+    ])
+
+def refresh_restockable_products(db: Session, product_ids: List[int]):
+    lock_restockables(db, RESTOCKABLE_PRODUCTS_LOCK, product_ids)
+    day = func.date(models.Purchase.date, type_=Date)
+    rows = (
+        db.query(models.PurchaseItem.product_id, func.count(distinct(day)), func.max(day))
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.product_id.in_(product_ids), models.Purchase.date.isnot(None))
+        .group_by(models.PurchaseItem.product_id)
+        .all()
+    )
+    replace_restockables(db, models.RestockableProduct, models.RestockableProduct.product_id, product_ids, [
+        {"product_id": product_id, "day_count": day_count, "last_day": last_day}
+        for product_id, day_count, last_day in rows
+    ])
+
+def refresh_restockables(
+        db: Session,
+        product_keys: Iterable[str] = (),
+        product_ids: Iterable[int] = (),
+        category_ids: Iterable[int] = ()):
+    # counts come from the daily rollups, refresh them first
+    product_keys = sorted({product_key for product_key in product_keys if product_key is not None})
+    product_ids = sorted({product_id for product_id in product_ids if product_id is not None})
+    category_ids = sorted({category_id for category_id in category_ids if category_id is not None})
+    if product_keys:
+        refresh_restockable_product_keys(db, product_keys)
+    if product_ids:
+        refresh_restockable_products(db, product_ids)
+    if category_ids:
+        refresh_restockable_categories(db, category_ids)
+
+def rebuild_restockables(db: Session):
+    # only called by rebuild_daily_totals, whose exclusive lock already keeps refreshes out
+    db.execute(delete(models.RestockableProductKey))
+    db.execute(delete(models.RestockableProduct))
+    db.execute(delete(models.RestockableCategory))
+    for column, keyword in [
+        (models.DailyProductTotal.product_key, "product_keys"),
+        (models.PurchaseItem.product_id, "product_ids"),
+        (models.DailyCategoryTotal.category_id, "category_ids"),
+    ]:
+        keys = db.scalars(select(distinct(column))).all()
+        for start in range(0, len(keys), REBUILD_BATCH_SIZE):
+            refresh_restockables(db, **{keyword: keys[start:start + REBUILD_BATCH_SIZE]})
+
+def get_window_day_count(model, since: date):
+    # days bought since the window start, looked up per candidate through the (key, day) indexes
+    if model is models.RestockableProductKey:
+        return (
+            select(func.count())
+            .where(models.DailyProductTotal.product_key == model.product_key, models.DailyProductTotal.day >= since)
+            .scalar_subquery()
+        )
+    if model is models.RestockableCategory:
+        return (
+            select(func.count())
+            .where(models.DailyCategoryTotal.category_id == model.category_id, models.DailyCategoryTotal.day >= since)
+            .scalar_subquery()
+        )
+    return (
+        select(func.count(distinct(func.date(models.Purchase.date, type_=Date))))
+        .select_from(models.PurchaseItem)
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .where(models.PurchaseItem.product_id == model.product_id, models.Purchase.date >= datetime.combine(since, datetime.min.time()))
+        .scalar_subquery()
+    )
+
+def get_restockables_query(db: Session, model, min_days: int, since: Optional[date] = None):
+    # the all time counts narrow the candidates, only those get their days inside the window counted
+    query = db.query(model).filter(model.day_count >= min_days)
+    if since:
+        query = query.filter(model.last_day >= since, get_window_day_count(model, since) >= min_days)
+    return query
@@ -0,0 +1,148 @@
+from . import models
+from .expenses import get_item_total_column
+from .restockables import rebuild_restockables, refresh_restockables
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, and_, delete, distinct, func, insert, or_, select
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Set, Tuple
+import argparse
+
+# pg advisory locks are keyed by (DAILY_TOTALS_LOCK, day ordinal), 0 guards whole rebuilds
+DAILY_TOTALS_LOCK = 2201
+
+def get_day_column():
+    return func.date(models.Purchase.date, type_=Date)
+
+def get_days(days: Iterable[date | datetime | None]) -> Set[date]:
+    return {day.date() if isinstance(day, datetime) else day for day in days if day is not None}
+
+def get_purchase_days(db: Session, purchase_ids: Iterable[int]) -> Set[date]:
+    purchase_ids = set(purchase_ids)
+    if not purchase_ids:
+        return set()
+    rows = db.query(get_day_column()).filter(models.Purchase.id.in_(purchase_ids)).distinct().all()
+    return get_days(day for day, in rows)
+
+def get_product_days(db: Session, product_id: int) -> Set[date]:
+    rows = (
+        db.query(get_day_column())
+        .join(models.PurchaseItem, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .filter(models.PurchaseItem.product_id == product_id)
+        .distinct()
+        .all()
+    )
+    return get_days(day for day, in rows)
+
+def get_product_totals_select():
+    day = get_day_column()
+    return (
+        select(
+            day,
+            models.PurchaseItem.read_product_key,
+            func.coalesce(func.sum(models.PurchaseItem.quantity), 0),
+            func.coalesce(func.sum(get_item_total_column()), 0),
+            func.count(distinct(models.Purchase.id))
+        )
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .where(models.Purchase.date.isnot(None), models.PurchaseItem.read_product_key.isnot(None))
+        .group_by(day, models.PurchaseItem.read_product_key)
+    )
+
+def get_category_totals_select():
+    day = get_day_column()
+    return (
+        select(
+            day,
+            models.Product.category_id,
+            func.coalesce(func.sum(models.PurchaseItem.quantity), 0),
+            func.coalesce(func.sum(get_item_total_column()), 0),
+            func.count(distinct(models.Purchase.id))
+        )
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .join(models.Product, models.PurchaseItem.product_id == models.Product.id)
+        .where(models.Purchase.date.isnot(None), models.Product.category_id.isnot(None))
+        .group_by(day, models.Product.category_id)
+    )
+
+def lock_daily_totals(db: Session, days: Optional[List[date]] = None):
+    # concurrent refreshes of a day would both delete and then insert the same keys
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    if days is None:
+        db.execute(select(func.pg_advisory_xact_lock(DAILY_TOTALS_LOCK, 0)))
+        return
+    db.execute(select(func.pg_advisory_xact_lock_shared(DAILY_TOTALS_LOCK, 0)))
+    for day in days:
+        db.execute(select(func.pg_advisory_xact_lock(DAILY_TOTALS_LOCK, day.toordinal())))
+
+def replace_daily_totals(db: Session, days_filter, purchases_filter) -> Tuple[Set[str], Set[int]]:
+    columns = ['quantity', 'spend', 'purchase_count']
+    product_keys = set(db.scalars(
+        delete(models.DailyProductTotal)
+        .where(days_filter(models.DailyProductTotal.day))
+        .returning(models.DailyProductTotal.product_key)
+    ).all())
+    product_keys.update(db.scalars(
+        insert(models.DailyProductTotal)
+        .from_select(['day', 'product_key'] + columns, get_product_totals_select().where(purchases_filter))
+        .returning(models.DailyProductTotal.product_key)
+    ).all())
+    category_ids = set(db.scalars(
+        delete(models.DailyCategoryTotal)
+        .where(days_filter(models.DailyCategoryTotal.day))
+        .returning(models.DailyCategoryTotal.category_id)
+    ).all())
+    category_ids.update(db.scalars(
+        insert(models.DailyCategoryTotal)
+        .from_select(['day', 'category_id'] + columns, get_category_totals_select().where(purchases_filter))
+        .returning(models.DailyCategoryTotal.category_id)
+    ).all())
+    return product_keys, category_ids
+
+def refresh_daily_totals(db: Session, days: Iterable[date | datetime | None], product_ids: Iterable[int] = ()):
+    # recomputes whole days from purchase_items, so edits, moves and relinks never drift
+    days = sorted(get_days(days))
+    if not days:
+        return
+    db.flush()
+    lock_daily_totals(db, days)
+    purchases_filter = or_(*[
+        and_(models.Purchase.date >= datetime.combine(day, datetime.min.time()), models.Purchase.date < datetime.combine(day + timedelta(days=1), datetime.min.time()))
+        for day in days
+    ])
+    product_keys, category_ids = replace_daily_totals(db, lambda column: column.in_(days), purchases_filter)
+    # products unlinked from these days' items have to be passed in, they are gone from purchase_items
+    product_ids = set(product_ids)
+    product_ids.update(db.scalars(
+        select(distinct(models.PurchaseItem.product_id))
+        .join(models.Purchase, models.PurchaseItem.purchase_id == models.Purchase.id)
+        .where(purchases_filter, models.PurchaseItem.product_id.isnot(None))
+    ).all())
+    refresh_restockables(db, product_keys, product_ids, category_ids)
+
+def rebuild_daily_totals(db: Session, since: Optional[date] = None):
+    db.flush()
+    lock_daily_totals(db)
+    if since is None:
+        replace_daily_totals(db, lambda column: column.isnot(None), models.Purchase.date.isnot(None))
+    else:
+        replace_daily_totals(db, lambda column: column >= since, models.Purchase.date >= datetime.combine(since, datetime.min.time()))
+    rebuild_restockables(db)
+
+if __name__ == '__main__':
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuilds the daily quantity and spend rollups and the restockables from purchase items.")
+    parser.add_argument('--since', type=date.fromisoformat, default=None, help="Only rebuild days from this date on (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuild_daily_totals(db, args.since)
+        db.commit()
+        products = db.query(models.DailyProductTotal).count()
+        categories = db.query(models.DailyCategoryTotal).count()
+        restockables = db.query(models.RestockableProductKey).count()
+        print(f"Daily totals rebuilt: {products} product rows, {categories} category rows, {restockables} restockable product keys")
+    finally:
+        db.close()
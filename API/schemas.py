@@ -87,6 +87,19 @@ class Purchase(PurchaseBase):
     updated_at: Optional[datetime] = None
     deleted_at: Optional[datetime] = None
 
+class PurchaseExportItem(PurchaseItemBase):
+    id: int
+    product_id: Optional[int] = None
+
+
+class PurchaseExport(PurchaseBase):
+    id: int
+    entity_id: Optional[int] = None
+    items: List[PurchaseExportItem] = Field(default_factory=list)
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+
 class PurchaseWithReceipt(Purchase):
     receipt: Optional['Receipt'] = None
 
@@ -307,6 +320,14 @@ class Receipt(ReceiptBase):
     deleted_at: Optional[datetime] = None
 
 
+class ReceiptStatusChange(BaseModel):
+    id: int
+    status: ReceiptStatus
+    purchase_id: Optional[int] = None
+    error_message: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+
 # --------------------
 # Historic Schemas
 # --------------------
@@ -319,6 +340,12 @@ class Historic(HistoricBase):
     pass
 
 
+class HistoricSeries(BaseModel):
+    bucket: str
+    dates: List[datetime] = []
+    quantities: List[float] = []
+
+
 # --------------------
 # PredictionItem Schemas
 # --------------------
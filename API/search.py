@@ -0,0 +1,50 @@
+from . import models
+from sqlalchemy import func, or_, select, union
+from sqlalchemy.orm import Query, Session, contains_eager, noload
+
+SEARCH_MIN_LENGTH = 3
+SEARCH_DEFAULT_LIMIT = 20
+
+def escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def get_candidate_ids(text: str, fuzzy: bool = False):
+    # every branch filters a single table, so its ORs combine that table's trigram indexes,
+    # an OR spanning the products/product_codes join could only be answered by scanning both
+    pattern = f"%{escape_like(text)}%"
+    product_conditions = [
+        models.Product.title.ilike(pattern, escape="\\"),
+        models.Product.description.ilike(pattern, escape="\\")
+    ]
+    if fuzzy:
+        product_conditions += [models.Product.title.op("%>")(text), models.Product.description.op("%>")(text)]
+    return union(
+        select(models.ProductCode.id).where(models.ProductCode.code.ilike(pattern, escape="\\")),
+        select(models.ProductCode.id)
+        .join(models.Product, models.ProductCode.product_id == models.Product.id)
+        .where(or_(*product_conditions))
+    )
+
+def get_lookahead_filter(lookahead: str):
+    return models.ProductCode.id.in_(get_candidate_ids(lookahead))
+
+def search_product_codes(db: Session, text: str, limit: int = SEARCH_DEFAULT_LIMIT) -> Query:
+    # substring matches plus fuzzy word matches (pg_trgm's %> operator), only the candidates get ranked
+    rank = func.greatest(
+        func.word_similarity(text, models.Product.title),
+        func.coalesce(func.word_similarity(text, models.Product.description), 0),
+        func.similarity(text, models.ProductCode.code)
+    )
+    return (
+        db.query(models.ProductCode)
+        .join(models.Product, models.ProductCode.product_id == models.Product.id)
+        .options(
+            contains_eager(models.ProductCode.product).joinedload(models.Product.category).options(
+                noload(models.Category.children),
+                noload(models.Category.parent)
+            )
+        )
+        .filter(models.ProductCode.id.in_(get_candidate_ids(text, fuzzy=True)))
+        .order_by(rank.desc(), models.ProductCode.id)
+        .limit(limit)
+    )
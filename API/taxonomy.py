@@ -0,0 +1,98 @@
+from . import models
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+import threading
+
+class TaxonomySnapshot:
+    def __init__(self, categories: List[Tuple[int, Optional[int], int]]):
+        self.code_by_id: Dict[int, int] = {}
+        self.id_by_code: Dict[int, int] = {}
+        self.parent_by_id: Dict[int, Optional[int]] = {}
+        children_by_id: Dict[int, List[int]] = {}
+
+        for category_id, parent_id, code in categories:
+            self.code_by_id[category_id] = code
+            self.id_by_code[code] = category_id
+            self.parent_by_id[category_id] = parent_id
+        for category_id, parent_id, _ in sorted(categories):
+            if parent_id is not None and parent_id in self.code_by_id:
+                children_by_id.setdefault(parent_id, []).append(category_id)
+            else:
+                self.parent_by_id[category_id] = None
+
+        # preorder walk: the descendants of a category are a contiguous slice of self.preorder
+        self.preorder: List[int] = []
+        self.range_by_id: Dict[int, Tuple[int, int]] = {}
+        self.ancestors_by_id: Dict[int, Tuple[int, ...]] = {}
+        roots = [category_id for category_id, parent_id in self.parent_by_id.items() if parent_id is None]
+        for root_id in sorted(roots):
+            stack = [(root_id, (root_id,), False)]
+            while stack:
+                category_id, ancestors, visited = stack.pop()
+                if visited:
+                    self.range_by_id[category_id] = (self.range_by_id[category_id][0], len(self.preorder))
+                    continue
+                self.range_by_id[category_id] = (len(self.preorder), len(self.preorder))
+                self.ancestors_by_id[category_id] = ancestors
+                self.preorder.append(category_id)
+                stack.append((category_id, ancestors, True))
+                for child_id in reversed(children_by_id.get(category_id, [])):
+                    stack.append((child_id, (child_id,) + ancestors, False))
+
+    def get_ancestors_ids(self, category_id: int) -> Tuple[int, ...]:
+        return self.ancestors_by_id.get(category_id, (category_id,))
+
+    def get_descendants_ids(self, category_id: int) -> List[int]:
+        if category_id not in self.range_by_id:
+            return [category_id]
+        start, end = self.range_by_id[category_id]
+        return self.preorder[start:end]
+
+    def get_root_id(self, category_id: int) -> int:
+        return self.get_ancestors_ids(category_id)[-1]
+
+    def get_root_code(self, category_code: int) -> Optional[int]:
+        category_id = self.id_by_code.get(category_code)
+        if category_id is None:
+            return None
+        return self.code_by_id[self.get_root_id(category_id)]
+
+def build_taxonomy_snapshot(db: Session) -> TaxonomySnapshot:
+    categories = db.query(models.Category.id, models.Category.parent_id, models.Category.code).all()
+    return TaxonomySnapshot([tuple(category) for category in categories])
+
+def rebuild_category_closures(db: Session):
+    db.flush()
+    closures = select(
+        models.Category.id.label('ancestor_id'),
+        models.Category.id.label('descendant_id'),
+        literal(0).label('depth')
+    ).cte('closures', recursive=True)
+    closures = closures.union_all(
+        select(closures.c.ancestor_id, models.Category.id, closures.c.depth + 1)
+        .join(models.Category, models.Category.parent_id == closures.c.descendant_id)
+    )
+    db.execute(delete(models.CategoryClosure))
+    db.execute(
+        insert(models.CategoryClosure)
+        .from_select(['ancestor_id', 'descendant_id', 'depth'], select(closures))
+    )
+
+class TaxonomyCache:
+    def __init__(self):
+        self.snapshot: Optional[TaxonomySnapshot] = None
+        self.lock = threading.Lock()
+
+    def get(self, db: Session) -> TaxonomySnapshot:
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot
+        with self.lock:
+            if self.snapshot is None:
+                self.snapshot = build_taxonomy_snapshot(db)
+            return self.snapshot
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
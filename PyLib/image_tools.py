@@ -0,0 +1,103 @@
+from PIL import Image
+from pdf2image import convert_from_path
+from typing import Dict, List, Tuple
+import hashlib
+import time
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png"}
+PDF_EXTENSIONS = {"pdf"}
+
+PDF_DEFAULT_DPI = 150 # enough for qwen's max_pixels and donut's input size on receipt-width pages
+PDF_DEFAULT_MAX_PAGES = 10
+PDF_MAX_RENDER_THREADS = 4
+
+def get_file_extension(filename: str | None) -> str:
+    if filename and '.' in filename:
+        return filename.split(".")[-1].lower()
+    return "bin"
+
+def hash_image(image: Image.Image) -> str:
+    content_hash = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    content_hash.update(image.tobytes())
+    return content_hash.hexdigest()
+
+def convert_image_to_jpeg(source_path: str, destination_path: str) -> Tuple[str, Dict[str, float]]:
+    start = time.perf_counter()
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+    timings = {"convert": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    content_hash = hash_image(image)
+    timings["hash"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image.save(destination_path, format='JPEG')
+    timings["encode"] = time.perf_counter() - start
+    return content_hash, timings
+
+def rasterize_pdf(source_path: str, dpi: int, last_page: int, poppler_path: str = "") -> List[Image.Image]:
+    options = {
+        "dpi": dpi,
+        "first_page": 1,
+        "last_page": last_page,
+        "thread_count": min(last_page, PDF_MAX_RENDER_THREADS),
+    }
+    if poppler_path.strip():
+        options["poppler_path"] = poppler_path
+    return convert_from_path(source_path, **options)
+
+def stitch_images(images: List[Image.Image]) -> Image.Image:
+    width = max(image.width for image in images)
+    height = sum(image.height for image in images)
+    stitched = Image.new('RGB', (width, height), 'white')
+    offset = 0
+    for image in images:
+        stitched.paste(image.convert('RGB'), (0, offset))
+        offset += image.height
+    return stitched
+
+def convert_pdf_to_jpeg(
+        source_path: str,
+        destination_path: str,
+        poppler_path: str = "",
+        dpi: int = PDF_DEFAULT_DPI,
+        stitch_pages: bool = False,
+        max_pages: int = PDF_DEFAULT_MAX_PAGES) -> Tuple[str, Dict[str, float]]:
+    timings = {}
+
+    start = time.perf_counter()
+    images = rasterize_pdf(source_path, dpi, max_pages if stitch_pages else 1, poppler_path)
+    timings["render"] = time.perf_counter() - start
+    if not images:
+        raise ValueError("The pdf file has no pages")
+
+    if stitch_pages and len(images) > 1:
+        start = time.perf_counter()
+        image = stitch_images(images)
+        timings["stitch"] = time.perf_counter() - start
+    else:
+        image = images[0].convert('RGB')
+
+    start = time.perf_counter()
+    content_hash = hash_image(image)
+    timings["hash"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image.save(destination_path, format='JPEG')
+    timings["encode"] = time.perf_counter() - start
+    return content_hash, timings
+
+def convert_to_jpeg(
+        source_path: str,
+        destination_path: str,
+        extension: str,
+        poppler_path: str = "",
+        dpi: int = PDF_DEFAULT_DPI,
+        stitch_pages: bool = False,
+        max_pages: int = PDF_DEFAULT_MAX_PAGES) -> Tuple[str, Dict[str, float]]:
+    if extension in IMAGE_EXTENSIONS:
+        return convert_image_to_jpeg(source_path, destination_path)
+    if extension in PDF_EXTENSIONS:
+        return convert_pdf_to_jpeg(source_path, destination_path, poppler_path, dpi, stitch_pages, max_pages)
+    raise ValueError(f"Unsupported file type: {extension}")
@@ -1,10 +1,11 @@
 from pika.adapters.blocking_connection import BlockingChannel
-from pika.exceptions import ChannelClosedByBroker, ConnectionClosed, ChannelClosed, AMQPError
+from pika.exceptions import ChannelClosedByBroker, ConnectionClosed, ChannelClosed, AMQPError, AMQPConnectionError
 from pika.spec import Basic, BasicProperties
 from pika import BlockingConnection, PlainCredentials, ConnectionParameters
 from urllib.parse import urlparse
 from pydantic import BaseModel
-from typing import Callable, Type, Any, Optional
+from typing import Callable, Type, Any, Optional, List, Tuple
+from contextlib import contextmanager
 import json
 import time
 import threading
@@ -158,6 +159,110 @@ class PydanticExchangePublisher:
         if self.connection and not self.connection.is_closed:
             self.connection.close()
 
+class PooledExchangePublisher:
+    # long-lived publisher, the messages published between two commits are confirmed by the broker together
+    def __init__(self, conn_string: str):
+        self.conn_string = conn_string
+        self.connection = None
+        self.channel = None
+        self.pending: List[Tuple[str, str, str]] = []
+
+    def _connect(self):
+        self.connection = get_connection_by_string(self.conn_string)
+        self.channel = self.connection.channel()
+        self.channel.tx_select()
+
+    def _reconnect(self):
+        self.close()
+        self._connect()
+
+    def ensure_connection(self):
+        if self.connection is None or self.connection.is_closed or self.channel.is_closed:
+            self._reconnect()
+            return
+        try:
+            # services heartbeats and notices a connection the broker dropped while the publisher was idle
+            self.connection.process_data_events(time_limit=0)
+        except (AMQPConnectionError, ConnectionClosed, ChannelClosed) as e:
+            logging.warning(f"Pooled publisher connection lost: {e}. Reconnecting...")
+            self._reconnect()
+
+    def _publish_pending(self):
+        for exchange_name, routing_key, body in self.pending:
+            self.channel.basic_publish(exchange=exchange_name, routing_key=routing_key, body=body)
+
+    def publish(self, exchange_name: str, routing_key: str, payload: BaseModel):
+        body = payload.model_dump_json()
+        self.pending.append((exchange_name, routing_key, body))
+        try:
+            self.channel.basic_publish(exchange=exchange_name, routing_key=routing_key, body=body)
+        except (AMQPConnectionError, ConnectionClosed, ChannelClosed) as e:
+            logging.warning(f"Connection or channel closed: {e}. Reconnecting...")
+            self._reconnect()
+            self._publish_pending()
+
+    def commit(self):
+        if not self.pending:
+            return
+        try:
+            self.channel.tx_commit()
+        except (AMQPConnectionError, ConnectionClosed, ChannelClosed) as e:
+            logging.warning(f"Connection or channel closed while committing: {e}. Reconnecting...")
+            self._reconnect()
+            self._publish_pending()
+            self.channel.tx_commit()
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+        try:
+            if self.channel and self.channel.is_open:
+                self.channel.tx_rollback()
+        except AMQPError as e:
+            logging.warning(f"Could not roll back pooled publisher: {e}")
+            self.close()
+
+    def close(self):
+        if self.connection and not self.connection.is_closed:
+            try:
+                self.connection.close()
+            except AMQPError:
+                pass
+        self.connection = None
+        self.channel = None
+
+class PublisherPoolTimeout(Exception):
+    pass
+
+class PydanticPublisherPool:
+    def __init__(self, conn_string: str, size: int, timeout: float = 10):
+        self.conn_string = conn_string
+        self.timeout = timeout
+        self.publishers = [PooledExchangePublisher(conn_string) for _ in range(size)]
+        self.available: queue.LifoQueue[PooledExchangePublisher] = queue.LifoQueue()
+        for publisher in self.publishers:
+            self.available.put(publisher)
+
+    @contextmanager
+    def get_publisher(self):
+        try:
+            publisher = self.available.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PublisherPoolTimeout(f"No pooled AMQP publisher became available within {self.timeout} seconds")
+        try:
+            publisher.ensure_connection()
+            yield publisher
+            publisher.commit()
+        except BaseException:
+            publisher.rollback()
+            raise
+        finally:
+            self.available.put(publisher)
+
+    def close(self):
+        for publisher in self.publishers:
+            publisher.close()
+
 class PydanticMessageBroker:
     def __init__(self, conn_string: str):
         self.conn = get_connection_by_string(conn_string)
@@ -179,4 +284,7 @@ class PydanticMessageBroker:
         return PydanticQueueConsumer(channel = self.get_channel())
     
     def get_publisher(self) -> PydanticExchangePublisher:
-        return PydanticExchangePublisher(conn_string=self.conn_string)
\ No newline at end of file
+        return PydanticExchangePublisher(conn_string=self.conn_string)
+
+    def get_publisher_pool(self, size: int, timeout: float = 10) -> PydanticPublisherPool:
+        return PydanticPublisherPool(conn_string=self.conn_string, size=size, timeout=timeout)
\ No newline at end of file
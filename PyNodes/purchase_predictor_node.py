@@ -67,11 +67,10 @@ class PurchasePredictorNode:
                     continue
                 json_response = response.json()
 
-                historic_data = []
-                for json in json_response:
-                    date = datetime.fromisoformat(json['date'])
-                    quantity = float(json['quantity'])
-                    historic_data.append((date, quantity))
+                historic_data = [
+                    (datetime.fromisoformat(date), float(quantity))
+                    for date, quantity in zip(json_response['dates'], json_response['quantities'])
+                ]
 
                 print(len(historic_data))
                 predicted_dates = predict_next_purchase_dates(historic_data, PREDICT_DAYS_AHEAD)
@@ -110,11 +109,10 @@ class PurchasePredictorNode:
                     continue
                 json_response = response.json()
 
-                historic_data = []
-                for json in json_response:
-                    date = datetime.fromisoformat(json['date'])
-                    quantity = float(json['quantity'])
-                    historic_data.append((date, quantity))
+                historic_data = [
+                    (datetime.fromisoformat(date), float(quantity))
+                    for date, quantity in zip(json_response['dates'], json_response['quantities'])
+                ]
 
                 predicted_dates = predict_next_purchase_dates(historic_data, PREDICT_DAYS_AHEAD)
                 if not predicted_dates:
@@ -0,0 +1,146 @@
+import random
+import time
+import unittest
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from API import schemas
+from API.carts import group_by_type, group_by_density, consolidate_items, get_timedelta_for_weight, calculate_middle_date
+
+def legacy_group_by_type(predictions: List[schemas.Prediction], type_periods: Dict[str, timedelta]):
+    item_periods = {}
+    for prediction in predictions:
+        for item in prediction.items:
+            item_periods[item.id] = type_periods[prediction.category_code]
+
+    prediction_items: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
+    for prediction in predictions:
+        prediction_items.extend([(prediction, item) for item in prediction.items])
+    prediction_items = sorted(prediction_items, key=lambda p: p[1].date)
+
+    groups = {}
+    starting_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    groups[starting_time] = []
+    grouped_items = []
+    while len(grouped_items) < len(prediction_items):
+        for prediction, item in prediction_items:
+            if item in grouped_items:
+                continue
+            if item.date <= starting_time + item_periods[item.id]:
+                grouped_items.append(item)
+                groups[starting_time].append((prediction, item))
+        next_item = next(
+            (item for _, item in prediction_items if item not in grouped_items), None
+        )
+        starting_time = (
+            next_item.date.replace(hour=0, minute=0, second=0, microsecond=0)
+            if next_item else starting_time + timedelta(weeks=1)
+        )
+        if starting_time not in groups:
+            groups[starting_time] = []
+
+    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
+    return groups
+
+def legacy_group_by_density(predictions: List[schemas.Prediction]):
+    prediction_items: List[Tuple[schemas.Prediction, schemas.PredictionItem]] = []
+    for prediction in predictions:
+        prediction_items.extend([(prediction, item) for item in prediction.items])
+    prediction_items = sorted(prediction_items, key=lambda p: p[1].date)
+
+    groups = {}
+    last_idx = 0
+    while last_idx + 1 < len(prediction_items):
+        middle_date = None
+        weight = 0
+        current_group = []
+        for idx, (prediction, item) in enumerate(prediction_items[last_idx:], start=last_idx):
+            last_idx = idx
+            if item.date > (middle_date or item.date) + get_timedelta_for_weight(weight):
+                break
+            current_group.append((prediction,item))
+            middle_date = calculate_middle_date(middle_date or item.date, weight, item.date, item.quantity)
+            weight += item.quantity
+
+        if middle_date not in groups:
+            groups[middle_date] = current_group
+        else:
+            groups[middle_date].extend(current_group)
+
+    groups = {key: consolidate_items(value) for key, value in groups.items() if value}
+    return groups
+
+def build_predictions(item_count: int, by_category: bool, seed: int) -> List[schemas.Prediction]:
+    randomizer = random.Random(seed)
+    now = datetime.now()
+    predictions = []
+    item_id = 0
+    prediction_id = 0
+    while item_id < item_count:
+        prediction_id += 1
+        items = []
+        for _ in range(min(randomizer.randint(1, 10), item_count - item_id)):
+            item_id += 1
+            items.append(schemas.PredictionItem(
+                id=item_id,
+                prediction_id=prediction_id,
+                date=now + timedelta(hours=randomizer.randint(0, 90 * 24)),
+                quantity=randomizer.choice([0.5, 1, 1, 2, 3])
+            ))
+        predictions.append(schemas.Prediction(
+            id=prediction_id,
+            category_code=str(randomizer.randint(1, 40)) if by_category else None,
+            product_key=None if by_category else str(randomizer.randint(1, 300)),
+            items=items,
+            created_at=now
+        ))
+    return predictions
+
+def get_type_periods(predictions: List[schemas.Prediction]) -> Dict[str, timedelta]:
+    return {prediction.category_code: timedelta(weeks=int(prediction.category_code) % 4 + 1) for prediction in predictions}
+
+def describe_groups(groups) -> list:
+    return [
+        (date, [(prediction.id, item.id, item.quantity) for prediction, item in items])
+        for date, items in groups.items()
+    ]
+
+class TestCartGrouping(unittest.TestCase):
+    def test_group_by_type_matches_legacy(self):
+        for seed in range(3):
+            predictions = build_predictions(150, True, seed)
+            type_periods = get_type_periods(predictions)
+            expected = describe_groups(legacy_group_by_type([p.model_copy(deep=True) for p in predictions], type_periods))
+            result = describe_groups(group_by_type([p.model_copy(deep=True) for p in predictions], type_periods))
+            self.assertEqual(result, expected)
+
+    def test_group_by_density_matches_legacy(self):
+        for seed in range(3):
+            predictions = build_predictions(300, False, seed)
+            expected = describe_groups(legacy_group_by_density([p.model_copy(deep=True) for p in predictions]))
+            result = describe_groups(group_by_density([p.model_copy(deep=True) for p in predictions]))
+            self.assertEqual(result, expected)
+
+    def test_empty_predictions(self):
+        self.assertEqual(group_by_type([], {}), {})
+        self.assertEqual(group_by_density([]), {})
+
+    def test_grouping_10k_items(self):
+        type_predictions = build_predictions(10000, True, 42)
+        density_predictions = build_predictions(10000, False, 42)
+        type_periods = get_type_periods(type_predictions)
+
+        start = time.perf_counter()
+        groups = group_by_type(type_predictions, type_periods)
+        type_seconds = time.perf_counter() - start
+        self.assertTrue(groups)
+
+        start = time.perf_counter()
+        groups = group_by_density(density_predictions)
+        density_seconds = time.perf_counter() - start
+        self.assertTrue(groups)
+
+        self.assertLess(type_seconds, 2)
+        self.assertLess(density_seconds, 2)
+
+if __name__ == '__main__':
+    unittest.main()
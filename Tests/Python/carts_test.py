@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta
+from API import models
+from API.carts import CartDetails
+from database_test_case import DatabaseTestCase
+
+class TestCartDetails(DatabaseTestCase):
+    def add_history(self, keys: int):
+        root = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.db.add(root)
+        self.db.flush()
+        for idx in range(keys):
+            category = models.Category(code=1000 + idx, name=f"Category {idx}", original_text=f"{1000 + idx} - Food > Category {idx}", parent_id=root.id)
+            product = models.Product(title=f"Product {idx}", category=category)
+            self.db.add_all([category, product])
+            for days_ago, value in [(10, 100.0), (5, 200.0)]:
+                purchase = models.Purchase(date=datetime.now() - timedelta(days=days_ago), total=value)
+                purchase.items.append(models.PurchaseItem(
+                    read_product_key=f"key-{idx}",
+                    read_product_text=f"text {idx} {days_ago}",
+                    quantity=2,
+                    value=value if idx % 2 == 0 else None,
+                    total=value * 2,
+                    product=product
+                ))
+                self.db.add(purchase)
+        self.db.commit()
+
+    def count_cart_statements(self, keys: int) -> int:
+        self.add_history(keys)
+        self.statements = 0
+        details = CartDetails(self.db, [f"key-{idx}" for idx in range(keys)], [1000 + idx for idx in range(keys)])
+        for idx in range(keys):
+            details.get_product_key_details(f"key-{idx}")
+            details.get_category_details(1000 + idx)
+        return self.statements
+
+    def test_latest_details(self):
+        self.add_history(2)
+        details = CartDetails(self.db, ["key-0", "key-1", "missing"], [1000, 1001, 9999])
+
+        text, value, product = details.get_product_key_details("key-0")
+        self.assertEqual(text, "text 0 5")
+        self.assertEqual(value, 200.0)
+        self.assertEqual(product.title, "Product 0")
+        self.assertEqual(product.category.code, 1000)
+
+        text, value, product = details.get_product_key_details("key-1")
+        self.assertEqual(value, 200.0)
+
+        self.assertEqual(details.get_product_key_details("missing"), (None, None, None))
+
+        product, value = details.get_category_details(1001)
+        self.assertEqual(product.title, "Product 1")
+        self.assertEqual(value, 200.0)
+        self.assertEqual(details.get_category_details(9999), (None, None))
+
+    def test_query_count_is_flat(self):
+        few_keys = self.count_cart_statements(3)
+        self.tearDown()
+        self.setUp()
+        many_keys = self.count_cart_statements(60)
+        self.assertEqual(few_keys, many_keys)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from API import models
+
+class DatabaseTestCase(unittest.TestCase):
+    # a fresh in-memory database per test, statements counts what the code under test sends to it
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        models.Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.statements = 0
+        event.listen(self.engine, "before_cursor_execute", self.count_statement)
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def count_statement(self, *args):
+        self.statements += 1
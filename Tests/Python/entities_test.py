@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime
+from API import models
+from API.entities import backfill_purchase_entities
+from database_test_case import DatabaseTestCase
+
+class TestEntityIdentification(DatabaseTestCase):
+    def add_purchase(self, identification):
+        purchase = models.Purchase(read_entity_identification=identification, date=datetime(2024, 5, 1), total=10)
+        self.db.add(purchase)
+        return purchase
+
+    def test_identification_is_normalized_on_assignment(self):
+        purchase = self.add_purchase("30-50673003-8")
+        self.assertEqual(purchase.entity_identification, 30506730038)
+
+        purchase.read_entity_identification = "CUIT: 30590360763"
+        self.assertEqual(purchase.entity_identification, 30590360763)
+
+        purchase.read_entity_identification = "30712345674"
+        self.assertIsNone(purchase.entity_identification)
+
+        purchase.read_entity_identification = None
+        self.assertIsNone(purchase.entity_identification)
+
+    def test_backfill_links_matching_purchases(self):
+        entity = models.Entity(name="Supermercado", identification=30506730038)
+        self.db.add(entity)
+        matching = [self.add_purchase("30-50673003-8"), self.add_purchase("30506730038")]
+        other = self.add_purchase("30590360763")
+        self.db.commit()
+        entity_id = entity.id
+        ids = [purchase.id for purchase in matching + [other]]
+
+        self.statements = 0
+        self.assertEqual(backfill_purchase_entities(self.db, entity_id, 30506730038), 2)
+        self.assertEqual(self.statements, 1)
+        self.db.commit()
+
+        entity_ids = dict(self.db.query(models.Purchase.id, models.Purchase.entity_id).filter(models.Purchase.id.in_(ids)).all())
+        self.assertEqual(entity_ids, {ids[0]: entity_id, ids[1]: entity_id, ids[2]: None})
+
+if __name__ == '__main__':
+    unittest.main()
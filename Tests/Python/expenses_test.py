@@ -0,0 +1,136 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+from API import models, schemas
+from API.expenses import get_category_totals, get_purchase_category_totals
+from API.rollups import rebuild_daily_totals
+from API.taxonomy import rebuild_category_closures
+from PyLib.purchases_tools import calculate_purchase_total
+from database_test_case import DatabaseTestCase
+
+class TestCategoryTotals(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Food > Beverages > Juice, Animals
+        self.food = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.animals = models.Category(code=1, name="Animals", original_text="1 - Animals")
+        self.db.add_all([self.food, self.animals])
+        self.db.flush()
+        self.beverages = models.Category(code=413, name="Beverages", original_text="413 - Food > Beverages", parent_id=self.food.id)
+        self.db.add(self.beverages)
+        self.db.flush()
+        self.juice = models.Category(code=414, name="Juice", original_text="414 - Food > Beverages > Juice", parent_id=self.beverages.id)
+        self.db.add(self.juice)
+        rebuild_category_closures(self.db)
+        self.db.commit()
+
+    def add_purchases(self, seed: int):
+        rng = random.Random(seed)
+        products = [models.Product(title=f"Product {idx}", category=category) for idx, category in enumerate([self.food, self.beverages, self.juice, self.animals])]
+        for days_ago in range(30):
+            purchase = models.Purchase(date=datetime(2024, 6, 30) - timedelta(days=days_ago), total=0)
+            for _ in range(rng.randint(0, 6)):
+                purchase.items.append(models.PurchaseItem(
+                    product=rng.choice(products),
+                    quantity=rng.choice([None, 0, 1, 2.5]),
+                    value=rng.choice([None, 10.0, 3.5]),
+                    total=rng.choice([None, None, 7.0]),
+                ))
+            self.db.add(purchase)
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+
+    def get_expected_total(self, category: models.Category, start_date: datetime, end_date: datetime):
+        family_ids = {closure.descendant_id for closure in self.db.query(models.CategoryClosure).filter(models.CategoryClosure.ancestor_id == category.id)}
+        items = [
+            item
+            for purchase in self.db.query(models.Purchase).filter(models.Purchase.date.between(start_date, end_date))
+            for item in purchase.items
+            if item.product and item.product.category_id in family_ids
+        ]
+        return calculate_purchase_total(schemas.PurchaseCreate(), items) or 0
+
+    def test_matches_calculate_purchase_total(self):
+        start_date, end_date = datetime(2024, 6, 10), datetime(2024, 6, 25)
+        categories = [self.food, self.beverages, self.juice, self.animals]
+        for seed in range(5):
+            self.add_purchases(seed)
+            totals = get_category_totals(self.db, [category.id for category in categories], start_date, end_date)
+            for category in categories:
+                self.assertAlmostEqual(totals.get(category.id, 0), self.get_expected_total(category, start_date, end_date))
+
+    def test_partial_days_honor_the_exact_time(self):
+        products = [models.Product(title=f"Product {idx}", category=category) for idx, category in enumerate([self.juice, self.animals])]
+        for day in range(9, 14):
+            for hour in [0, 9, 18, 23]:
+                purchase = models.Purchase(date=datetime(2024, 5, day, hour), total=0)
+                for product in products:
+                    purchase.items.append(models.PurchaseItem(product=product, quantity=1, value=day * 100 + hour, total=None))
+                self.db.add(purchase)
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+
+        categories = [self.food, self.juice, self.animals]
+        for start_date, end_date in [
+            (datetime(2024, 5, 10, 18), datetime(2024, 5, 12, 9)),
+            (datetime(2024, 5, 10, 18), datetime(2024, 5, 11)),
+            (datetime(2024, 5, 10, 9), datetime(2024, 5, 10, 18)),
+            (datetime(2024, 5, 10), datetime(2024, 5, 10)),
+            (datetime(2024, 5, 10, 18), None),
+            (None, datetime(2024, 5, 11, 9)),
+        ]:
+            with self.subTest(start_date=start_date, end_date=end_date):
+                totals = get_category_totals(self.db, [category.id for category in categories], start_date, end_date)
+                for category in categories:
+                    expected = self.get_expected_total(category, start_date or datetime.min, end_date or datetime.max)
+                    self.assertAlmostEqual(totals.get(category.id, 0), expected)
+
+    def test_single_query(self):
+        self.add_purchases(0)
+        category_ids = [self.food.id, self.animals.id]
+        self.statements = 0
+        get_category_totals(self.db, category_ids)
+        self.assertEqual(self.statements, 1)
+
+    def test_categories_without_items_are_zero(self):
+        self.db.add(models.Purchase(date=datetime(2024, 6, 1), total=5, items=[models.PurchaseItem(product=models.Product(title="Cat food", category=self.animals))]))
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+        self.assertEqual(get_category_totals(self.db, [self.animals.id]), {self.animals.id: 0})
+        self.assertEqual(get_category_totals(self.db, [self.food.id]), {})
+
+    def test_purchase_breakdown_rolls_up_ancestors(self):
+        rng = random.Random(0)
+        leaves = []
+        for idx in range(40):
+            leaf = models.Category(code=2000 + idx, name=f"Leaf {idx}", original_text=f"{2000 + idx} - Food > Beverages > Juice > Leaf {idx}", parent_id=self.juice.id)
+            leaves.append(leaf)
+        self.db.add_all(leaves)
+        rebuild_category_closures(self.db)
+        categories = [self.food, self.beverages, self.juice, self.animals] + leaves
+        products = [models.Product(title=f"Product {idx}", category=category) for idx, category in enumerate(categories)]
+        # a hypermarket receipt
+        purchase = models.Purchase(date=datetime(2024, 6, 1), total=0)
+        for _ in range(150):
+            purchase.items.append(models.PurchaseItem(product=rng.choice(products), quantity=rng.choice([None, 1, 3]), value=rng.choice([None, 2.0]), total=rng.choice([None, 5.0])))
+        self.db.add(purchase)
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+        purchase_id = purchase.id
+        self.db.expire_all()
+
+        self.statements = 0
+        breakdown = get_purchase_category_totals(self.db, purchase_id)
+        self.assertEqual(self.statements, 1)
+
+        totals = {category.id: total for category, total in breakdown}
+        expected = get_category_totals(self.db, [category.id for category in categories])
+        self.assertEqual(set(totals), {category_id for category_id in expected})
+        for category_id, total in totals.items():
+            self.assertAlmostEqual(total, expected[category_id])
+        self.assertAlmostEqual(totals[self.food.id], sum(totals[category.id] for category in [self.beverages]) + sum(
+            calculate_purchase_total(schemas.PurchaseCreate(), [item]) or 0 for item in purchase.items if item.product.category_id == self.food.id
+        ))
+
+if __name__ == '__main__':
+    unittest.main()
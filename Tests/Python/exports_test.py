@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime, timedelta
+from API import models
+from API import exports
+from API.exports import CSV_HEADER, export_purchases_csv, export_purchases_ndjson, iterate_purchases
+from database_test_case import DatabaseTestCase
+
+class TestPurchaseExport(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        start = datetime(2024, 1, 1)
+        for idx in range(12):
+            purchase = models.Purchase(date=start + timedelta(days=idx), total=idx)
+            for item_idx in range(idx % 3):
+                purchase.items.append(models.PurchaseItem(read_product_key=f"key-{idx}-{item_idx}", quantity=1, total=item_idx))
+            self.db.add(purchase)
+        self.db.commit()
+        self.batch_size = exports.EXPORT_BATCH_SIZE
+        exports.EXPORT_BATCH_SIZE = 5
+
+    def tearDown(self):
+        exports.EXPORT_BATCH_SIZE = self.batch_size
+        super().tearDown()
+
+    def test_ndjson_has_one_line_per_purchase(self):
+        chunks = list(export_purchases_ndjson(iterate_purchases(self.db)))
+        self.assertEqual(len(chunks), 3)
+        purchases = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual([purchase["total"] for purchase in purchases], list(range(12)))
+        self.assertEqual([len(purchase["items"]) for purchase in purchases], [idx % 3 for idx in range(12)])
+        self.assertEqual(purchases[2]["items"][1]["read_product_key"], "key-2-1")
+
+    def test_date_bounds(self):
+        purchases = list(iterate_purchases(self.db, datetime(2024, 1, 3), datetime(2024, 1, 5)))
+        self.assertEqual([purchase.total for purchase in purchases], [2, 3, 4])
+
+    def test_csv_has_one_row_per_item(self):
+        chunks = list(export_purchases_csv(iterate_purchases(self.db)))
+        self.assertEqual(chunks[0], ",".join(CSV_HEADER) + "\r\n")
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        # purchases without items still get a row
+        self.assertEqual(len(rows), sum(max(idx % 3, 1) for idx in range(12)))
+        self.assertEqual(rows[-1]["item_read_product_key"], "key-11-1")
+        self.assertEqual(rows[0]["item_id"], "")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from datetime import datetime
+from API import models
+from API.historics import get_product_code_historic, get_category_code_historic
+from API.rollups import rebuild_daily_totals
+from database_test_case import DatabaseTestCase
+
+class TestHistorics(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        category = models.Category(code=413, name="Beverages", original_text="413 - Beverages")
+        self.db.add(category)
+        self.db.flush()
+        product = models.Product(title="Juice", category_id=category.id)
+        self.db.add(product)
+        self.db.flush()
+        # wednesday twice, sunday, next monday, next month
+        for date, quantity in [
+            (datetime(2024, 5, 1, 9), 1),
+            (datetime(2024, 5, 1, 18), 2),
+            (datetime(2024, 5, 5, 12), 3),
+            (datetime(2024, 5, 6, 12), 4),
+            (datetime(2024, 6, 2, 12), 5),
+            (datetime(2024, 6, 3, 12), 0),
+        ]:
+            purchase = models.Purchase(date=date, total=10)
+            purchase.items.append(models.PurchaseItem(read_product_key="7790001", product_id=product.id, quantity=quantity, value=1))
+            self.db.add(purchase)
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+
+    def test_daily_series(self):
+        self.statements = 0
+        series = get_product_code_historic(self.db, "7790001")
+        self.assertEqual(self.statements, 1)
+        self.assertEqual(series.bucket, "day")
+        self.assertEqual(series.dates, [datetime(2024, 5, 1), datetime(2024, 5, 5), datetime(2024, 5, 6), datetime(2024, 6, 2)])
+        self.assertEqual(series.quantities, [3, 3, 4, 5])
+
+    def test_weekly_and_monthly_buckets(self):
+        series = get_product_code_historic(self.db, "7790001", "week")
+        self.assertEqual(series.dates, [datetime(2024, 4, 29), datetime(2024, 5, 6), datetime(2024, 5, 27)])
+        self.assertEqual(series.quantities, [6, 4, 5])
+
+        series = get_category_code_historic(self.db, 413, "month")
+        self.assertEqual(series.dates, [datetime(2024, 5, 1), datetime(2024, 6, 1)])
+        self.assertEqual(series.quantities, [10, 5])
+
+    def test_date_bounds(self):
+        series = get_category_code_historic(self.db, 413, start_date=datetime(2024, 5, 2), end_date=datetime(2024, 5, 31))
+        self.assertEqual(series.dates, [datetime(2024, 5, 5), datetime(2024, 5, 6)])
+        self.assertEqual(series.quantities, [3, 4])
+
+    def test_unknown_key(self):
+        series = get_product_code_historic(self.db, "123")
+        self.assertEqual(series.dates, [])
+        self.assertEqual(series.quantities, [])
+
+        with self.assertRaises(ValueError):
+            get_product_code_historic(self.db, "7790001", "year")
+
+if __name__ == '__main__':
+    unittest.main()
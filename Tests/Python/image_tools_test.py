@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from PIL import Image
+from PyLib.image_tools import get_file_extension, convert_to_jpeg, stitch_images, hash_image
+
+class TestImageToolsFunctions(unittest.TestCase):
+    def test_get_file_extension(self):
+        self.assertEqual(get_file_extension("recibo.JPG"), "jpg")
+        self.assertEqual(get_file_extension("recibo.vea.pdf"), "pdf")
+        self.assertEqual(get_file_extension("recibo"), "bin")
+        self.assertEqual(get_file_extension(None), "bin")
+
+    def test_convert_png_to_jpeg(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source_path = os.path.join(directory, "recibo.png")
+            destination_path = os.path.join(directory, "recibo.jpg")
+            Image.new('RGBA', (20, 40), (255, 0, 0, 128)).save(source_path, format='PNG')
+
+            content_hash, timings = convert_to_jpeg(source_path, destination_path, "png")
+            self.assertEqual(len(content_hash), 64)
+            self.assertIn("convert", timings)
+
+            with Image.open(destination_path) as image:
+                self.assertEqual(image.format, "JPEG")
+                self.assertEqual(image.mode, "RGB")
+                self.assertEqual(image.size, (20, 40))
+
+    def test_hash_image(self):
+        self.assertEqual(
+            hash_image(Image.new('RGB', (10, 10), 'red')),
+            hash_image(Image.new('RGB', (10, 10), 'red'))
+        )
+        self.assertNotEqual(
+            hash_image(Image.new('RGB', (10, 10), 'red')),
+            hash_image(Image.new('RGB', (10, 10), 'blue'))
+        )
+        self.assertNotEqual(
+            hash_image(Image.new('RGB', (10, 20), 'red')),
+            hash_image(Image.new('RGB', (20, 10), 'red'))
+        )
+
+    def test_stitch_images(self):
+        pages = [
+            Image.new('RGB', (30, 50), 'red'),
+            Image.new('L', (20, 40), 0),
+        ]
+        stitched = stitch_images(pages)
+        self.assertEqual(stitched.mode, "RGB")
+        self.assertEqual(stitched.size, (30, 90))
+        self.assertEqual(stitched.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(stitched.getpixel((0, 60)), (0, 0, 0))
+        self.assertEqual(stitched.getpixel((25, 60)), (255, 255, 255))
+
+    def test_convert_unsupported_extension(self):
+        with self.assertRaises(ValueError):
+            convert_to_jpeg("recibo.gif", "recibo.jpg", "gif")
+
+if __name__ == '__main__':
+    unittest.main()
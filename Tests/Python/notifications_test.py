@@ -0,0 +1,205 @@
+import asyncio
+import os
+import socket
+import unittest
+import uuid
+import psycopg2
+from types import SimpleNamespace
+from API import schemas
+from API.notifications import ConnectionManager, PostgresListener
+
+NOTIFICATIONS_DATABASE_URL = os.getenv("NOTIFICATIONS_DATABASE_URL")
+FAN_OUT_WORKERS = 4
+FAN_OUT_SUBSCRIBERS = 10000
+FAN_OUT_RECEIPTS = 100
+
+class FakeListenConnection:
+    def __init__(self):
+        self.server_socket, self.client_socket = socket.socketpair()
+        self.notifies = []
+        self.broken = False
+        self.closed = False
+
+    def fileno(self):
+        return self.client_socket.fileno()
+
+    def send(self, payload: str):
+        self.notifies.append(SimpleNamespace(payload=payload))
+        self.server_socket.send(b"x")
+
+    def poll(self):
+        self.client_socket.recv(1024)
+        if self.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = True
+        self.server_socket.close()
+        self.client_socket.close()
+
+class FakePostgresListener(PostgresListener):
+    def __init__(self, callback):
+        super().__init__("", "receipt_status_changed", callback, reconnect_delay=0)
+        self.opened_connections = []
+
+    def _open_connection(self):
+        conn = FakeListenConnection()
+        self.opened_connections.append(conn)
+        return conn
+
+class TestConnectionManager(unittest.IsolatedAsyncioTestCase):
+    async def test_notify_only_subscribed_receipt(self):
+        manager = ConnectionManager()
+        first = manager.connect(1)
+        second = manager.connect(2)
+
+        manager.notify_all(1)
+
+        self.assertEqual(await first.get(0.1), 1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await second.get(0.01)
+
+    async def test_disconnect_removes_empty_subscriptions(self):
+        manager = ConnectionManager()
+        first = manager.connect(1)
+        second = manager.connect(1)
+        self.assertEqual(manager.subscriber_count(), 2)
+
+        manager.disconnect(first)
+        self.assertEqual(manager.subscriber_count(), 1)
+        manager.disconnect(second)
+        self.assertEqual(manager.subscriptions, {})
+        self.assertIsNone(await second.get(0.1))
+
+    async def test_repeated_events_are_coalesced(self):
+        manager = ConnectionManager()
+        sub_obj = manager.connect(1)
+
+        manager.notify_all(1, "WAITING")
+        manager.notify_all(1, "WAITING")
+        manager.notify_all(1, "PROCESSING")
+
+        self.assertEqual(await sub_obj.get(0.1), "WAITING")
+        self.assertEqual(await sub_obj.get(0.1), "PROCESSING")
+        with self.assertRaises(asyncio.TimeoutError):
+            await sub_obj.get(0.01)
+
+    async def test_pending_events_are_bounded(self):
+        manager = ConnectionManager(max_pending_events=2)
+        sub_obj = manager.connect(1)
+
+        for status in ["WAITING", "PROCESSING", "COMPLETED"]:
+            manager.notify_all(1, status)
+
+        self.assertEqual(await sub_obj.get(0.1), "PROCESSING")
+        self.assertEqual(await sub_obj.get(0.1), "COMPLETED")
+
+    async def test_close_releases_subscribers(self):
+        manager = ConnectionManager()
+        sub_obj = manager.connect(1)
+        manager.notify_all(1)
+
+        manager.close()
+
+        self.assertIsNone(await sub_obj.get(0.1))
+        self.assertEqual(manager.subscriber_count(), 0)
+
+class TestPostgresListener(unittest.IsolatedAsyncioTestCase):
+    async def wait_for_connection(self, listener: FakePostgresListener, count: int):
+        while len(listener.opened_connections) < count or listener.conn_fd is None:
+            await asyncio.sleep(0.01)
+
+    async def test_notifications_reach_callback(self):
+        payloads = []
+        listener = FakePostgresListener(payloads.append)
+        listener.start()
+        await asyncio.wait_for(self.wait_for_connection(listener, 1), 1)
+
+        listener.conn.send("7")
+        listener.conn.send("8")
+        while len(payloads) < 2:
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(payloads, ["7", "8"])
+        await listener.stop()
+        self.assertTrue(listener.opened_connections[0].closed)
+
+    async def test_reconnects_after_connection_loss(self):
+        payloads = []
+        listener = FakePostgresListener(payloads.append)
+        listener.start()
+        await asyncio.wait_for(self.wait_for_connection(listener, 1), 1)
+
+        first_connection = listener.conn
+        first_connection.broken = True
+        first_connection.server_socket.send(b"x")
+        await asyncio.wait_for(self.wait_for_connection(listener, 2), 1)
+
+        self.assertTrue(first_connection.closed)
+        listener.conn.send("9")
+        while not payloads:
+            await asyncio.sleep(0.01)
+        self.assertEqual(payloads, ["9"])
+        await listener.stop()
+
+@unittest.skipUnless(NOTIFICATIONS_DATABASE_URL, "NOTIFICATIONS_DATABASE_URL is not set")
+class TestPostgresFanOut(unittest.IsolatedAsyncioTestCase):
+    # every API worker listens on its own connection, one NOTIFY has to reach all of them
+    def setUp(self):
+        try:
+            self.notify_conn = psycopg2.connect(NOTIFICATIONS_DATABASE_URL)
+        except psycopg2.Error as ex:
+            self.skipTest(f"Postgres is not available: {ex}")
+        self.notify_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        self.channel = f"receipt_status_changed_{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        self.notify_conn.close()
+
+    def start_worker(self):
+        manager = ConnectionManager()
+
+        def on_receipt_status_changed(payload: str):
+            status_change = schemas.ReceiptStatusChange.model_validate_json(payload)
+            manager.notify_all(status_change.id, status_change.model_dump_json())
+
+        listener = PostgresListener(NOTIFICATIONS_DATABASE_URL, self.channel, on_receipt_status_changed)
+        listener.start()
+        return manager, listener
+
+    async def wait_for_connection(self, listener: PostgresListener):
+        while listener.conn_fd is None:
+            await asyncio.sleep(0.01)
+
+    async def test_one_notify_reaches_every_worker(self):
+        workers = [self.start_worker() for _ in range(FAN_OUT_WORKERS)]
+        try:
+            for _, listener in workers:
+                await asyncio.wait_for(self.wait_for_connection(listener), 5)
+            # the subscribers are spread across the workers and the receipts, receipt 0 is never notified
+            sub_objs = [
+                workers[key % FAN_OUT_WORKERS][0].connect(key % FAN_OUT_RECEIPTS)
+                for key in range(FAN_OUT_SUBSCRIBERS)
+            ]
+
+            payloads = {
+                receipt_id: schemas.ReceiptStatusChange(id=receipt_id, status=schemas.ReceiptStatus.PROCESSING).model_dump_json()
+                for receipt_id in range(1, FAN_OUT_RECEIPTS)
+            }
+            with self.notify_conn.cursor() as curs:
+                for receipt_id, payload in payloads.items():
+                    curs.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+            for sub_obj in sub_objs:
+                if sub_obj.subscribed_id in payloads:
+                    self.assertEqual(await sub_obj.get(5), payloads[sub_obj.subscribed_id])
+                else:
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await sub_obj.get(0)
+        finally:
+            for manager, listener in workers:
+                manager.close()
+                await listener.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Response
+from API import models
+from API.pagination import NEXT_CURSOR_HEADER, NULL_DATETIME, decode_cursor, encode_cursor, paginate
+from database_test_case import DatabaseTestCase
+
+class TestPagination(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        start = datetime(2024, 1, 1)
+        # several purchases share a date so the id has to break ties
+        self.db.add_all([models.Purchase(date=start + timedelta(days=idx // 3), total=idx) for idx in range(20)])
+        self.db.commit()
+
+    def get_pages(self, limit: int):
+        columns = [models.Purchase.date, models.Purchase.id]
+        pages = []
+        after = None
+        while True:
+            response = Response()
+            pages.append(paginate(self.db.query(models.Purchase), response, columns, limit, after, descending=True))
+            after = response.headers.get(NEXT_CURSOR_HEADER)
+            if after is None:
+                return pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = [purchase.id for purchase in self.db.query(models.Purchase).order_by(models.Purchase.date.desc(), models.Purchase.id.desc())]
+        for limit in [1, 3, 7, 20, 50]:
+            pages = self.get_pages(limit)
+            self.assertEqual([purchase.id for page in pages for purchase in page], expected)
+            self.assertTrue(all(len(page) <= limit for page in pages))
+
+    def test_last_page_has_no_cursor(self):
+        response = Response()
+        paginate(self.db.query(models.Purchase), response, [models.Purchase.id], 20, None)
+        self.assertNotIn(NEXT_CURSOR_HEADER, response.headers)
+
+    def test_without_limit_returns_everything(self):
+        response = Response()
+        self.assertEqual(len(paginate(self.db.query(models.Purchase), response, [models.Purchase.id], None, None)), 20)
+        self.assertNotIn(NEXT_CURSOR_HEADER, response.headers)
+
+    def test_null_dates_sort_last_across_pages(self):
+        purchases = [models.Purchase(total=idx) for idx in range(3)]
+        self.db.add_all(purchases)
+        self.db.flush()
+        # the column default would fill in a date passed as None
+        for purchase in purchases:
+            purchase.date = None
+        self.db.commit()
+        dated = [purchase.id for purchase in self.db.query(models.Purchase).filter(models.Purchase.date.isnot(None)).order_by(models.Purchase.date.desc(), models.Purchase.id.desc())]
+        undated = [purchase.id for purchase in self.db.query(models.Purchase).filter(models.Purchase.date.is_(None)).order_by(models.Purchase.id.desc())]
+        self.assertEqual(len(undated), 3)
+        # 21 puts a boundary between the dated and the undated rows, 2 one between undated rows
+        for limit in [2, 20, 21]:
+            pages = self.get_pages(limit)
+            self.assertEqual([purchase.id for page in pages for purchase in page], dated + undated)
+
+    def test_cursor_round_trip(self):
+        columns = [models.Purchase.date, models.Purchase.id]
+        values = [datetime(2024, 1, 2, 10, 30), 7]
+        self.assertEqual(decode_cursor(encode_cursor(values), columns), values)
+        self.assertEqual(decode_cursor(encode_cursor([None, 7]), columns), [NULL_DATETIME, 7])
+
+    def test_invalid_cursor(self):
+        columns = [models.Purchase.date, models.Purchase.id]
+        for cursor in ["not a cursor", encode_cursor([1]), encode_cursor(["yesterday", 1])]:
+            with self.assertRaises(HTTPException) as context:
+                decode_cursor(cursor, columns)
+            self.assertEqual(context.exception.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
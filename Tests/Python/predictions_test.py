@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime, timedelta
+from API import models
+from API.predictions import compact_predictions, get_current_prediction, get_current_predictions, get_database_now, set_current_prediction
+from database_test_case import DatabaseTestCase
+
+class TestCurrentPredictions(DatabaseTestCase):
+    def add_prediction(self, product_key=None, category_code=None):
+        prediction = models.Prediction(product_key=product_key, category_code=category_code, items=[models.PredictionItem(date=datetime(2024, 7, 1), quantity=1)])
+        self.db.add(prediction)
+        set_current_prediction(self.db, prediction)
+        self.db.commit()
+        return prediction.id
+
+    def test_pointer_follows_latest_prediction(self):
+        first = self.add_prediction(product_key="7790001")
+        self.assertEqual(get_current_prediction(self.db, "product_key", "7790001").id, first)
+        second = self.add_prediction(product_key="7790001")
+        category = self.add_prediction(category_code="413")
+        both = self.add_prediction(product_key="7790002", category_code="414")
+
+        self.assertEqual(get_current_prediction(self.db, "product_key", "7790001").id, second)
+        self.assertEqual(get_current_prediction(self.db, "category_code", "413").id, category)
+        self.assertEqual(get_current_prediction(self.db, "category_code", "414").id, both)
+        self.assertIsNone(get_current_prediction(self.db, "category_code", "7790001"))
+        self.assertEqual(sorted(prediction.id for prediction in get_current_predictions(self.db)), [second, category, both])
+
+    def test_older_prediction_does_not_replace_newer(self):
+        older = models.Prediction(product_key="7790001")
+        newer = models.Prediction(product_key="7790001")
+        self.db.add_all([older, newer])
+        self.db.flush()
+        set_current_prediction(self.db, newer)
+        set_current_prediction(self.db, older)
+        self.db.commit()
+        self.assertEqual(get_current_prediction(self.db, "product_key", "7790001").id, newer.id)
+
+    def test_reads_do_not_scale_with_history(self):
+        for _ in range(50):
+            self.add_prediction(product_key="7790001")
+            self.add_prediction(category_code="413")
+        self.db.expire_all()
+        self.statements = 0
+        predictions = get_current_predictions(self.db)
+        self.assertEqual(len(predictions), 2)
+        self.assertEqual(self.statements, 2)
+
+class TestCompactPredictions(DatabaseTestCase):
+    def add_history(self, product_key: str, days: int):
+        # one prediction per day, oldest first, each with two items
+        now = get_database_now(self.db)
+        ids = []
+        for days_ago in range(days - 1, -1, -1):
+            prediction = models.Prediction(product_key=product_key, created_at=now - timedelta(days=days_ago), items=[
+                models.PredictionItem(date=now, quantity=1),
+                models.PredictionItem(date=now, quantity=2),
+            ])
+            self.db.add(prediction)
+            set_current_prediction(self.db, prediction)
+            ids.append(prediction.id)
+        self.db.commit()
+        return ids
+
+    def test_keeps_only_current_predictions(self):
+        product_ids = self.add_history("7790001", 30)
+        category = models.Prediction(category_code="413", items=[models.PredictionItem(date=datetime.now(), quantity=1)])
+        self.db.add(category)
+        set_current_prediction(self.db, category)
+        self.db.commit()
+
+        self.assertEqual(compact_predictions(self.db, batch_size=7), (29, 58))
+        self.assertEqual(sorted(prediction_id for prediction_id, in self.db.query(models.Prediction.id)), [product_ids[-1], category.id])
+        self.assertEqual(self.db.query(models.PredictionItem).count(), 3)
+        self.assertEqual(compact_predictions(self.db), (0, 0))
+
+    def test_keeps_sampled_history(self):
+        self.add_history("7790001", 60)
+        self.add_history("7790002", 3)
+
+        deleted_predictions, deleted_items = compact_predictions(self.db, history_days=28, sample_days=7, batch_size=5)
+        kept = self.db.query(models.Prediction).filter(models.Prediction.product_key == "7790001").all()
+        # the current prediction plus one per week of the last four, at most five weeks are touched
+        self.assertGreaterEqual(len(kept), 4)
+        self.assertLessEqual(len(kept), 6)
+        self.assertTrue(all(prediction.created_at >= get_database_now(self.db) - timedelta(days=29) for prediction in kept))
+        self.assertEqual(deleted_predictions, 63 - self.db.query(models.Prediction).count())
+        self.assertEqual(deleted_items, 2 * deleted_predictions)
+        self.assertIsNotNone(get_current_prediction(self.db, "product_key", "7790001"))
+
+if __name__ == '__main__':
+    unittest.main()
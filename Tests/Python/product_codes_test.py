@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+from API import models, schemas
+from API.product_codes import bulk_create_product_codes, get_product_codes_by_ids
+from database_test_case import DatabaseTestCase
+
+class TestBulkCreateProductCodes(DatabaseTestCase):
+    def count_statement(self, conn, cursor, statement, *args):
+        # sqlite can't keep RETURNING in parameter order for batched inserts so it inserts products one by one, postgres batches them
+        if not statement.startswith("INSERT INTO products"):
+            self.statements += 1
+
+    def get_product_code(self, code: str, title: str = None):
+        return schemas.ProductCodeCreate(format="PLU", code=code, product=schemas.ProductCreate(title=title or f"Product {code}", img_urls=[f"http://img/{code}.jpg"]))
+
+    def test_creates_codes_in_batched_statements(self):
+        for count in [10, 1500]:
+            self.statements = 0
+            product_code_ids = bulk_create_product_codes(self.db, [self.get_product_code(f"{count}-{idx}") for idx in range(count)])
+            self.assertEqual(len(product_code_ids), count)
+            # inserts are split in batches by the driver's parameter limit, never one statement per row
+            self.assertLess(self.statements, 10)
+        self.db.commit()
+        product_codes = get_product_codes_by_ids(self.db, product_code_ids)
+        self.assertEqual(product_codes[0].product.title, "Product 1500-0")
+        self.assertEqual(product_codes[0].product.img_url, "http://img/1500-0.jpg")
+        self.assertEqual(self.db.query(models.Product).count(), 1510)
+
+    def test_skips_existing_and_repeated_codes(self):
+        bulk_create_product_codes(self.db, [self.get_product_code("4011")])
+        self.db.commit()
+        product_code_ids = bulk_create_product_codes(self.db, [self.get_product_code("4011"), self.get_product_code("4012"), self.get_product_code("4012", "Repeated")])
+        self.db.commit()
+        self.assertEqual(len(product_code_ids), 1)
+        self.assertEqual([product_code.product.title for product_code in get_product_codes_by_ids(self.db, product_code_ids)], ["Product 4012"])
+        self.assertEqual(self.db.query(models.Product).count(), 2)
+
+    def test_backfills_unlinked_purchase_items(self):
+        purchase = models.Purchase(date=datetime(2024, 1, 1), total=10, updated_at=datetime(2024, 1, 1))
+        purchase.items = [
+            models.PurchaseItem(read_product_key="4011", total=5),
+            models.PurchaseItem(read_product_key="9999", total=5),
+        ]
+        self.db.add(purchase)
+        self.db.commit()
+        self.db.execute(models.Purchase.__table__.update().values(updated_at=datetime(2024, 1, 1)))
+        self.db.commit()
+
+        product_code_ids = bulk_create_product_codes(self.db, [self.get_product_code("4011")])
+        self.db.commit()
+        product_code = get_product_codes_by_ids(self.db, product_code_ids)[0]
+        items = {item.read_product_key: item.product_id for item in self.db.query(models.PurchaseItem)}
+        self.assertEqual(items, {"4011": product_code.product_id, "9999": None})
+        self.assertGreater(self.db.query(models.Purchase).one().updated_at, datetime(2024, 1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
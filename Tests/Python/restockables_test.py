@@ -0,0 +1,96 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from API import models
+from API.restockables import get_restockables_query, rebuild_restockables
+from API.rollups import refresh_daily_totals
+from database_test_case import DatabaseTestCase
+
+class TestRestockables(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.animals = models.Category(code=1, name="Animals", original_text="1 - Animals")
+        self.db.add_all([self.food, self.animals])
+        self.db.flush()
+        self.products = [models.Product(title=f"Product {idx}", category=category) for idx, category in enumerate([self.food, self.animals, None])]
+        self.db.add_all(self.products)
+        self.db.commit()
+
+    def add_purchase(self, purchase_date: datetime, items):
+        purchase = models.Purchase(date=purchase_date, total=0)
+        for product_key, product, text in items:
+            purchase.items.append(models.PurchaseItem(read_product_key=product_key, read_product_text=text, product_id=product.id if product else None, quantity=1))
+        self.db.add(purchase)
+        refresh_daily_totals(self.db, [purchase_date])
+        self.db.commit()
+        return purchase
+
+    def get_restockables(self):
+        return (
+            {(row.product_key, row.read_product_text, row.day_count, row.last_day) for row in self.db.query(models.RestockableProductKey)},
+            {(row.product_id, row.day_count, row.last_day) for row in self.db.query(models.RestockableProduct)},
+            {(row.category_id, row.day_count, row.last_day) for row in self.db.query(models.RestockableCategory)},
+        )
+
+    def test_counts_distinct_purchase_days(self):
+        juice = ("7790001", self.products[0], "JUGO")
+        self.add_purchase(datetime(2024, 6, 1, 9), [juice, juice])
+        self.add_purchase(datetime(2024, 6, 1, 20), [juice])
+        self.add_purchase(datetime(2024, 6, 3, 9), [("7790001", self.products[0], "JUGO NARANJA")])
+        self.add_purchase(datetime(2024, 6, 4, 9), [("7790002", self.products[1], None)])
+
+        product_keys, products, categories = self.get_restockables()
+        self.assertEqual(product_keys, {("7790001", "JUGO NARANJA", 2, date(2024, 6, 3)), ("7790002", None, 1, date(2024, 6, 4))})
+        self.assertEqual(products, {(self.products[0].id, 2, date(2024, 6, 3)), (self.products[1].id, 1, date(2024, 6, 4))})
+        self.assertEqual(categories, {(self.food.id, 2, date(2024, 6, 3)), (self.animals.id, 1, date(2024, 6, 4))})
+
+        keys = get_restockables_query(self.db, models.RestockableProductKey, 2).with_entities(models.RestockableProductKey.product_key).all()
+        self.assertEqual(keys, [("7790001",)])
+        keys = get_restockables_query(self.db, models.RestockableProductKey, 1, date(2024, 6, 4)).with_entities(models.RestockableProductKey.product_key).all()
+        self.assertEqual(keys, [("7790002",)])
+
+    def test_window_counts_only_recent_days(self):
+        juice = ("7790001", self.products[0], "JUGO")
+        milk = ("7790002", self.products[1], "LECHE")
+        # juice: three days long ago and one recent day, milk: three recent days
+        for purchase_date in [datetime(2020, 1, 1), datetime(2020, 1, 2), datetime(2020, 1, 3), datetime(2024, 6, 1)]:
+            self.add_purchase(purchase_date, [juice])
+        for purchase_date in [datetime(2024, 6, 1), datetime(2024, 6, 2), datetime(2024, 6, 3)]:
+            self.add_purchase(purchase_date, [milk])
+
+        since = date(2023, 6, 1)
+        for model, key_column, expected in [
+            (models.RestockableProductKey, models.RestockableProductKey.product_key, ["7790002"]),
+            (models.RestockableProduct, models.RestockableProduct.product_id, [self.products[1].id]),
+            (models.RestockableCategory, models.RestockableCategory.category_id, [self.animals.id]),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertEqual([key for key, in get_restockables_query(self.db, model, 3, since).with_entities(key_column)], expected)
+                self.assertEqual(len(get_restockables_query(self.db, model, 3).all()), 2)
+
+    def test_incremental_matches_rebuild(self):
+        rng = random.Random(0)
+        purchases = []
+        for _ in range(40):
+            purchase_date = datetime(2024, 6, 1, rng.randint(0, 23)) + timedelta(days=rng.randint(0, 9))
+            items = [(rng.choice(["7790001", "7790002", "7790003", None]), rng.choice(self.products + [None]), rng.choice(["A", "B", None])) for _ in range(rng.randint(1, 3))]
+            purchases.append(self.add_purchase(purchase_date, items))
+
+        moved = purchases[0]
+        previous_date = moved.date
+        previous_product_ids = [item.product_id for item in moved.items]
+        moved.date = datetime(2024, 7, 1)
+        moved.items[0].product_id = self.products[2].id
+        refresh_daily_totals(self.db, [previous_date, moved.date], previous_product_ids)
+        self.db.commit()
+
+        incremental = self.get_restockables()
+        rebuild_restockables(self.db)
+        self.db.commit()
+        self.assertEqual(incremental, self.get_restockables())
+        self.assertEqual(self.db.query(func.max(models.RestockableProduct.last_day)).scalar(), date(2024, 7, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from API import models
+from API.rollups import rebuild_daily_totals, refresh_daily_totals
+from database_test_case import DatabaseTestCase
+
+class TestDailyTotals(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.animals = models.Category(code=1, name="Animals", original_text="1 - Animals")
+        self.db.add_all([self.food, self.animals])
+        self.db.flush()
+        self.products = [models.Product(title=f"Product {idx}", category=category) for idx, category in enumerate([self.food, self.animals, None])]
+        self.db.add_all(self.products)
+        self.db.commit()
+
+    def get_totals(self):
+        products = {(row.day, row.product_key): (row.quantity, row.spend, row.purchase_count) for row in self.db.query(models.DailyProductTotal)}
+        categories = {(row.day, row.category_id): (row.quantity, row.spend, row.purchase_count) for row in self.db.query(models.DailyCategoryTotal)}
+        return products, categories
+
+    def add_purchase(self, rng: random.Random, purchase_date: datetime):
+        purchase = models.Purchase(date=purchase_date, total=0)
+        for _ in range(rng.randint(1, 4)):
+            product = rng.choice(self.products + [None])
+            purchase.items.append(models.PurchaseItem(
+                read_product_key=rng.choice(["7790001", "7790002", None]),
+                product_id=product.id if product else None,
+                quantity=rng.choice([None, 1, 2]),
+                value=rng.choice([None, 4.0]),
+                total=rng.choice([None, 9.0]),
+            ))
+        self.db.add(purchase)
+        refresh_daily_totals(self.db, [purchase_date])
+        self.db.commit()
+        return purchase
+
+    def test_incremental_refresh_matches_rebuild(self):
+        rng = random.Random(0)
+        purchases = [self.add_purchase(rng, datetime(2024, 6, 1, rng.randint(0, 23)) + timedelta(days=rng.randint(0, 5))) for _ in range(30)]
+
+        moved = purchases[0]
+        previous_date = moved.date
+        moved.date = datetime(2024, 7, 1, 12)
+        moved.items[0].read_product_key = "7790003"
+        refresh_daily_totals(self.db, [previous_date, moved.date])
+        relinked = purchases[1].items[0]
+        relinked.product_id = self.products[1].id
+        refresh_daily_totals(self.db, [purchases[1].date])
+        self.db.commit()
+
+        incremental = self.get_totals()
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+        self.assertEqual(incremental, self.get_totals())
+        self.assertIn((date(2024, 7, 1), "7790003"), incremental[0])
+
+    def test_totals(self):
+        self.db.add(models.Purchase(date=datetime(2024, 6, 1, 9), total=0, items=[
+            models.PurchaseItem(read_product_key="7790001", product_id=self.products[0].id, quantity=2, value=3.0),
+            models.PurchaseItem(read_product_key="7790001", product_id=self.products[0].id, quantity=1, total=5.0),
+        ]))
+        self.db.add(models.Purchase(date=datetime(2024, 6, 1, 20), total=0, items=[
+            models.PurchaseItem(read_product_key="7790001", product_id=self.products[2].id, quantity=0, value=4.0),
+        ]))
+        rebuild_daily_totals(self.db)
+        self.db.commit()
+
+        products, categories = self.get_totals()
+        self.assertEqual(products, {(date(2024, 6, 1), "7790001"): (3, 15.0, 2)})
+        self.assertEqual(categories, {(date(2024, 6, 1), self.food.id): (3, 11.0, 1)})
+
+    def test_rebuild_since(self):
+        rng = random.Random(1)
+        for days in range(4):
+            self.add_purchase(rng, datetime(2024, 6, 1) + timedelta(days=days))
+        expected = self.get_totals()
+        self.db.query(models.DailyProductTotal).delete()
+        self.db.query(models.DailyCategoryTotal).delete()
+        rebuild_daily_totals(self.db, date(2024, 6, 3))
+        self.db.commit()
+
+        products, categories = self.get_totals()
+        self.assertEqual(products, {key: value for key, value in expected[0].items() if key[0] >= date(2024, 6, 3)})
+        self.assertEqual(categories, {key: value for key, value in expected[1].items() if key[0] >= date(2024, 6, 3)})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from API import models
+from API.search import get_lookahead_filter, search_product_codes
+from database_test_case import DatabaseTestCase
+
+# a migrated database with pg_trgm, every test rolls its rows back
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+class TestLookahead(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        products = [
+            models.Product(title="Leche entera La Serenisima"),
+            models.Product(title="Yogur bebible", description="Sabor frutilla, 100% natural"),
+            models.Product(title="Arroz largo fino"),
+        ]
+        for idx, product in enumerate(products):
+            self.db.add(models.ProductCode(product=product, format="EAN-13", code=f"77900000000{idx}"))
+        self.db.commit()
+
+    def lookahead(self, text: str):
+        codes = self.db.query(models.ProductCode).filter(get_lookahead_filter(text)).all()
+        return sorted(code.code for code in codes)
+
+    def test_matches_titles_descriptions_and_codes(self):
+        self.assertEqual(self.lookahead("SERENI"), ["779000000000"])
+        self.assertEqual(self.lookahead("frutilla"), ["779000000001"])
+        self.assertEqual(self.lookahead("00000002"), ["779000000002"])
+
+    def test_wildcards_are_literal(self):
+        self.assertEqual(self.lookahead("100%"), ["779000000001"])
+        self.assertEqual(self.lookahead("r_oz"), [])
+
+    def test_single_query(self):
+        self.statements = 0
+        self.lookahead("rroz")
+        self.assertEqual(self.statements, 1)
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL is not set")
+class TestSearchProductCodes(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(TEST_DATABASE_URL)
+        self.connection = self.engine.connect()
+        self.transaction = self.connection.begin()
+        self.db = Session(bind=self.connection)
+
+        # a made up brand keeps rows already in the database out of the way
+        products = [
+            models.Product(title="Leche descremada Quexilvana"),
+            models.Product(title="Leche entera Quexilvana"),
+            models.Product(title="Dulce de leche Quexilvana"),
+            models.Product(title="Yogur bebible Quexilvana", description="Sabor pomelindo"),
+        ]
+        self.codes = {}
+        for idx, product in enumerate(products):
+            self.codes[product.title] = models.ProductCode(product=product, format="TEST", code=f"QXV{idx:09}")
+        self.db.add_all(self.codes.values())
+        self.db.flush()
+
+    def tearDown(self):
+        self.db.close()
+        self.transaction.rollback()
+        self.connection.close()
+        self.engine.dispose()
+
+    def search(self, text: str):
+        codes = {code.id for code in self.codes.values()}
+        return [code.product.title for code in search_product_codes(self.db, text, 100) if code.id in codes]
+
+    def test_best_word_match_first(self):
+        self.assertEqual(self.search("leche entera quexilvana")[0], "Leche entera Quexilvana")
+        self.assertEqual(self.search("dulce de leche")[0], "Dulce de leche Quexilvana")
+
+    def test_tolerates_typos(self):
+        self.assertEqual(len(self.search("quexilvna")), 4)
+        self.assertEqual(self.search("pomelimdo"), ["Yogur bebible Quexilvana"])
+
+    def test_matches_descriptions_and_codes(self):
+        self.assertEqual(self.search("pomelind"), ["Yogur bebible Quexilvana"])
+        self.assertEqual(self.search(self.codes["Leche entera Quexilvana"].code), ["Leche entera Quexilvana"])
+
+if __name__ == '__main__':
+    unittest.main()
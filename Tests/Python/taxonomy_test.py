@@ -0,0 +1,90 @@
+import unittest
+from API import models
+from API.taxonomy import TaxonomyCache, TaxonomySnapshot, rebuild_category_closures
+from database_test_case import DatabaseTestCase
+
+class TestTaxonomySnapshot(unittest.TestCase):
+    def setUp(self):
+        # 1 > 2 > (3, 4 > 5), 6 > 7
+        self.snapshot = TaxonomySnapshot([
+            (1, None, 412),
+            (2, 1, 413),
+            (3, 2, 414),
+            (4, 2, 415),
+            (5, 4, 416),
+            (6, None, 922),
+            (7, 6, 923),
+        ])
+
+    def test_ancestors_go_from_self_to_root(self):
+        self.assertEqual(self.snapshot.get_ancestors_ids(5), (5, 4, 2, 1))
+        self.assertEqual(self.snapshot.get_ancestors_ids(1), (1,))
+        self.assertEqual(self.snapshot.get_ancestors_ids(99), (99,))
+
+    def test_descendants_include_self(self):
+        self.assertEqual(sorted(self.snapshot.get_descendants_ids(2)), [2, 3, 4, 5])
+        self.assertEqual(sorted(self.snapshot.get_descendants_ids(1)), [1, 2, 3, 4, 5])
+        self.assertEqual(self.snapshot.get_descendants_ids(7), [7])
+        self.assertEqual(self.snapshot.get_descendants_ids(99), [99])
+
+    def test_root_code(self):
+        self.assertEqual(self.snapshot.get_root_code(416), 412)
+        self.assertEqual(self.snapshot.get_root_code(923), 922)
+        self.assertIsNone(self.snapshot.get_root_code(1))
+
+    def test_orphans_are_roots(self):
+        snapshot = TaxonomySnapshot([(1, None, 412), (2, 50, 413), (3, 2, 414)])
+        self.assertEqual(snapshot.get_ancestors_ids(3), (3, 2))
+        self.assertEqual(snapshot.get_root_code(414), 413)
+
+    def test_deep_chain(self):
+        snapshot = TaxonomySnapshot([(idx, idx - 1 if idx > 1 else None, idx) for idx in range(1, 5001)])
+        self.assertEqual(len(snapshot.get_ancestors_ids(5000)), 5000)
+        self.assertEqual(len(snapshot.get_descendants_ids(1)), 5000)
+
+class TestTaxonomyCache(DatabaseTestCase):
+    def test_builds_once_until_invalidated(self):
+        root = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.db.add(root)
+        self.db.flush()
+        self.db.add(models.Category(code=413, name="Beverages", original_text="413 - Food > Beverages", parent_id=root.id))
+        self.db.commit()
+
+        cache = TaxonomyCache()
+        self.statements = 0
+        self.assertEqual(cache.get(self.db).get_root_code(413), 412)
+        self.assertEqual(cache.get(self.db).get_root_code(413), 412)
+        self.assertEqual(self.statements, 1)
+
+        self.db.add(models.Category(code=1, name="Animals", original_text="1 - Animals"))
+        self.db.commit()
+        self.assertIsNone(cache.get(self.db).get_root_code(1))
+
+        cache.invalidate()
+        self.assertEqual(cache.get(self.db).get_root_code(1), 1)
+
+    def test_rebuild_category_closures(self):
+        root = models.Category(code=412, name="Food", original_text="412 - Food")
+        self.db.add(root)
+        self.db.flush()
+        beverages = models.Category(code=413, name="Beverages", original_text="413 - Food > Beverages", parent_id=root.id)
+        self.db.add(beverages)
+        self.db.flush()
+        self.db.add(models.Category(code=414, name="Juice", original_text="414 - Food > Beverages > Juice", parent_id=beverages.id))
+        self.db.add(models.Category(code=1, name="Animals", original_text="1 - Animals"))
+        rebuild_category_closures(self.db)
+        self.db.commit()
+
+        closures = self.db.query(models.CategoryClosure).all()
+        codes = {category.id: category.code for category in self.db.query(models.Category).all()}
+        pairs = {(codes[closure.ancestor_id], codes[closure.descendant_id], closure.depth) for closure in closures}
+        self.assertEqual(pairs, {
+            (412, 412, 0), (413, 413, 0), (414, 414, 0), (1, 1, 0),
+            (412, 413, 1), (413, 414, 1), (412, 414, 2),
+        })
+
+        rebuild_category_closures(self.db)
+        self.assertEqual(self.db.query(models.CategoryClosure).count(), 7)
+
+if __name__ == '__main__':
+    unittest.main()
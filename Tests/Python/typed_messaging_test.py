@@ -0,0 +1,147 @@
+import threading
+import unittest
+from unittest import mock
+from pydantic import BaseModel
+from pika.exceptions import StreamLostError
+from PyLib import typed_messaging
+
+class Message(BaseModel):
+    text: str
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_open = True
+        self.is_closed = False
+        self.uncommitted = []
+
+    def tx_select(self):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body):
+        if self.connection.lost:
+            raise StreamLostError("lost")
+        self.uncommitted.append((exchange, routing_key, body))
+
+    def tx_commit(self):
+        if self.connection.lost:
+            raise StreamLostError("lost")
+        self.connection.broker.extend(self.uncommitted)
+        self.connection.broker_commits += 1
+        self.uncommitted = []
+
+    def tx_rollback(self):
+        self.uncommitted = []
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.broker_commits = 0
+        self.lost = False
+        self.is_closed = False
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=None):
+        if self.lost:
+            raise StreamLostError("lost")
+
+    def close(self):
+        self.is_closed = True
+
+class TestPydanticPublisherPool(unittest.TestCase):
+    def setUp(self):
+        self.broker = []
+        self.connections = []
+        patcher = mock.patch.object(typed_messaging, "get_connection_by_string", side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, conn_string):
+        connection = FakeConnection(self.broker)
+        self.connections.append(connection)
+        return connection
+
+    def test_connections_are_reused(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 2)
+        for idx in range(10):
+            with pool.get_publisher() as publisher:
+                publisher.publish("exchange", "key", Message(text=str(idx)))
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(len(self.broker), 10)
+
+    def test_batch_is_committed_once(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 1)
+        with pool.get_publisher() as publisher:
+            for idx in range(50):
+                publisher.publish("exchange", "key", Message(text=str(idx)))
+            self.assertEqual(self.broker, [])
+        self.assertEqual(len(self.broker), 50)
+        self.assertEqual(self.connections[0].broker_commits, 1)
+
+    def test_failed_batch_is_rolled_back(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 1)
+        with self.assertRaises(ValueError):
+            with pool.get_publisher() as publisher:
+                publisher.publish("exchange", "key", Message(text="lost"))
+                raise ValueError("request failed")
+        with pool.get_publisher() as publisher:
+            publisher.publish("exchange", "key", Message(text="kept"))
+        self.assertEqual([body for _, _, body in self.broker], ['{"text":"kept"}'])
+
+    def test_reconnects_and_republishes_the_batch(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 1)
+        with pool.get_publisher() as publisher:
+            publisher.publish("exchange", "key", Message(text="first"))
+            self.connections[0].lost = True
+            publisher.publish("exchange", "key", Message(text="second"))
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual([body for _, _, body in self.broker], ['{"text":"first"}', '{"text":"second"}'])
+
+    def test_idle_connection_lost_is_replaced(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 1)
+        with pool.get_publisher() as publisher:
+            publisher.publish("exchange", "key", Message(text="first"))
+        self.connections[0].lost = True
+        with pool.get_publisher() as publisher:
+            publisher.publish("exchange", "key", Message(text="second"))
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(len(self.broker), 2)
+
+    def test_publishers_are_not_shared_between_threads(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 3)
+        in_use = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def publish(idx):
+            with pool.get_publisher() as publisher:
+                with lock:
+                    overlaps.append(publisher in in_use)
+                    in_use.add(publisher)
+                publisher.publish("exchange", "key", Message(text=str(idx)))
+                with lock:
+                    in_use.discard(publisher)
+
+        threads = [threading.Thread(target=publish, args=(idx,)) for idx in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(any(overlaps))
+        self.assertEqual(len(self.broker), 30)
+        self.assertLessEqual(len(self.connections), 3)
+
+    def test_exhausted_pool_times_out(self):
+        pool = typed_messaging.PydanticPublisherPool("amqp://", 1, timeout=0.05)
+        with pool.get_publisher():
+            with self.assertRaises(typed_messaging.PublisherPoolTimeout):
+                with pool.get_publisher():
+                    pass
+        with pool.get_publisher() as publisher:
+            publisher.publish("exchange", "key", Message(text="after"))
+        self.assertEqual(len(self.broker), 1)
+
+if __name__ == '__main__':
+    unittest.main()
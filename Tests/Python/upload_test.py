@@ -0,0 +1,150 @@
+import io
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+UPLOADS_DIRECTORY = tempfile.TemporaryDirectory()
+os.environ.setdefault("ALEMBIC_DATABASE_URL", "sqlite://")
+os.environ["IMAGE_UPLOADS_BASE_PATH"] = UPLOADS_DIRECTORY.name
+
+# main declares its exchanges on import, the broker is the only piece that needs a server
+with mock.patch("PyLib.typed_messaging.PydanticMessageBroker"):
+    from API import main, models, schemas
+    from API.dependencies import get_db
+    from PyLib.typed_messaging import PublisherPoolTimeout
+
+class StubPublisherPool:
+    def __init__(self, available: bool = True):
+        self.available = available
+        self.published = []
+
+    @contextmanager
+    def get_publisher(self):
+        if not self.available:
+            raise PublisherPoolTimeout("No publisher became available")
+        yield self
+
+    def publish(self, exchange_name, routing_key, payload):
+        self.published.append(payload)
+
+def get_image(color) -> bytes:
+    image_bytes = io.BytesIO()
+    Image.new('RGB', (20, 40), color).save(image_bytes, format='PNG')
+    return image_bytes.getvalue()
+
+class EndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        models.Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+
+        def get_test_db():
+            db = sessionmaker(bind=self.engine)()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        main.app.dependency_overrides[get_db] = get_test_db
+        self.publisher_pool = StubPublisherPool()
+        patches = [
+            mock.patch.object(main, "image_pool", ThreadPoolExecutor(max_workers=1)),
+            mock.patch.object(main, "publisher_pool", self.publisher_pool),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # no lifespan, it would start the image process pool and the postgres listeners
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.image_pool.shutdown()
+        main.app.dependency_overrides.clear()
+        self.db.close()
+        self.engine.dispose()
+
+class TestReceiveReceiptFiles(EndpointTestCase):
+    def upload(self, *images: bytes):
+        response = self.client.post("/upload/", files=[("files", (f"recibo{idx}.png", image, "image/png")) for idx, image in enumerate(images)])
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_duplicates_in_one_upload_share_a_receipt(self):
+        receipts = self.upload(get_image((255, 0, 0)), get_image((255, 0, 0)), get_image((0, 0, 255)))
+
+        self.assertEqual(receipts[0]["id"], receipts[1]["id"])
+        self.assertNotEqual(receipts[0]["id"], receipts[2]["id"])
+        self.assertEqual(self.db.query(models.Receipt).count(), 2)
+        self.assertEqual(len(self.publisher_pool.published), 2)
+
+    def test_returns_the_existing_receipt(self):
+        first, = self.upload(get_image((255, 0, 0)))
+        second, = self.upload(get_image((255, 0, 0)))
+
+        self.assertEqual(second["id"], first["id"])
+        self.assertEqual(self.db.query(models.Receipt).count(), 1)
+        self.assertEqual(len(self.publisher_pool.published), 1)
+
+    def test_failed_and_canceled_receipts_are_uploaded_again(self):
+        for status in [schemas.ReceiptStatus.FAILED, schemas.ReceiptStatus.CANCELED]:
+            with self.subTest(status=status):
+                previous, = self.upload(get_image((0, 255, 0)))
+                self.db.query(models.Receipt).filter(models.Receipt.id == previous["id"]).update({models.Receipt.status: status})
+                self.db.commit()
+
+                receipt, = self.upload(get_image((0, 255, 0)))
+
+                self.assertNotEqual(receipt["id"], previous["id"])
+                self.assertEqual(receipt["status"], schemas.ReceiptStatus.WAITING.value)
+
+class TestCreateProductCodes(EndpointTestCase):
+    def create_product_codes(self, *codes: str):
+        response = self.client.post("/product_codes/bulk", json=[
+            {"format": "PLU", "code": code, "product": {"title": f"Product {code}", "img_urls": []}} for code in codes
+        ])
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_publishes_every_created_product(self):
+        self.create_product_codes("1", "2")
+        self.assertEqual(sorted(product.title for product in self.publisher_pool.published), ["Product 1", "Product 2"])
+
+    def test_broker_failure_does_not_fail_the_import(self):
+        self.publisher_pool.available = False
+        with self.assertLogs(level="ERROR"):
+            created = self.create_product_codes("1", "2")
+        self.assertEqual(len(created), 2)
+        self.assertEqual(self.db.query(models.ProductCode).count(), 2)
+
+class TestReceiptStatusPage(EndpointTestCase):
+    def test_page_renders_the_status_and_swaps_events_in(self):
+        receipt = models.Receipt(image_url="recibo.jpg", status=schemas.ReceiptStatus.FAILED, error_message="<b>bad</b> & worse")
+        self.db.add(receipt)
+        self.db.commit()
+
+        response = self.client.get(f"/receipts/{receipt.id}/visual_changes")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sse-swap="message"', response.text)
+        self.assertNotIn("hx-get", response.text)
+        self.assertNotIn("<b>", response.text)
+        self.assertIn("\\u003cb\\u003ebad", response.text)
+
+    def test_status_json_is_html_safe(self):
+        status_change = schemas.ReceiptStatusChange(id=1, status=schemas.ReceiptStatus.FAILED, error_message="<script>alert('x')</script> & more")
+        payload = main.get_status_change_json(status_change)
+
+        self.assertNotIn("<", payload)
+        self.assertNotIn("&", payload)
+        self.assertEqual(schemas.ReceiptStatusChange.model_validate_json(payload), status_change)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from API.database import SessionLocal
+from API import models, schemas
+from dotenv import load_dotenv
+from typing import Dict, List
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+load_dotenv()
+
+def create_receipts(count: int) -> List[int]:
+    db = SessionLocal()
+    run_id = uuid.uuid4().hex
+    receipts = [
+        models.Receipt(
+            image_url=f"load-test/{run_id}/{idx}.jpg",
+            reference_name="load-test",
+            status=schemas.ReceiptStatus.WAITING
+        ) for idx in range(count)
+    ]
+    db.add_all(receipts)
+    db.flush()
+    receipt_ids = [receipt.id for receipt in receipts]
+    db.commit()
+    db.close()
+    return receipt_ids
+
+def change_receipts_status(receipt_ids: List[int]) -> float:
+    db = SessionLocal()
+    db.query(models.Receipt).filter(models.Receipt.id.in_(receipt_ids)).update(
+        {models.Receipt.status: schemas.ReceiptStatus.PROCESSING}, synchronize_session=False
+    )
+    changed_at = time.perf_counter()
+    db.commit()
+    db.close()
+    return changed_at
+
+def delete_receipts(receipt_ids: List[int]):
+    db = SessionLocal()
+    db.query(models.Receipt).filter(models.Receipt.id.in_(receipt_ids)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+async def subscribe(client: httpx.AsyncClient, receipt_id: int, connected: List[int], received_at: Dict[int, float], key: int):
+    async with client.stream("GET", f"/receipts/{receipt_id}/status_changes") as response:
+        response.raise_for_status()
+        connected.append(key)
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                received_at[key] = time.perf_counter()
+                return
+
+def percentile(values: List[float], percentage: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentage))]
+
+async def run(api_url: str, subscribers: int, receipts: int, settle: float, timeout: float):
+    receipt_ids = create_receipts(receipts)
+    connected: List[int] = []
+    received_at: Dict[int, float] = {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=None) as client:
+            tasks = [
+                asyncio.create_task(subscribe(client, receipt_ids[key % receipts], connected, received_at, key))
+                for key in range(subscribers)
+            ]
+            while len(connected) < subscribers:
+                failed = [task for task in tasks if task.done() and task.exception()]
+                if failed:
+                    raise failed[0].exception()
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(settle)
+
+            changed_at = change_receipts_status(receipt_ids)
+            await asyncio.wait(tasks, timeout=timeout)
+            for task in tasks:
+                task.cancel()
+    finally:
+        delete_receipts(receipt_ids)
+
+    latencies = [(moment - changed_at) * 1000 for moment in received_at.values()]
+    print(f"Delivered: {len(latencies)}/{subscribers} events across {receipts} receipts")
+    if latencies:
+        print(f"Latency ms: p50={percentile(latencies, 0.5):.1f} p95={percentile(latencies, 0.95):.1f} p99={percentile(latencies, 0.99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test for receipt status change streams. Run the API with several workers, e.g. uvicorn API.main:app --workers 4")
+    parser.add_argument('--api_url', type=str, default="http://localhost:8000", help="Base url of the running API.")
+    parser.add_argument('--subscribers', type=int, default=10000, help="Amount of open status change streams.")
+    parser.add_argument('--receipts', type=int, default=100, help="Amount of receipts the streams are spread across.")
+    parser.add_argument('--settle', type=float, default=2, help="Seconds to wait after every stream is open.")
+    parser.add_argument('--timeout', type=float, default=30, help="Seconds to wait for every event to arrive.")
+
+    args = parser.parse_args()
+
+    asyncio.run(run(args.api_url, args.subscribers, args.receipts, args.settle, args.timeout))
@@ -0,0 +1,92 @@
+from API.database import SessionLocal
+from API import models
+from API.search import get_lookahead_filter, search_product_codes
+from dotenv import load_dotenv
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+from typing import Callable, List
+import argparse
+import statistics
+import time
+
+load_dotenv()
+
+BENCHMARK_FORMAT = "BENCHMARK"
+TITLE_WORDS = ["leche", "yogur", "queso", "galletitas", "arroz", "fideos", "aceite", "azucar", "harina", "cafe",
+               "yerba", "mermelada", "detergente", "jabon", "shampoo", "gaseosa", "agua", "cerveza", "vino", "pan"]
+BRAND_WORDS = ["la serenisima", "sancor", "arcor", "marolio", "molinos", "ledesma", "playadito", "granix",
+               "bagley", "quilmes", "cunnington", "natura", "skip", "dove", "villavicencio"]
+
+def create_products(db: Session, count: int):
+    db.execute(text("""
+        INSERT INTO products (title, description, created_at, updated_at)
+        SELECT
+            (:titles)[1 + i % 20] || ' ' || (:brands)[1 + (i / 20) % 15] || ' ' || (i % 997) || 'g',
+            CASE WHEN i % 3 = 0 THEN 'presentacion ' || (:brands)[1 + i % 15] END,
+            now(), now()
+        FROM generate_series(1, :count) AS i
+    """), {"titles": TITLE_WORDS, "brands": BRAND_WORDS, "count": count})
+    db.execute(text("""
+        INSERT INTO product_codes (product_id, format, code, created_at, updated_at)
+        SELECT id, :format, lpad((7790000000000 + id)::text, 13, '0'), now(), now()
+        FROM products
+        WHERE NOT EXISTS (SELECT 1 FROM product_codes WHERE product_codes.product_id = products.id)
+    """), {"format": BENCHMARK_FORMAT})
+    db.execute(text("ANALYZE products"))
+    db.execute(text("ANALYZE product_codes"))
+
+def legacy_lookahead(db: Session, lookahead: str) -> List[models.ProductCode]:
+    product_ids = db.query(models.Product.id).filter(
+        or_(
+            models.Product.title.ilike(f"%{lookahead}%"),
+            models.Product.description.ilike(f"%{lookahead}%")
+        )
+    ).all()
+    product_ids = [id[0] for id in product_ids]
+    return db.query(models.ProductCode).filter(
+        or_(
+            models.ProductCode.code.ilike(f"%{lookahead}%"),
+            models.ProductCode.product_id.in_(product_ids)
+        )
+    ).limit(20).all()
+
+def lookahead(db: Session, text: str) -> List[models.ProductCode]:
+    return db.query(models.ProductCode).filter(get_lookahead_filter(text)).limit(20).all()
+
+def search(db: Session, text: str) -> List[models.ProductCode]:
+    return search_product_codes(db, text).all()
+
+def measure(db: Session, name: str, run: Callable[[Session, str], List[models.ProductCode]], terms: List[str], repetitions: int):
+    latencies = []
+    for term in terms:
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            run(db, term)
+            latencies.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(latencies)
+    print(f"{name}: p50={ordered[len(ordered) // 2]:.1f}ms p95={ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]:.1f}ms mean={statistics.mean(latencies):.1f}ms")
+
+def run(products: int, terms: List[str], repetitions: int, skip_legacy: bool):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        create_products(db, products)
+        print(f"Created {products} products in {time.perf_counter() - start:.1f}s (rolled back at the end)")
+        if not skip_legacy:
+            measure(db, "legacy lookahead", legacy_lookahead, terms, repetitions)
+        measure(db, "lookahead", lookahead, terms, repetitions)
+        measure(db, "ranked search", search, terms, repetitions)
+    finally:
+        db.rollback()
+        db.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark for product lookahead and ranked search against a Postgres database with the pg_trgm indexes.")
+    parser.add_argument('--products', type=int, default=1000000, help="Amount of temporary products to create.")
+    parser.add_argument('--terms', type=str, nargs='+', default=["lech", "serenisima", "galletitas bagley", "yerba playadito 50", "779000001"], help="Search terms.")
+    parser.add_argument('--repetitions', type=int, default=5, help="Times each term is searched.")
+    parser.add_argument('--skip_legacy', action='store_true', help="Do not measure the previous lookahead query.")
+
+    args = parser.parse_args()
+
+    run(args.products, args.terms, args.repetitions, args.skip_legacy)
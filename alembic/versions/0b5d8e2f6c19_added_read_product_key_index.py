@@ -0,0 +1,26 @@
+"""added read product key index
+
+Revision ID: 0b5d8e2f6c19
+Revises: f1a7c3d58e24
+Create Date: 2026-10-18 16:34:10.527163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b5d8e2f6c19'
+down_revision: Union[str, None] = 'f1a7c3d58e24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_purchase_items_read_product_key'), 'purchase_items', ['read_product_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_purchase_items_read_product_key'), table_name='purchase_items')
@@ -0,0 +1,25 @@
+"""added purchase items product id index
+
+Revision ID: 1f7c4e9a2b86
+Revises: 8d2f6a3c1e57
+Create Date: 2026-10-19 11:02:14.337590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f7c4e9a2b86'
+down_revision: Union[str, None] = '8d2f6a3c1e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_purchase_items_product_id'), 'purchase_items', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_purchase_items_product_id'), table_name='purchase_items')
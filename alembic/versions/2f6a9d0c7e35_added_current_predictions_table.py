@@ -0,0 +1,48 @@
+"""added current predictions table
+
+Revision ID: 2f6a9d0c7e35
+Revises: d8a1f5c3b960
+Create Date: 2026-10-18 19:48:33.517902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6a9d0c7e35'
+down_revision: Union[str, None] = 'd8a1f5c3b960'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('current_predictions',
+    sa.Column('key_type', sa.String(length=32), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('prediction_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['prediction_id'], ['predictions.id'], ),
+    sa.PrimaryKeyConstraint('key_type', 'key')
+    )
+    op.create_index(op.f('ix_current_predictions_prediction_id'), 'current_predictions', ['prediction_id'], unique=False)
+    op.execute("""
+        INSERT INTO current_predictions (key_type, key, prediction_id)
+        SELECT DISTINCT ON (product_key) 'product_key', product_key, id
+        FROM predictions
+        WHERE product_key IS NOT NULL AND product_key <> ''
+        ORDER BY product_key, created_at DESC, id DESC;
+    """)
+    op.execute("""
+        INSERT INTO current_predictions (key_type, key, prediction_id)
+        SELECT DISTINCT ON (category_code) 'category_code', category_code, id
+        FROM predictions
+        WHERE category_code IS NOT NULL AND category_code <> ''
+        ORDER BY category_code, created_at DESC, id DESC;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_current_predictions_prediction_id'), table_name='current_predictions')
+    op.drop_table('current_predictions')
@@ -0,0 +1,50 @@
+"""receipt status payload byte limit
+
+Revision ID: 4c8e2b7f1a63
+Revises: 7b3e5a1d9c42
+Create Date: 2026-10-18 21:14:52.903518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8e2b7f1a63'
+down_revision: Union[str, None] = '7b3e5a1d9c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def get_notify_function(error_message_length: int) -> str:
+    return f"""
+    CREATE OR REPLACE FUNCTION notify_receipt_status_change()
+    RETURNS trigger AS $$
+    DECLARE
+        payload TEXT;
+    BEGIN
+        IF OLD.status IS DISTINCT FROM NEW.status THEN
+            payload := json_build_object(
+                'id', NEW.id,
+                'status', NEW.status,
+                'purchase_id', NEW.purchase_id,
+                'error_message', left(NEW.error_message, {error_message_length}),
+                'updated_at', NEW.updated_at
+            )::text;
+            PERFORM pg_notify('receipt_status_changed', payload);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def upgrade() -> None:
+    # left() counts characters, pg_notify payloads are limited to 8000 bytes: a character is
+    # at most 4 bytes in utf-8 and at most 6 once json escapes it, so 1000 leave room for the rest
+    op.execute(get_notify_function(1000))
+
+
+def downgrade() -> None:
+    op.execute(get_notify_function(2000))
@@ -0,0 +1,28 @@
+"""added content hash to receipts
+
+Revision ID: 5b0e3c7a91d4
+Revises: 78cdb37ea008
+Create Date: 2026-10-18 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e3c7a91d4'
+down_revision: Union[str, None] = '78cdb37ea008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_receipts_content_hash'), 'receipts', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_receipts_content_hash'), table_name='receipts')
+    op.drop_column('receipts', 'content_hash')
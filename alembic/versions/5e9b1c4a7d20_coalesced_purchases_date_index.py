@@ -0,0 +1,28 @@
+"""coalesced purchases date index
+
+Revision ID: 5e9b1c4a7d20
+Revises: 4c8e2b7f1a63
+Create Date: 2026-10-18 22:03:41.518274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b1c4a7d20'
+down_revision: Union[str, None] = '4c8e2b7f1a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_purchases_date_id', table_name='purchases')
+    op.create_index('ix_purchases_date_id', 'purchases', [sa.text("coalesce(date, '0001-01-01 00:00:00')"), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_purchases_date_id', table_name='purchases')
+    op.create_index('ix_purchases_date_id', 'purchases', ['date', 'id'], unique=False)
@@ -0,0 +1,60 @@
+"""added entity identification to purchases
+
+Revision ID: 6e3f1b9a2d47
+Revises: 0b5d8e2f6c19
+Create Date: 2026-10-18 17:02:55.190384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from PyLib import receipt_tools
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e3f1b9a2d47'
+down_revision: Union[str, None] = '0b5d8e2f6c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def normalize_entity_id(identification: str) -> int | None:
+    try:
+        return receipt_tools.normalize_entity_id(identification)
+    except ValueError:
+        return None
+
+
+def upgrade() -> None:
+    op.add_column('purchases', sa.Column('entity_identification', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_purchases_entity_identification'), 'purchases', ['entity_identification'], unique=False)
+
+    purchases = sa.table(
+        'purchases',
+        sa.column('id', sa.Integer),
+        sa.column('read_entity_identification', sa.String),
+        sa.column('entity_identification', sa.BigInteger),
+    )
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(purchases.c.id, purchases.c.read_entity_identification)
+        .where(purchases.c.read_entity_identification.isnot(None))
+    ).all()
+    values = [
+        {"purchase_id": purchase_id, "identification": normalize_entity_id(identification)}
+        for purchase_id, identification in rows
+    ]
+    values = [value for value in values if value["identification"] is not None]
+    if values:
+        conn.execute(
+            purchases.update()
+            .where(purchases.c.id == sa.bindparam('purchase_id'))
+            .values(entity_identification=sa.bindparam('identification')),
+            values
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_purchases_entity_identification'), table_name='purchases')
+    op.drop_column('purchases', 'entity_identification')
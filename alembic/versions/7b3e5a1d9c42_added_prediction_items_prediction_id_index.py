@@ -0,0 +1,25 @@
+"""added prediction items prediction id index
+
+Revision ID: 7b3e5a1d9c42
+Revises: 2f6a9d0c7e35
+Create Date: 2026-10-18 20:31:09.274415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e5a1d9c42'
+down_revision: Union[str, None] = '2f6a9d0c7e35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_prediction_items_prediction_id'), 'prediction_items', ['prediction_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prediction_items_prediction_id'), table_name='prediction_items')
@@ -0,0 +1,25 @@
+"""added product codes product id index
+
+Revision ID: 8d2f6a3c1e57
+Revises: 5e9b1c4a7d20
+Create Date: 2026-10-19 10:12:37.604418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6a3c1e57'
+down_revision: Union[str, None] = '5e9b1c4a7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_product_codes_product_id'), 'product_codes', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_product_codes_product_id'), table_name='product_codes')
@@ -0,0 +1,70 @@
+"""added daily totals rollups
+
+Revision ID: 9c4d7e2a5f18
+Revises: 6e3f1b9a2d47
+Create Date: 2026-10-18 18:20:41.603127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d7e2a5f18'
+down_revision: Union[str, None] = '6e3f1b9a2d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('daily_product_totals',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_key', sa.String(length=255), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('spend', sa.Float(), nullable=False),
+    sa.Column('purchase_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'product_key')
+    )
+    op.create_index('ix_daily_product_totals_product_key_day', 'daily_product_totals', ['product_key', 'day'], unique=False)
+    op.create_table('daily_category_totals',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('spend', sa.Float(), nullable=False),
+    sa.Column('purchase_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    op.create_index('ix_daily_category_totals_category_id_day', 'daily_category_totals', ['category_id', 'day'], unique=False)
+    op.execute("""
+        INSERT INTO daily_product_totals (day, product_key, quantity, spend, purchase_count)
+        SELECT date(purchases.date), purchase_items.read_product_key,
+            coalesce(sum(purchase_items.quantity), 0),
+            coalesce(sum(coalesce(purchase_items.total, purchase_items.value * coalesce(nullif(purchase_items.quantity, 0), 1))), 0),
+            count(DISTINCT purchases.id)
+        FROM purchase_items
+        JOIN purchases ON purchase_items.purchase_id = purchases.id
+        WHERE purchases.date IS NOT NULL AND purchase_items.read_product_key IS NOT NULL
+        GROUP BY date(purchases.date), purchase_items.read_product_key;
+    """)
+    op.execute("""
+        INSERT INTO daily_category_totals (day, category_id, quantity, spend, purchase_count)
+        SELECT date(purchases.date), products.category_id,
+            coalesce(sum(purchase_items.quantity), 0),
+            coalesce(sum(coalesce(purchase_items.total, purchase_items.value * coalesce(nullif(purchase_items.quantity, 0), 1))), 0),
+            count(DISTINCT purchases.id)
+        FROM purchase_items
+        JOIN purchases ON purchase_items.purchase_id = purchases.id
+        JOIN products ON purchase_items.product_id = products.id
+        WHERE purchases.date IS NOT NULL AND products.category_id IS NOT NULL
+        GROUP BY date(purchases.date), products.category_id;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_daily_category_totals_category_id_day', table_name='daily_category_totals')
+    op.drop_table('daily_category_totals')
+    op.drop_index('ix_daily_product_totals_product_key_day', table_name='daily_product_totals')
+    op.drop_table('daily_product_totals')
@@ -0,0 +1,59 @@
+"""receipt status change payload
+
+Revision ID: a4f2d8c61e37
+Revises: 5b0e3c7a91d4
+Create Date: 2026-10-18 11:02:15.671220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f2d8c61e37'
+down_revision: Union[str, None] = '5b0e3c7a91d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pg_notify payloads are limited to 8000 bytes, error messages are truncated to stay below it
+    op.execute("""
+    CREATE OR REPLACE FUNCTION notify_receipt_status_change()
+    RETURNS trigger AS $$
+    DECLARE
+        payload TEXT;
+    BEGIN
+        IF OLD.status IS DISTINCT FROM NEW.status THEN
+            payload := json_build_object(
+                'id', NEW.id,
+                'status', NEW.status,
+                'purchase_id', NEW.purchase_id,
+                'error_message', left(NEW.error_message, 2000),
+                'updated_at', NEW.updated_at
+            )::text;
+            PERFORM pg_notify('receipt_status_changed', payload);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION notify_receipt_status_change()
+    RETURNS trigger AS $$
+    DECLARE
+        payload TEXT;
+    BEGIN
+        IF OLD.status IS DISTINCT FROM NEW.status THEN
+            payload := NEW.id::text;
+            PERFORM pg_notify('receipt_status_changed', payload);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
@@ -0,0 +1,46 @@
+"""added category closures table
+
+Revision ID: c3e9a1f07b52
+Revises: a4f2d8c61e37
+Create Date: 2026-10-18 12:41:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e9a1f07b52'
+down_revision: Union[str, None] = 'a4f2d8c61e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('category_closures',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index(op.f('ix_category_closures_descendant_id'), 'category_closures', ['descendant_id'], unique=False)
+    op.execute("""
+        INSERT INTO category_closures (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE closures (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT closures.ancestor_id, categories.id, closures.depth + 1
+            FROM closures
+            JOIN categories ON categories.parent_id = closures.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM closures;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_category_closures_descendant_id'), table_name='category_closures')
+    op.drop_table('category_closures')
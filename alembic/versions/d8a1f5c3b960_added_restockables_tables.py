@@ -0,0 +1,84 @@
+"""added restockables tables
+
+Revision ID: d8a1f5c3b960
+Revises: 9c4d7e2a5f18
+Create Date: 2026-10-18 19:05:12.842630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a1f5c3b960'
+down_revision: Union[str, None] = '9c4d7e2a5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('restockable_product_keys',
+    sa.Column('product_key', sa.String(length=255), nullable=False),
+    sa.Column('read_product_text', sa.String(length=255), nullable=True),
+    sa.Column('day_count', sa.Integer(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('product_key')
+    )
+    op.create_index('ix_restockable_product_keys_day_count_last_day', 'restockable_product_keys', ['day_count', 'last_day'], unique=False)
+    op.create_table('restockable_products',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('day_count', sa.Integer(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_restockable_products_day_count_last_day', 'restockable_products', ['day_count', 'last_day'], unique=False)
+    op.create_table('restockable_categories',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('day_count', sa.Integer(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.create_index('ix_restockable_categories_day_count_last_day', 'restockable_categories', ['day_count', 'last_day'], unique=False)
+    op.execute("""
+        INSERT INTO restockable_product_keys (product_key, read_product_text, day_count, last_day)
+        SELECT totals.product_key, texts.read_product_text, totals.day_count, totals.last_day
+        FROM (
+            SELECT product_key, count(*) AS day_count, max(day) AS last_day
+            FROM daily_product_totals
+            GROUP BY product_key
+        ) AS totals
+        LEFT JOIN (
+            SELECT DISTINCT ON (purchase_items.read_product_key) purchase_items.read_product_key, purchase_items.read_product_text
+            FROM purchase_items
+            JOIN purchases ON purchase_items.purchase_id = purchases.id
+            WHERE purchase_items.read_product_text IS NOT NULL
+            ORDER BY purchase_items.read_product_key, purchases.date DESC
+        ) AS texts ON texts.read_product_key = totals.product_key;
+    """)
+    op.execute("""
+        INSERT INTO restockable_products (product_id, day_count, last_day)
+        SELECT purchase_items.product_id, count(DISTINCT date(purchases.date)), max(date(purchases.date))
+        FROM purchase_items
+        JOIN purchases ON purchase_items.purchase_id = purchases.id
+        WHERE purchase_items.product_id IS NOT NULL AND purchases.date IS NOT NULL
+        GROUP BY purchase_items.product_id;
+    """)
+    op.execute("""
+        INSERT INTO restockable_categories (category_id, day_count, last_day)
+        SELECT category_id, count(*), max(day)
+        FROM daily_category_totals
+        GROUP BY category_id;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_restockable_categories_day_count_last_day', table_name='restockable_categories')
+    op.drop_table('restockable_categories')
+    op.drop_index('ix_restockable_products_day_count_last_day', table_name='restockable_products')
+    op.drop_table('restockable_products')
+    op.drop_index('ix_restockable_product_keys_day_count_last_day', table_name='restockable_product_keys')
+    op.drop_table('restockable_product_keys')
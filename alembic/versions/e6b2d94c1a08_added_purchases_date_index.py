@@ -0,0 +1,26 @@
+"""added purchases date index
+
+Revision ID: e6b2d94c1a08
+Revises: c3e9a1f07b52
+Create Date: 2026-10-18 14:05:22.871930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b2d94c1a08'
+down_revision: Union[str, None] = 'c3e9a1f07b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_purchases_date_id', 'purchases', ['date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_purchases_date_id', table_name='purchases')
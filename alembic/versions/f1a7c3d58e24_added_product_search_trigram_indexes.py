@@ -0,0 +1,31 @@
+"""added product search trigram indexes
+
+Revision ID: f1a7c3d58e24
+Revises: e6b2d94c1a08
+Create Date: 2026-10-18 15:20:48.602117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a7c3d58e24'
+down_revision: Union[str, None] = 'e6b2d94c1a08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    op.create_index('ix_products_title_trgm', 'products', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_products_description_trgm', 'products', ['description'], unique=False, postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+    op.create_index('ix_product_codes_code_trgm', 'product_codes', ['code'], unique=False, postgresql_using='gin', postgresql_ops={'code': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_codes_code_trgm', table_name='product_codes')
+    op.drop_index('ix_products_description_trgm', table_name='products')
+    op.drop_index('ix_products_title_trgm', table_name='products')
@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, map } from 'rxjs';
 import { environment } from '../environments/environment';
 
 @Injectable({
@@ -27,9 +27,16 @@ export class CategoriesService {
   }
 
   getHistoricByCategoryCode(category_code: string): Observable<any[]> {
-    return this.http.get<any[]>(
-      `${this.apiUrl}/historics/by-category-code/${category_code}`
-    );
+    return this.http
+      .get<any>(`${this.apiUrl}/historics/by-category-code/${category_code}`)
+      .pipe(
+        map((series) =>
+          series.dates.map((date: string, index: number) => ({
+            date: date,
+            quantity: series.quantities[index],
+          }))
+        )
+      );
   }
 
   getLastPredictionByCategoryCode(category_code: string): Observable<any> {
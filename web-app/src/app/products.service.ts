@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { HttpClient, HttpParams } from '@angular/common/http';
+import { Observable, map } from 'rxjs';
 import { environment } from '../environments/environment';
 
 @Injectable({
@@ -12,9 +12,10 @@ export class ProductsService {
   constructor(private http: HttpClient) {}
 
   search(product_code: string): Observable<any[]> {
-    return this.http.get<any[]>(
-      `${this.apiUrl}/product_codes/?lookahead=${product_code}`
-    );
+    const params = new HttpParams().set('q', product_code);
+    return this.http.get<any[]>(`${this.apiUrl}/product_codes/search`, {
+      params: params,
+    });
   }
 
   getProductCodes(): Observable<any[]> {
@@ -22,9 +23,16 @@ export class ProductsService {
   }
 
   getHistoricByProductCode(product_code: string): Observable<any[]> {
-    return this.http.get<any[]>(
-      `${this.apiUrl}/historics/by-product-code/${product_code}`
-    );
+    return this.http
+      .get<any>(`${this.apiUrl}/historics/by-product-code/${product_code}`)
+      .pipe(
+        map((series) =>
+          series.dates.map((date: string, index: number) => ({
+            date: date,
+            quantity: series.quantities[index],
+          }))
+        )
+      );
   }
 
   getLastPredictionByProductCode(product_code: string): Observable<any> {
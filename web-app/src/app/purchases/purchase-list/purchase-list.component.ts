@@ -19,7 +19,10 @@ import { ButtonModule } from 'primeng/button';
 export class PurchaseListComponent implements OnInit {
   constructor(private comprasService: ComprasService, private router: Router) {}
 
-  purchases!: any[];
+  readonly pageSize = 50;
+
+  purchases: any[] = [];
+  nextCursor: string | null = null;
   loading = true;
 
   navigateToPurchase(id: string): void {
@@ -34,9 +37,15 @@ export class PurchaseListComponent implements OnInit {
   }  
 
   ngOnInit(): void {
-    this.comprasService.getAll().subscribe({
-      next: (data: any) => {
-        this.purchases = data;
+    this.loadPage();
+  }
+
+  loadPage(): void {
+    this.loading = true;
+    this.comprasService.getPage(this.pageSize, this.nextCursor).subscribe({
+      next: (page) => {
+        this.purchases = [...this.purchases, ...page.purchases];
+        this.nextCursor = page.nextCursor;
         this.loading = false;
       },
       error: (error) => {
@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { HttpClient, HttpParams } from '@angular/common/http';
+import { Observable, map } from 'rxjs';
 import { environment } from '../../../environments/environment';
 
 @Injectable({
@@ -16,6 +16,20 @@ export class ComprasService {
     return this.http.get<any[]>(url);
   }
 
+  getPage(limit: number, after?: string | null): Observable<{ purchases: any[]; nextCursor: string | null }> {
+    const url = `${this.baseUrl}/purchases/`;
+    let params = new HttpParams().set('limit', limit);
+    if (after) {
+      params = params.set('after', after);
+    }
+    return this.http.get<any[]>(url, { params: params, observe: 'response' }).pipe(
+      map((response) => ({
+        purchases: response.body ?? [],
+        nextCursor: response.headers.get('X-Next-Cursor'),
+      }))
+    );
+  }
+
   getCompraById(id: number) {
     const url = `${this.baseUrl}/purchases/${id}`;
     return this.http.get(url);
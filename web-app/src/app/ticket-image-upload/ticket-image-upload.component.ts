@@ -104,32 +104,7 @@ export class TicketImageUploadComponent implements OnInit {
   sseStatusChange() {
     for (let receiptId of this.trackedReceiptIds) {
       const sseSub = this.ticketUploadService.getStatusUpdates(receiptId).subscribe({
-        next: (event) => {
-          console.log('Status change from id: ', event);
-
-          this.ticketUploadService.getReceipt(event).subscribe({
-            next: (receipt) => {
-              this.zone.run(() => {
-                let index = this.receiptList.findIndex(
-                  (item: { id: any }) => item.id === receipt.id
-                );
-
-                if (index !== -1) {
-                  this.receiptList[index] = {
-                    ...this.receiptList[index],
-                    status: receipt.status,
-                  };
-                } else {
-                  // If the receipt is not found, add it to receiptList
-                  this.addReceiptToList(receipt);
-                }
-              });
-            },
-            error: (error) => {
-              console.error('Error fetching receipt:', error);
-            },
-          });
-        },
+        next: (statusChange) => this.applyStatusChange(statusChange),
       });
 
       // Add subscription to the tracking list
@@ -139,31 +114,35 @@ export class TicketImageUploadComponent implements OnInit {
 
   sseStatusChangeReceipt(receiptId: number) {
     this.ticketUploadService.getStatusUpdates(receiptId).subscribe({
-      next: (event) => {
-        console.log('Status change from id: ', event);
+      next: (statusChange) => this.applyStatusChange(statusChange),
+    });
+  }
 
-        this.ticketUploadService.getReceipt(event).subscribe({
-          next: (receipt) => {
-            this.zone.run(() => {
-              let index = this.receiptList.findIndex(
-                (item: { id: number }) => item.id === receipt.id
-              );
+  applyStatusChange(statusChange: any) {
+    console.log('Status change from id: ', statusChange.id);
 
-              if (index !== -1) {
-                this.receiptList[index] = {
-                  ...this.receiptList[index],
-                  status: receipt.status,
-                };
-              } else {
-                // If the receipt is not found, add it to receiptList
-                this.addReceiptToList(receipt);
-              }
-            });
-          },
-          error: (error) => {
-            console.error('Error fetching receipt:', error);
-          },
-        });
+    let index = this.receiptList.findIndex(
+      (item: { id: number }) => item.id === statusChange.id
+    );
+
+    if (index !== -1) {
+      this.zone.run(() => {
+        this.receiptList[index] = {
+          ...this.receiptList[index],
+          status: statusChange.status,
+          purchase_id: statusChange.purchase_id,
+          error_message: statusChange.error_message,
+          updated_at: statusChange.updated_at,
+        };
+      });
+      return;
+    }
+
+    // If the receipt is not found, fetch it and add it to receiptList
+    this.ticketUploadService.getReceipt(statusChange.id).subscribe({
+      next: (receipt) => this.addReceiptToList(receipt),
+      error: (error) => {
+        console.error('Error fetching receipt:', error);
       },
     });
   }
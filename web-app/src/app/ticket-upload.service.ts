@@ -28,7 +28,7 @@ export class TicketUploadService {
       const eventSource = new EventSource(url);
 
       eventSource.onmessage = (event) => {
-        observer.next(event.data);
+        observer.next(JSON.parse(event.data));
       };
 
       eventSource.onerror = (error) => {